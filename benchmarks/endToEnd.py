@@ -0,0 +1,235 @@
+# coding=cp1252
+#
+# endToEnd.py
+#
+# Creative Commons Attribution-NonCommercial-ShareAlike 4.0 International (CC BY-NC-SA 4.0) 2019 granmacco <@granmacco>
+# https://github.com/granmacco
+#
+# Script inspired by @krcroft's reddit post on June 25th, 2019
+# https://www.reddit.com/r/RetroPie/comments/c50djy/chd_compression_summary_for_psx/
+# https://github.com/krcroft
+# Thank you very much, without you, this automation wouldn't have existed!
+#
+# Also, special thanks to the Plata o Roms team for finding @krcroft's post, 
+# putting me on the right track and inspiring some of the features of this script.
+# http://t.me/RaspberryPiEmuladores
+# Thank you very much for sharing your knowledge and for striving for excellence!
+#
+# Lastly, but not least, a very special thanks to @Sergi_0, for providing new ideas and methodologies to this script.
+# https://github.com/Sergi_0
+# Thank you very much for your kindness and time!!
+#
+# This code is licensed under Creative Commons BY-NC-SA 4.0
+# You may redistribute it and/or modify it under the terms of the 
+# Creative Commons BY-NC-SA 4.0 License, as published by the Creative
+# Commons on their website http://creativecommons.org/licenses/by-nc-sa/4.0/
+#
+
+
+"""
+Prueba de rendimiento de extremo a extremo: genera un corpus sinttico, instala sustitutos de las herramientas
+con la velocidad indicada y mide discos/hora y MB/s de cada modo. Los resultados se guardan en JSON
+para poder compararlos con los de ejecuciones anteriores. Dependen de la mquina, as que no se incluyen en el
+repositorio: la primera ejecucin solo sirve de referencia para las siguientes.
+
+    python -m benchmarks.endToEnd --discs 12 --modes 1,2,4,5 --tool-speed 200
+
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from benchmarks import stubTool, syntheticCorpus
+from binCueMinimizer.batchExecutor import BatchExecutor
+from binCueMinimizer.toolRegistry import ToolRegistry
+from binCueMinimizer.chdTuner import ChdTuner
+from binCueMinimizer.consts import MODE_NORMAL_CHD, MODE_LOSSYWAV, MODE_LOSSYWAV_HARD, MODE_U8WAV
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+# Empeoramiento a partir del cual se considera que hay una regresin, en tanto por ciento
+DEFAULT_TOLERANCE = 10.0
+
+def get_commit():
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(RESULTS_DIR), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        return result.stdout.decode().strip() or None
+    except OSError:
+        return None
+
+def run_mode(cue_paths, mode, tools_dir, workers, minimizer_options):
+    """
+    Procesa todos los cues en un modo, midiendo el tiempo total
+
+    Returns
+    -------
+    (float, int)
+        Los segundos y el nmero de trabajos fallidos
+
+    """
+
+    options = dict(minimizer_options)
+    options['tools'] = ToolRegistry(tools_dir)
+    executor = BatchExecutor(workers=workers, overwrite_chd=True, original_dir=tools_dir, minimizer_options=options)
+    start = time.perf_counter()
+    results = executor.run(cue_paths, [mode])
+    seconds = time.perf_counter() - start
+    return seconds, len([result for result in results if not result.success])
+
+def remove_outputs(path):
+    for directory, dirnames, filenames in os.walk(path):
+        for filename in filenames:
+            if filename.endswith('.CHD'):
+                os.remove(os.path.join(directory, filename))
+
+def run_benchmark(arguments):
+    """
+    Ejecuta la prueba completa
+
+    Returns
+    -------
+    dict
+        Los resultados, listos para guardarse en JSON
+
+    """
+
+    specs = syntheticCorpus.get_specs(arguments.discs, seconds=arguments.seconds, seed=arguments.seed)
+    corpus_bytes = sum(spec.get_size() for spec in specs)
+    tool_speed = {'chdman': arguments.chdman_speed or arguments.tool_speed,
+                  'ffmpeg': arguments.ffmpeg_speed or arguments.tool_speed,
+                  'lossywav': arguments.lossywav_speed or arguments.tool_speed}
+    minimizer_options = {'streaming': arguments.streaming, 'native_pcm': not arguments.no_native, 'predict_gain': not arguments.no_predict}
+    results = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': get_commit(),
+        'host': {'platform': platform.platform(), 'python': platform.python_version(), 'cpus': os.cpu_count()},
+        'parameters': {'discs': arguments.discs, 'seconds': arguments.seconds, 'seed': arguments.seed, 'workers': arguments.workers,
+                       'tool_speed': tool_speed, 'speed_mode': arguments.speed_mode, 'streaming': arguments.streaming,
+                       'native_pcm': not arguments.no_native, 'predict_gain': not arguments.no_predict, 'tune': arguments.tune},
+        'corpus_bytes': corpus_bytes,
+        'modes': {}
+        }
+    work_dir = tempfile.mkdtemp(prefix='binCueMinimizer-bench-', dir=arguments.work_dir)
+    original_cwd = os.getcwd()
+    try:
+        syntheticCorpus.redirect_log(work_dir)
+        stubTool.install(work_dir, tool_speed, arguments.speed_mode)
+        if arguments.tune:
+            # Las decisiones se comparten entre los modos medidos: el primero paga las pruebas de cada tipo de disco
+            minimizer_options['chd_tuner'] = ChdTuner(os.path.join(work_dir, 'tuning.json'))
+        cue_paths = syntheticCorpus.write_corpus(specs, os.path.join(work_dir, 'corpus'), seed=arguments.seed)
+        # Los directorios de trabajo se crean en el directorio actual
+        os.chdir(work_dir)
+        for mode in arguments.modes:
+            remove_outputs(work_dir)
+            seconds, failures = run_mode(cue_paths, mode, work_dir, arguments.workers, minimizer_options)
+            results['modes'][str(mode)] = {
+                'seconds': seconds,
+                'failures': failures,
+                'discs_per_hour': len(cue_paths) / seconds * 3600 if seconds else None,
+                'mb_per_s': corpus_bytes / (1024 * 1024) / seconds if seconds else None
+                }
+    finally:
+        os.chdir(original_cwd)
+        if not arguments.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+def get_latest_results(exclude = None):
+    """
+    Devuelve la ruta de los ltimos resultados guardados, o None si no hay ninguno
+
+    """
+
+    if not os.path.isdir(RESULTS_DIR):
+        return None
+    candidates = sorted(os.path.join(RESULTS_DIR, name) for name in os.listdir(RESULTS_DIR) if name.endswith('.json'))
+    candidates = [candidate for candidate in candidates if candidate != exclude]
+    return candidates[-1] if candidates else None
+
+def compare(results, baseline, tolerance):
+    """
+    Compara los discos/hora de cada modo con los de otra ejecucin
+
+    Returns
+    -------
+    list [str]
+        Los modos en los que hay una regresin mayor que la tolerancia
+
+    """
+
+    regressions = []
+    if baseline['parameters'] != results['parameters']:
+        print('AVISO: los parmetros de la ejecucin de referencia no coinciden, la comparacin es orientativa')
+    for mode, current in results['modes'].items():
+        previous = baseline['modes'].get(mode)
+        if not previous or not previous['discs_per_hour'] or not current['discs_per_hour']:
+            continue
+        change = (current['discs_per_hour'] - previous['discs_per_hour']) / previous['discs_per_hour'] * 100
+        flag = ''
+        if change < -tolerance:
+            flag = '  REGRESIN'
+            regressions.append(mode)
+        print('\tModo %s: %.1f -> %.1f discos/hora (%+.1f%%)%s' % (mode, previous['discs_per_hour'], current['discs_per_hour'], change, flag))
+    return regressions
+
+def print_results(results):
+    print('Corpus: %d discos, %.1f MB' % (results['parameters']['discs'], results['corpus_bytes'] / (1024 * 1024)))
+    print('\t' + 'Modo'.ljust(6) + 'Segundos'.rjust(10) + 'Discos/hora'.rjust(13) + 'MB/s'.rjust(9) + 'Fallos'.rjust(8))
+    for mode, result in results['modes'].items():
+        print('\t' + mode.ljust(6) + ('%.2f' % result['seconds']).rjust(10) + ('%.1f' % result['discs_per_hour']).rjust(13)
+              + ('%.2f' % result['mb_per_s']).rjust(9) + str(result['failures']).rjust(8))
+
+def parse_arguments(argv = None):
+    parser = argparse.ArgumentParser(description='Prueba de rendimiento de extremo a extremo de binCueMinimizer')
+    parser.add_argument('--discs', type=int, default=12, help='Nmero de discos sintticos')
+    parser.add_argument('--seconds', type=int, default=20, help='Duracin aproximada de cada pista de audio')
+    parser.add_argument('--seed', type=int, default=0, help='Semilla del corpus')
+    parser.add_argument('--modes', type=lambda value: [int(mode) for mode in value.split(',')],
+                        default=[MODE_NORMAL_CHD, MODE_LOSSYWAV, MODE_LOSSYWAV_HARD, MODE_U8WAV], help='Modos a medir, separados por comas')
+    parser.add_argument('--workers', type=int, default=1, help='Procesos en paralelo')
+    parser.add_argument('--tool-speed', type=float, default=None, help='Velocidad de las herramientas en MB/s. Sin ella van tan rpido como pueden')
+    parser.add_argument('--chdman-speed', type=float, default=None, help='Velocidad de chdman en MB/s')
+    parser.add_argument('--ffmpeg-speed', type=float, default=None, help='Velocidad de ffmpeg en MB/s')
+    parser.add_argument('--lossywav-speed', type=float, default=None, help='Velocidad de lossyWAV en MB/s')
+    parser.add_argument('--speed-mode', choices=[stubTool.SPEED_SLEEP, stubTool.SPEED_SPIN], default=stubTool.SPEED_SLEEP,
+                        help='Si las herramientas esperan (sleep) o gastan CPU (spin) para simular su velocidad')
+    parser.add_argument('--streaming', action='store_true', help='Procesar el audio sin ficheros WAV intermedios')
+    parser.add_argument('--no-native', action='store_true', help='Usar siempre ffmpeg en lugar de las conversiones nativas')
+    parser.add_argument('--no-predict', action='store_true', help='Generar todos los modos y pistas sin estimar antes su ganancia')
+    parser.add_argument('--tune', action='store_true', help='Ajustar los cdecs y el tamao de hunk de chdman a cada tipo de disco')
+    parser.add_argument('--work-dir', default=None, help='Directorio en el que generar el corpus. Por defecto, el temporal del sistema')
+    parser.add_argument('--keep', action='store_true', help='No borrar el corpus al terminar')
+    parser.add_argument('--compare', default=None, help='Resultados con los que comparar. Por defecto, los ltimos guardados')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help='Empeoramiento mximo admitido, en tanto por ciento')
+    parser.add_argument('--no-save', action='store_true', help='No guardar los resultados')
+    return parser.parse_args(argv)
+
+def main(argv = None):
+    arguments = parse_arguments(argv)
+    results = run_benchmark(arguments)
+    print_results(results)
+    baseline_path = arguments.compare or get_latest_results()
+    if not arguments.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, time.strftime('%Y%m%d-%H%M%S') + '.json')
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=1, sort_keys=True)
+        print('Resultados guardados en ' + path)
+    regressions = []
+    if baseline_path:
+        with open(baseline_path, 'r', encoding='utf-8') as file:
+            baseline = json.load(file)
+        print('Comparacin con ' + baseline_path + ':')
+        regressions = compare(results, baseline, arguments.tolerance)
+    else:
+        print('No hay resultados anteriores con los que comparar: esta ejecucin servir de referencia')
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,281 @@
+# coding=cp1252
+#
+# microBenchmarks.py
+#
+# Creative Commons Attribution-NonCommercial-ShareAlike 4.0 International (CC BY-NC-SA 4.0) 2019 granmacco <@granmacco>
+# https://github.com/granmacco
+#
+# Script inspired by @krcroft's reddit post on June 25th, 2019
+# https://www.reddit.com/r/RetroPie/comments/c50djy/chd_compression_summary_for_psx/
+# https://github.com/krcroft
+# Thank you very much, without you, this automation wouldn't have existed!
+#
+# Also, special thanks to the Plata o Roms team for finding @krcroft's post, 
+# putting me on the right track and inspiring some of the features of this script.
+# http://t.me/RaspberryPiEmuladores
+# Thank you very much for sharing your knowledge and for striving for excellence!
+#
+# Lastly, but not least, a very special thanks to @Sergi_0, for providing new ideas and methodologies to this script.
+# https://github.com/Sergi_0
+# Thank you very much for your kindness and time!!
+#
+# This code is licensed under Creative Commons BY-NC-SA 4.0
+# You may redistribute it and/or modify it under the terms of the 
+# Creative Commons BY-NC-SA 4.0 License, as published by the Creative
+# Commons on their website http://creativecommons.org/licenses/by-nc-sa/4.0/
+#
+
+
+"""
+Micro-pruebas de rendimiento de las partes en Python puro que se ejecutan con cada disco: el parseo del cue,
+los ndices y timestamps y el partido de pistas. Miden operaciones por segundo y memoria reservada por operacin
+y comparan con una referencia guardada, fallando si alguna empeora ms de la tolerancia.
+
+    python -m benchmarks.microBenchmarks --save-baseline
+    python -m benchmarks.microBenchmarks
+
+La referencia depende de la mquina, as que no se incluye en el repositorio: hay que guardarla antes de comparar.
+
+"""
+
+import argparse
+import copy
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from binCueMinimizer.cueFile import CueFile
+from binCueMinimizer.index import Index
+from binCueMinimizer.timestamp import Timestamp
+from binCueMinimizer.track import Track
+from binCueMinimizer.consts import Framesizes, frames_por_segundo
+from benchmarks.syntheticCorpus import format_msf, redirect_log
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results', 'micro-baseline.json')
+# Empeoramiento mximo admitido, en tanto por ciento
+DEFAULT_TOLERANCE = 25.0
+DEFAULT_MIN_SECONDS = 0.5
+
+def write_cue_sheet(path, name, tracks, indexes_per_track, bin_size, pregaps = False):
+    """
+    Escribe un cue monofichero con el nmero de pistas e ndices indicado y un bin disperso del tamao indicado.
+    La primera pista es de datos y el resto de audio.
+
+    Returns
+    -------
+    str
+        La ruta del cue
+
+    """
+
+    framesize = Framesizes['audio']
+    frames = bin_size // framesize
+    track_frames = frames // tracks
+    lines = ['FILE "' + name + '.bin" BINARY']
+    for number in range(1, tracks + 1):
+        lines.append('  TRACK %02d %s' % (number, 'MODE2/2352' if number == 1 else 'AUDIO'))
+        start = (number - 1) * track_frames
+        if number > 1 and pregaps:
+            lines.append('    PREGAP 00:02:00')
+        elif number > 1:
+            lines.append('    INDEX 00 ' + format_msf(start))
+            start += min(2 * frames_por_segundo, track_frames // 2)
+        lines.append('    INDEX 01 ' + format_msf(start))
+        # ndices adicionales dentro de la pista, como en los discos con varias partes por pista
+        for index in range(2, indexes_per_track + 1):
+            lines.append('    INDEX %02d %s' % (index, format_msf(start + index)))
+    with open(os.path.join(path, name + '.bin'), 'wb') as file:
+        file.truncate(frames * framesize)
+    cue_path = os.path.join(path, name + '.cue')
+    with open(cue_path, 'w') as file:
+        file.write('\n'.join(lines) + '\n')
+    return cue_path
+
+def measure_speed(operation, min_seconds):
+    """
+    Ejecuta la operacin tantas veces como quepan en el tiempo mnimo
+
+    Returns
+    -------
+    float
+        Operaciones por segundo
+
+    """
+
+    operation()
+    count = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_seconds:
+        operation()
+        count += 1
+        elapsed = time.perf_counter() - start
+    return count / elapsed
+
+def measure_allocations(operation):
+    """
+    Mide la memoria que reserva una ejecucin de la operacin
+
+    Returns
+    -------
+    (int, int)
+        El pico de bytes reservados y el nmero de bloques que siguen reservados al terminar
+
+    """
+
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        operation()
+        after = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, 'filename') if stat.count_diff > 0)
+    return peak, blocks
+
+def get_benchmarks(path, bin_mb):
+    """
+    Prepara las operaciones a medir
+
+    Returns
+    -------
+    list [(str, function)]
+        El nombre de cada prueba y la operacin, sin argumentos
+
+    """
+
+    bin_size = bin_mb * 1024 * 1024
+    small_cue = write_cue_sheet(path, 'small', 3, 1, bin_size)
+    large_cue = write_cue_sheet(path, 'large', 99, 3, bin_size)
+    pregap_cue = write_cue_sheet(path, 'pregap', 99, 1, bin_size, pregaps=True)
+    track = Track('01', path=os.path.join(path, 'small.bin'), track_type='AUDIO')
+    minuend = Timestamp('61:59:10')
+    subtrahend = Timestamp('12:34:56')
+    index = Index('01 61:59:74')
+
+    def add_index():
+        track.indexes = {}
+        track.add_index('01 12:34:56')
+
+    def add_index_with_pregap():
+        track.indexes = {}
+        track.add_index('01 12:34:56', pregap='00:02:00')
+
+    def split(cue_path, virtual_audio):
+        # split_tracks reescribe el cue, as que cada operacin parte de una copia del original
+        with open(cue_path, 'r') as file:
+            contents = file.read()
+        work_cue = cue_path[:-4] + '.split.cue'
+
+        def operation():
+            with open(work_cue, 'w') as file:
+                file.write(contents)
+            CueFile(work_cue).split_tracks(virtual_audio=virtual_audio)
+        return operation
+
+    return [
+        ('parse_cue[3 pistas]', lambda: CueFile(small_cue)),
+        ('parse_cue[99 pistas x 3 ndices]', lambda: CueFile(large_cue)),
+        ('parse_cue[99 pistas con PREGAP]', lambda: CueFile(pregap_cue)),
+        ('Track.add_index', add_index),
+        ('Track.add_index[PREGAP]', add_index_with_pregap),
+        ('Timestamp.substract', lambda: copy.copy(minuend).substract(subtrahend)),
+        ('Timestamp.add', lambda: copy.copy(subtrahend).add(minuend)),
+        ('Index.from_timestamp_to_frames', index.from_timestamp_to_frames),
+        ('split_tracks[99 pistas, audio virtual]', split(large_cue, True)),
+        ('split_tracks[99 pistas, %d MB copiados]' % bin_mb, split(large_cue, False))
+        ]
+
+def run_benchmarks(min_seconds, bin_mb, selected = None):
+    """
+    Ejecuta todas las micro-pruebas
+
+    Returns
+    -------
+    dict { str : dict }
+        Para cada prueba, sus operaciones por segundo, el pico de memoria y los bloques que quedan reservados
+
+    """
+
+    results = {}
+    path = tempfile.mkdtemp(prefix='binCueMinimizer-micro-')
+    original_cwd = os.getcwd()
+    try:
+        redirect_log(path)
+        os.chdir(path)
+        for name, operation in get_benchmarks(path, bin_mb):
+            if selected and not any(text in name for text in selected):
+                continue
+            peak, blocks = measure_allocations(operation)
+            results[name] = {'ops_per_s': measure_speed(operation, min_seconds), 'peak_bytes': peak, 'blocks': blocks}
+    finally:
+        os.chdir(original_cwd)
+        shutil.rmtree(path, ignore_errors=True)
+    return results
+
+def compare(results, baseline, tolerance):
+    """
+    Compara los resultados con la referencia
+
+    Returns
+    -------
+    list [str]
+        Las pruebas que empeoran ms de la tolerancia, en velocidad o en memoria
+
+    """
+
+    failures = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        speed_change = (result['ops_per_s'] - reference['ops_per_s']) / reference['ops_per_s'] * 100
+        memory_change = (result['peak_bytes'] - reference['peak_bytes']) / reference['peak_bytes'] * 100 if reference['peak_bytes'] else 0.0
+        if speed_change < -tolerance or memory_change > tolerance:
+            failures.append(name)
+        result['speed_change'] = speed_change
+        result['memory_change'] = memory_change
+    return failures
+
+def print_results(results, failures):
+    print('\t' + 'Prueba'.ljust(42) + 'ops/s'.rjust(12) + 'Pico KB'.rjust(10) + 'Bloques'.rjust(9) + 'Var. ops/s'.rjust(12) + 'Var. memoria'.rjust(14))
+    for name, result in results.items():
+        line = '\t' + name.ljust(42) + ('%.1f' % result['ops_per_s']).rjust(12) + ('%.1f' % (result['peak_bytes'] / 1024)).rjust(10) + str(result['blocks']).rjust(9)
+        if 'speed_change' in result:
+            line += ('%+.1f%%' % result['speed_change']).rjust(12) + ('%+.1f%%' % result['memory_change']).rjust(14)
+        if name in failures:
+            line += '  FALLA'
+        print(line)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description='Micro-pruebas de rendimiento de binCueMinimizer')
+    parser.add_argument('--min-seconds', type=float, default=DEFAULT_MIN_SECONDS, help='Tiempo mnimo de medicin de cada prueba')
+    parser.add_argument('--bin-mb', type=int, default=64, help='Tamao del bin de las pruebas de partido de pistas, en MB')
+    parser.add_argument('--only', action='append', default=None, help='Ejecutar solo las pruebas cuyo nombre contenga este texto')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='Fichero de referencia')
+    parser.add_argument('--save-baseline', action='store_true', help='Guardar los resultados como nueva referencia')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help='Empeoramiento mximo admitido, en tanto por ciento')
+    arguments = parser.parse_args(argv)
+    results = run_benchmarks(arguments.min_seconds, arguments.bin_mb, arguments.only)
+    failures = []
+    if not arguments.save_baseline and os.path.exists(arguments.baseline):
+        with open(arguments.baseline, 'r', encoding='utf-8') as file:
+            failures = compare(results, json.load(file), arguments.tolerance)
+    print_results(results, failures)
+    if not arguments.save_baseline and not os.path.exists(arguments.baseline):
+        print('No hay referencia en ' + arguments.baseline + ' con la que comparar: gurdela con --save-baseline')
+    if arguments.save_baseline:
+        os.makedirs(os.path.dirname(arguments.baseline), exist_ok=True)
+        with open(arguments.baseline, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=1, sort_keys=True)
+        print('Referencia guardada en ' + arguments.baseline)
+    elif failures:
+        print('Pruebas que empeoran ms de un ' + str(arguments.tolerance) + '%: ' + ', '.join(failures))
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,270 @@
+# coding=cp1252
+#
+# stubTool.py
+#
+# Creative Commons Attribution-NonCommercial-ShareAlike 4.0 International (CC BY-NC-SA 4.0) 2019 granmacco <@granmacco>
+# https://github.com/granmacco
+#
+# Script inspired by @krcroft's reddit post on June 25th, 2019
+# https://www.reddit.com/r/RetroPie/comments/c50djy/chd_compression_summary_for_psx/
+# https://github.com/krcroft
+# Thank you very much, without you, this automation wouldn't have existed!
+#
+# Also, special thanks to the Plata o Roms team for finding @krcroft's post, 
+# putting me on the right track and inspiring some of the features of this script.
+# http://t.me/RaspberryPiEmuladores
+# Thank you very much for sharing your knowledge and for striving for excellence!
+#
+# Lastly, but not least, a very special thanks to @Sergi_0, for providing new ideas and methodologies to this script.
+# https://github.com/Sergi_0
+# Thank you very much for your kindness and time!!
+#
+# This code is licensed under Creative Commons BY-NC-SA 4.0
+# You may redistribute it and/or modify it under the terms of the 
+# Creative Commons BY-NC-SA 4.0 License, as published by the Creative
+# Commons on their website http://creativecommons.org/licenses/by-nc-sa/4.0/
+#
+
+
+"""
+Sustitutos deterministas de chdman, ffmpeg y lossyWAV para las pruebas de rendimiento.
+Entienden los mismos argumentos que usa binCueMinimizer, producen ficheros con el formato correcto
+y tardan lo que se les indique, de forma que se puede medir el resto del proceso sin las herramientas reales.
+
+    ffmpeg    Convierte entre PCM s16le, WAV s16le y WAV u8 (con la misma recuantizacin que el ffmpeg real)
+    lossyWAV  Pone a 0 los bits bajos de cada muestra, ms cuantos ms agresivos son sus parmetros
+    chdman    Comprime con zlib, hunk a hunk, el contenido de los bin del cue, con ms nivel cuantos ms cdecs se le
+              indiquen con -c, y extrae de nuevo un CHD a un nico bin
+
+"""
+
+import os
+import re
+import struct
+import sys
+import time
+import zlib
+
+# Tamao de hunk por defecto de chdman para CDs: 8 sectores de 2352 bytes ms 96 de subcdigo
+DEFAULT_HUNK_SIZE = 19584
+DEFAULT_CODECS = 'cdlz,cdzl,cdfl'
+SPEED_SLEEP = 'sleep'
+SPEED_SPIN = 'spin'
+VERSIONS = {
+    'chdman': 'chdman - MAME Compressed Hunks of Data (CHD) manager 0.000 (benchmark stub)',
+    'ffmpeg': 'ffmpeg version 0.0-benchmark-stub',
+    'lossywav': 'lossyWAV 0.0.0 (benchmark stub)'
+    }
+
+def throttle(size, mb_per_second, speed_mode):
+    """
+    Hace que procesar size bytes tarde lo mismo que a la velocidad indicada, durmiendo o gastando CPU
+
+    """
+
+    if not mb_per_second:
+        return
+    deadline = time.perf_counter() + size / (mb_per_second * 1024 * 1024)
+    if speed_mode == SPEED_SPIN:
+        while time.perf_counter() < deadline:
+            pass
+    else:
+        remaining = deadline - time.perf_counter()
+        if remaining > 0:
+            time.sleep(remaining)
+
+def read_input(path):
+    if path in ('-', 'pipe:0'):
+        return sys.stdin.buffer.read()
+    with open(path, 'rb') as file:
+        return file.read()
+
+def write_output(path, data):
+    if path in ('-', 'pipe:1'):
+        sys.stdout.buffer.write(data)
+        sys.stdout.buffer.flush()
+    else:
+        with open(path, 'wb') as file:
+            file.write(data)
+
+def parse_wav(data):
+    """
+    Devuelve los bits por muestra y los datos de un WAV, admitiendo tamaos de chunk sin rellenar
+
+    """
+
+    if data[:4] != b'RIFF' or data[8:12] != b'WAVE':
+        raise ValueError('No es un WAV')
+    position = 12
+    bits_per_sample = 16
+    while position + 8 <= len(data):
+        chunk_id, chunk_size = struct.unpack('<4sI', data[position:position + 8])
+        if chunk_id == b'fmt ':
+            bits_per_sample = struct.unpack('<H', data[position + 22:position + 24])[0]
+        elif chunk_id == b'data':
+            return bits_per_sample, data[position + 8:position + 8 + chunk_size]
+        position += 8 + chunk_size + (chunk_size & 1)
+    raise ValueError('WAV sin datos')
+
+def build_wav(data, bits_per_sample):
+    channels = 2
+    sample_rate = 44100
+    block_align = channels * bits_per_sample // 8
+    return struct.pack('<4sI4s4sIHHIIHH4sI', b'RIFF', 36 + len(data), b'WAVE', b'fmt ', 16, 1, channels, sample_rate,
+                       sample_rate * block_align, block_align, bits_per_sample, b'data', len(data)) + data
+
+def to_u8(data):
+    # El byte alto de cada muestra s16, desplazado a sin signo
+    return data[1::2].translate(bytes((value + 128) & 0xFF for value in range(256)))
+
+def from_u8(data):
+    result = bytearray(len(data) * 2)
+    result[1::2] = data.translate(bytes((value - 128) & 0xFF for value in range(256)))
+    return bytes(result)
+
+def get_option(arguments, option, default = None):
+    if option in arguments:
+        return arguments[arguments.index(option) + 1]
+    return default
+
+def run_ffmpeg(arguments, mb_per_second, speed_mode):
+    input_index = arguments.index('-i')
+    source = arguments[input_index + 1]
+    target = arguments[-1]
+    data = read_input(source)
+    throttle(len(data), mb_per_second, speed_mode)
+    if get_option(arguments[:input_index], '-f') == 's16le':
+        samples = data
+    else:
+        bits_per_sample, samples = parse_wav(data)
+        if bits_per_sample == 8:
+            samples = from_u8(samples)
+    output_format = get_option(arguments[input_index:], '-f')
+    if output_format == 'wav':
+        if get_option(arguments[input_index:], '-acodec') == 'pcm_u8':
+            write_output(target, build_wav(to_u8(samples), 8))
+        else:
+            write_output(target, build_wav(samples, 16))
+    else:
+        write_output(target, samples)
+
+def run_lossywav(arguments, mb_per_second, speed_mode):
+    source = arguments[0]
+    data = read_input(source)
+    throttle(len(data), mb_per_second, speed_mode)
+    bits_per_sample, samples = parse_wav(data)
+    # Ms bits eliminados cuanto menor es el lmite de frecuencia, como en los perfiles de binCueMinimizer
+    removed_bits = 4 if int(get_option(arguments, '--limit', '15848')) >= 15000 else 6
+    mask = (0xFF << removed_bits) & 0xFF
+    low_bytes = samples[0::2].translate(bytes(value & mask for value in range(256)))
+    result = bytearray(samples)
+    result[0::2] = low_bytes
+    output = build_wav(bytes(result), bits_per_sample)
+    if '--stdout' in arguments:
+        write_output('-', output)
+    else:
+        target_dir = get_option(arguments, '-o', os.path.dirname(source))
+        write_output(os.path.join(target_dir, os.path.basename(source)[:-4] + '.lossy.WAV'), output)
+
+def run_chdman(arguments, mb_per_second, speed_mode):
+    source = get_option(arguments, '-i')
+    target = get_option(arguments, '-o')
+    if os.path.exists(target) and '--force' not in arguments and '-f' not in arguments:
+        sys.stderr.write('Error: file already exists (' + target + ')\n')
+        return 1
+    hunk_size = int(get_option(arguments, '-hs', DEFAULT_HUNK_SIZE))
+    # Como con los cdecs reales, probar ms de uno comprime algo ms a cambio de ms tiempo
+    level = 2 * len(get_option(arguments, '-c', DEFAULT_CODECS).split(','))
+    directory = os.path.dirname(source)
+    with open(source, 'r') as file:
+        bins = [os.path.join(directory, name) for name in re.findall(r'FILE "(.*)"', file.read())]
+    # Como chdman, se escribe directamente en el destino, que va creciendo mientras se comprime
+    with open(target, 'wb') as output:
+        output.write(b'MComprHD')
+        for path in bins:
+            with open(path, 'rb') as file:
+                while True:
+                    hunk = file.read(hunk_size)
+                    if not hunk:
+                        break
+                    throttle(len(hunk), mb_per_second, speed_mode)
+                    compressed = zlib.compress(hunk, level)
+                    output.write(struct.pack('<I', len(compressed)) + compressed)
+    return 0
+
+def run_chdman_extract(arguments, mb_per_second, speed_mode):
+    source = get_option(arguments, '-i')
+    target = get_option(arguments, '-o')
+    target_bin = get_option(arguments, '-ob', target[:-4] + '.bin')
+    with open(source, 'rb') as file:
+        data = file.read()
+    position = len(b'MComprHD')
+    with open(target_bin, 'wb') as output:
+        while position < len(data):
+            size = struct.unpack('<I', data[position:position + 4])[0]
+            hunk = zlib.decompress(data[position + 4:position + 4 + size])
+            throttle(len(hunk), mb_per_second, speed_mode)
+            output.write(hunk)
+            position += 4 + size
+    with open(target, 'w') as file:
+        file.write('FILE "' + os.path.basename(target_bin) + '" BINARY\n  TRACK 01 MODE1/2352\n    INDEX 01 00:00:00\n')
+    return 0
+
+def main(tool, mb_per_second = None, speed_mode = SPEED_SLEEP):
+    """
+    Ejecuta el sustituto de una herramienta con los argumentos de la lnea de comandos
+
+    Parameters
+    ----------
+    tool : str
+        La herramienta: chdman, ffmpeg o lossywav
+    mb_per_second : float
+        La velocidad a simular. Sin ella, la herramienta va tan rpido como puede
+    speed_mode : str
+        SPEED_SLEEP para esperar sin gastar CPU o SPEED_SPIN para simular una herramienta limitada por la CPU
+
+    """
+
+    tool = tool.casefold()
+    arguments = sys.argv[1:]
+    if not arguments or arguments[0] in ('--help', '-version', '--version'):
+        print(VERSIONS[tool])
+        sys.exit(0)
+    if tool == 'ffmpeg':
+        run_ffmpeg(arguments, mb_per_second, speed_mode)
+    elif tool == 'lossywav':
+        run_lossywav(arguments, mb_per_second, speed_mode)
+    elif tool == 'chdman':
+        if arguments[0] == 'extractcd':
+            sys.exit(run_chdman_extract(arguments[1:], mb_per_second, speed_mode))
+        sys.exit(run_chdman(arguments[1:], mb_per_second, speed_mode))
+
+def install(path, mb_per_second = None, speed_mode = SPEED_SLEEP):
+    """
+    Crea en un directorio los ejecutables chdman, ffmpeg y lossyWAV que lanzan estos sustitutos
+
+    Parameters
+    ----------
+    path : str
+        El directorio
+    mb_per_second : dict { str : float }
+        La velocidad de cada herramienta, por nombre en minsculas. Las que no aparecen van tan rpido como pueden
+    speed_mode : str
+        SPEED_SLEEP o SPEED_SPIN
+
+    """
+
+    if os.name == 'nt':
+        raise OSError('Los sustitutos de las herramientas solo funcionan en sistemas POSIX')
+    mb_per_second = mb_per_second or {}
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for name in ['chdman', 'ffmpeg', 'lossyWAV']:
+        script = '#!' + sys.executable + '\n'
+        script += 'import sys\n'
+        script += 'sys.path.insert(0, ' + repr(root) + ')\n'
+        script += 'from benchmarks.stubTool import main\n'
+        script += 'main(' + repr(name) + ', ' + repr(mb_per_second.get(name.casefold())) + ', ' + repr(speed_mode) + ')\n'
+        target = os.path.join(path, name)
+        with open(target, 'w') as file:
+            file.write(script)
+        os.chmod(target, 0o755)
@@ -0,0 +1,240 @@
+# coding=cp1252
+#
+# syntheticCorpus.py
+#
+# Creative Commons Attribution-NonCommercial-ShareAlike 4.0 International (CC BY-NC-SA 4.0) 2019 granmacco <@granmacco>
+# https://github.com/granmacco
+#
+# Script inspired by @krcroft's reddit post on June 25th, 2019
+# https://www.reddit.com/r/RetroPie/comments/c50djy/chd_compression_summary_for_psx/
+# https://github.com/krcroft
+# Thank you very much, without you, this automation wouldn't have existed!
+#
+# Also, special thanks to the Plata o Roms team for finding @krcroft's post, 
+# putting me on the right track and inspiring some of the features of this script.
+# http://t.me/RaspberryPiEmuladores
+# Thank you very much for sharing your knowledge and for striving for excellence!
+#
+# Lastly, but not least, a very special thanks to @Sergi_0, for providing new ideas and methodologies to this script.
+# https://github.com/Sergi_0
+# Thank you very much for your kindness and time!!
+#
+# This code is licensed under Creative Commons BY-NC-SA 4.0
+# You may redistribute it and/or modify it under the terms of the 
+# Creative Commons BY-NC-SA 4.0 License, as published by the Creative
+# Commons on their website http://creativecommons.org/licenses/by-nc-sa/4.0/
+#
+
+
+"""
+Generador de discos cue/bin sintticos y deterministas para las pruebas de rendimiento: monofichero y multifichero,
+con distinto nmero de pistas de audio, pistas con INDEX 00 o PREGAP y todos los tipos de pista de Framesizes.
+
+"""
+
+import logging
+import os
+import random
+from binCueMinimizer.consts import Framesizes, frames_por_segundo, segundos_por_minuto
+
+LAYOUT_MONOFILE = 'monofile'
+LAYOUT_MULTIFILE = 'multifile'
+GAP_NONE = 'none'
+GAP_INDEX_00 = 'index00'
+GAP_PREGAP = 'pregap'
+# Tipos de pista de datos en el mismo orden que Framesizes, para recorrerlos todos
+DATA_TRACK_TYPES = [track_type.upper() for track_type in Framesizes if track_type != 'audio']
+# Duracin de los huecos entre pistas: 2 segundos, como en los discos reales
+GAP_FRAMES = 2 * frames_por_segundo
+
+class DiscSpec:
+    """
+    Describe un disco sinttico
+
+    """
+
+    name = None
+    layout = LAYOUT_MONOFILE
+    data_track_type = 'MODE2/2352'
+    data_frames = 0
+    audio_tracks = 0
+    audio_frames = 0
+    gap = GAP_NONE
+    quiet = False
+
+    def __init__(self, name, layout, data_track_type, data_frames, audio_tracks, audio_frames, gap, quiet = False):
+        self.name = name
+        self.layout = layout
+        self.data_track_type = data_track_type
+        self.data_frames = data_frames
+        self.audio_tracks = audio_tracks
+        self.audio_frames = audio_frames
+        self.gap = gap
+        self.quiet = quiet
+
+    def get_framesize(self):
+        return Framesizes[self.data_track_type.casefold()]
+
+    def get_size(self):
+        """
+        Devuelve el tamao en bytes de todos los bin del disco
+
+        """
+
+        return self.data_frames * self.get_framesize() + self.audio_tracks * self.audio_frames * Framesizes['audio']
+
+def get_specs(discs, seconds = 30, seed = 0):
+    """
+    Genera la descripcin de un corpus que recorre todas las combinaciones de formato, tipo de pista de datos y huecos
+
+    Parameters
+    ----------
+    discs : int
+        El nmero de discos
+    seconds : int
+        La duracin aproximada de cada pista de audio. La pista de datos ocupa lo mismo que dos pistas de audio
+    seed : int
+        La semilla, para que el corpus sea siempre el mismo
+
+    Returns
+    -------
+    list [DiscSpec]
+        Los discos
+
+    """
+
+    rng = random.Random(seed)
+    layouts = [LAYOUT_MONOFILE, LAYOUT_MULTIFILE]
+    gaps = [GAP_NONE, GAP_INDEX_00, GAP_PREGAP]
+    specs = []
+    for number in range(discs):
+        audio_frames = seconds * frames_por_segundo + rng.randrange(frames_por_segundo)
+        specs.append(DiscSpec(name='disc%03d' % number,
+                              layout=layouts[number % len(layouts)],
+                              data_track_type=DATA_TRACK_TYPES[number % len(DATA_TRACK_TYPES)],
+                              data_frames=2 * seconds * frames_por_segundo,
+                              # Algn disco sin audio, que solo admite el modo sin prdidas
+                              audio_tracks=number % 6,
+                              audio_frames=audio_frames,
+                              gap=gaps[(number // len(layouts)) % len(gaps)],
+                              quiet=number % 4 == 3))
+    return specs
+
+def format_msf(frames):
+    minutes, frames = divmod(frames, segundos_por_minuto * frames_por_segundo)
+    seconds, frames = divmod(frames, frames_por_segundo)
+    return '%02d:%02d:%02d' % (minutes, seconds, frames)
+
+def random_bytes(rng, size):
+    # Equivalente a Random.randbytes, que no existe antes de Python 3.9
+    if size == 0:
+        return b''
+    return rng.getrandbits(size * 8).to_bytes(size, 'little')
+
+def generate_audio(rng, size, quiet):
+    """
+    Genera audio PCM s16le pseudoaleatorio. El audio tranquilo solo usa los bits bajos, como una pista casi en silencio
+
+    """
+
+    data = random_bytes(rng, size)
+    if quiet:
+        result = bytearray(data)
+        result[1::2] = data[1::2].translate(bytes(0 if value < 128 else 0xFF for value in range(256)))
+        data = bytes(result)
+    return data
+
+def write_disc(spec, path, seed = 0):
+    """
+    Escribe un disco sinttico
+
+    Parameters
+    ----------
+    spec : DiscSpec
+        El disco
+    path : str
+        El directorio en el que escribirlo
+    seed : int
+        La semilla del contenido
+
+    Returns
+    -------
+    str
+        La ruta del cue
+
+    """
+
+    rng = random.Random(str(seed) + spec.name)
+    os.makedirs(path, exist_ok=True)
+    tracks = [(spec.data_track_type, random_bytes(rng, spec.data_frames * spec.get_framesize()))]
+    for number in range(spec.audio_tracks):
+        tracks.append(('AUDIO', generate_audio(rng, spec.audio_frames * Framesizes['audio'], spec.quiet and number % 2 == 0)))
+    lines = []
+    if spec.layout == LAYOUT_MONOFILE:
+        bin_name = spec.name + '.bin'
+        lines.append('FILE "' + bin_name + '" BINARY')
+        with open(os.path.join(path, bin_name), 'wb') as file:
+            position = 0
+            for number, (track_type, data) in enumerate(tracks, 1):
+                lines.append('  TRACK %02d %s' % (number, track_type))
+                frames = len(data) // Framesizes[track_type.casefold()]
+                if number > 1 and spec.gap == GAP_INDEX_00:
+                    # El hueco forma parte del fichero: son los ltimos frames de la pista
+                    lines.append('    INDEX 00 ' + format_msf(position))
+                    lines.append('    INDEX 01 ' + format_msf(position + GAP_FRAMES))
+                else:
+                    if number > 1 and spec.gap == GAP_PREGAP:
+                        lines.append('    PREGAP ' + format_msf(GAP_FRAMES))
+                    lines.append('    INDEX 01 ' + format_msf(position))
+                file.write(data)
+                position += frames
+    else:
+        for number, (track_type, data) in enumerate(tracks, 1):
+            bin_name = '%s (Track %02d).bin' % (spec.name, number)
+            lines.append('FILE "' + bin_name + '" BINARY')
+            lines.append('  TRACK %02d %s' % (number, track_type))
+            if number > 1 and spec.gap == GAP_INDEX_00:
+                lines.append('    INDEX 00 00:00:00')
+                lines.append('    INDEX 01 ' + format_msf(GAP_FRAMES))
+            else:
+                if number > 1 and spec.gap == GAP_PREGAP:
+                    lines.append('    PREGAP ' + format_msf(GAP_FRAMES))
+                lines.append('    INDEX 01 00:00:00')
+            with open(os.path.join(path, bin_name), 'wb') as file:
+                file.write(data)
+    cue_path = os.path.join(path, spec.name + '.cue')
+    with open(cue_path, 'w') as file:
+        file.write('\n'.join(lines) + '\n')
+    return cue_path
+
+def redirect_log(path):
+    """
+    Lleva el log de binCueMinimizer al directorio de la prueba, para no llenar el del directorio actual
+
+    Parameters
+    ----------
+    path : str
+        El directorio de la prueba
+
+    """
+
+    root = logging.getLogger()
+    handler = logging.FileHandler(os.path.join(path, 'binCueMinimizer.log'))
+    for previous in list(root.handlers):
+        handler.setFormatter(previous.formatter)
+        root.removeHandler(previous)
+        previous.close()
+    root.addHandler(handler)
+
+def write_corpus(specs, path, seed = 0):
+    """
+    Escribe todos los discos de un corpus, cada uno en su propio directorio
+
+    Returns
+    -------
+    list [str]
+        Las rutas de los cues
+
+    """
+
+    return [write_disc(spec, os.path.join(path, spec.name), seed) for spec in specs]
@@ -0,0 +1,461 @@
+# coding=cp1252
+#
+# batchExecutor.py
+#
+# Creative Commons Attribution-NonCommercial-ShareAlike 4.0 International (CC BY-NC-SA 4.0) 2019 granmacco <@granmacco>
+# https://github.com/granmacco
+#
+# Script inspired by @krcroft's reddit post on June 25th, 2019
+# https://www.reddit.com/r/RetroPie/comments/c50djy/chd_compression_summary_for_psx/
+# https://github.com/krcroft
+# Thank you very much, without you, this automation wouldn't have existed!
+#
+# Also, special thanks to the Plata o Roms team for finding @krcroft's post, 
+# putting me on the right track and inspiring some of the features of this script.
+# http://t.me/RaspberryPiEmuladores
+# Thank you very much for sharing your knowledge and for striving for excellence!
+#
+# Lastly, but not least, a very special thanks to @Sergi_0, for providing new ideas and methodologies to this script.
+# https://github.com/Sergi_0
+# Thank you very much for your kindness and time!!
+#
+# This code is licensed under Creative Commons BY-NC-SA 4.0
+# You may redistribute it and/or modify it under the terms of the 
+# Creative Commons BY-NC-SA 4.0 License, as published by the Creative
+# Commons on their website http://creativecommons.org/licenses/by-nc-sa/4.0/
+#
+
+
+import logging
+import os
+import tempfile
+from shutil import rmtree
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from binCueMinimizer.binCueMinimizer import BinCueMinimizer
+from binCueMinimizer.cueFile import CueFile, save_parse_cache
+from binCueMinimizer.toolRegistry import get_registry
+from binCueMinimizer.trackCache import TrackCache
+from binCueMinimizer.trackIndex import TrackIndex
+from binCueMinimizer import cpuBudget
+from binCueMinimizer.stageMetrics import summarize, format_summary
+from binCueMinimizer.consts import MODE_NORMAL_CHD, MODE_LOSSYWAV, MODE_LOSSYWAV_HARD, MODE_U8WAV, MODE_EVERYTHING
+
+class Job:
+    cue_path = None
+    operation_mode = None
+    overwrite_chd = False
+    original_dir = None
+    minimizer_options = None
+
+    def __init__(self, cue_path, operation_mode, overwrite_chd = False, original_dir = None, minimizer_options = None):
+        self.cue_path = cue_path
+        self.operation_mode = operation_mode
+        self.overwrite_chd = overwrite_chd
+        self.original_dir = original_dir
+        self.minimizer_options = minimizer_options or {}
+
+    def __str__(self):
+        return self.cue_path + ' (modo ' + str(self.operation_mode) + ')'
+
+class JobResult:
+    job = None
+    success = False
+    error = None
+    pruned_modes = None
+
+    def __init__(self, job, success, error = None, pruned_modes = None):
+        self.job = job
+        self.success = success
+        self.error = error
+        # Modos que no se generaron por no alcanzar la ganancia mnima estimada
+        self.pruned_modes = pruned_modes or []
+
+def run_job(job):
+    """
+    Ejecuta un trabajo cue x modo. Se usa tanto en el proceso principal como en los procesos del pool,
+    por lo que no debe dejar excepciones sin capturar.
+
+    Parameters
+    ----------
+    job : Job
+        El trabajo a ejecutar
+
+    Returns
+    -------
+    JobResult
+        El resultado del trabajo
+
+    """
+
+    try:
+        minimizer = BinCueMinimizer(operation_mode=job.operation_mode, overwrite_chd=job.overwrite_chd, original_dir=job.original_dir, **job.minimizer_options)
+        with cpuBudget.running_job():
+            minimizer.minimise_cue(CueFile(job.cue_path))
+        return JobResult(job, True, pruned_modes=minimizer.pruned_modes)
+    except (Exception, SystemExit) as e:
+        logging.exception('Error procesando ' + str(job))
+        # Se devuelve el mensaje y no la excepcin, que podra no ser serializable entre procesos
+        return JobResult(job, False, str(e))
+
+class BatchExecutor:
+    workers = 1
+    overwrite_chd = False
+    original_dir = None
+    minimizer_options = None
+    manifest = None
+    dedup = False
+    cores = None
+    skipped = 0
+
+    def __init__(self, workers = 1, overwrite_chd = False, original_dir = None, minimizer_options = None, manifest = None, dedup = False, cores = None):
+        self.workers = max(1, int(workers))
+        # Ncleos que pueden ocupar entre todos los trabajos. Por defecto, todos los de la mquina
+        self.cores = cores
+        self.overwrite_chd = overwrite_chd
+        # Reutilizar el resultado de las pistas de audio que se repiten entre discos de la biblioteca
+        self.dedup = dedup
+        # Manifiesto opcional (BuildManifest) para saltar los trabajos cuyo CHD sigue al da
+        self.manifest = manifest
+        # Opciones adicionales para cada BinCueMinimizer, p.ej. { 'streaming': True }
+        self.minimizer_options = minimizer_options or {}
+        if original_dir is None:
+            original_dir = os.getcwd()
+        self.original_dir = original_dir
+
+    def get_jobs(self, cue_paths, modes):
+        """
+        Genera los trabajos cue x modo a ejecutar
+
+        Parameters
+        ----------
+        cue_paths : iterable [str]
+            Las rutas de los ficheros cue. Puede ser un generador, que se consume segn se necesitan trabajos
+        modes : list [int]
+            Los modos de operacin a aplicar a cada cue
+
+        Returns
+        -------
+        generator [Job]
+            Los trabajos, en el mismo orden en que se procesaran secuencialmente
+
+        """
+
+        for cue_path in cue_paths:
+            for mode in modes:
+                yield Job(cue_path, mode, overwrite_chd=self.overwrite_chd, original_dir=self.original_dir, minimizer_options=self.minimizer_options)
+
+    def get_job_modes(self, job):
+        """
+        Devuelve los modos que genera un trabajo. MODE_EVERYTHING genera el CHD sin prdidas y los de todos los modos con prdidas
+
+        """
+
+        if job.operation_mode == MODE_EVERYTHING:
+            return [MODE_NORMAL_CHD, MODE_LOSSYWAV, MODE_LOSSYWAV_HARD, MODE_U8WAV]
+        return [job.operation_mode]
+
+    def get_minimizer(self, mode):
+        return BinCueMinimizer(operation_mode=mode, overwrite_chd=self.overwrite_chd, original_dir=self.original_dir, **self.minimizer_options)
+
+    def get_pending_jobs(self, jobs):
+        """
+        Descarta los trabajos cuyos CHD siguen al da segn el manifiesto. Si de un trabajo MODE_EVERYTHING
+        solo quedan algunos modos pendientes, se sustituye por un trabajo por cada uno de ellos.
+        Los trabajos pendientes sobreescriben el CHD anterior, ya que est desactualizado.
+
+        Parameters
+        ----------
+        jobs : iterable [Job]
+            Los trabajos
+
+        Returns
+        -------
+        generator [Job]
+            Los trabajos pendientes
+
+        """
+
+        for job in jobs:
+            cue = CueFile(job.cue_path)
+            if not cue.is_processable():
+                # Se deja que el trabajo falle e informe del error
+                yield job
+                continue
+            modes = self.get_job_modes(job)
+            stale_modes = []
+            overwrite = False
+            for mode in modes:
+                minimizer = self.get_minimizer(mode)
+                chd_path = minimizer.get_chd_path(cue)
+                if not self.manifest.is_current(cue, mode, chd_path, minimizer.get_build_signature()):
+                    stale_modes.append(mode)
+                    overwrite |= os.path.exists(chd_path)
+            if not stale_modes:
+                self.skipped += 1
+                msg = 'AL DA ' + str(job)
+                logging.info(msg)
+                print(msg)
+                continue
+            if len(stale_modes) == len(modes):
+                stale_jobs = [job]
+            else:
+                stale_jobs = [Job(job.cue_path, mode, overwrite_chd=job.overwrite_chd, original_dir=job.original_dir, minimizer_options=job.minimizer_options) for mode in stale_modes]
+            for stale_job in stale_jobs:
+                stale_job.overwrite_chd |= overwrite
+                yield stale_job
+
+    def record(self, result):
+        """
+        Registra en el manifiesto los CHD generados por un trabajo completado
+
+        Parameters
+        ----------
+        result : JobResult
+            El resultado del trabajo
+
+        """
+
+        if self.manifest is None or not result.success:
+            return
+        try:
+            cue = CueFile(result.job.cue_path)
+            for mode in self.get_job_modes(result.job):
+                minimizer = self.get_minimizer(mode)
+                chd_path = minimizer.get_chd_path(cue)
+                if mode in result.pruned_modes:
+                    # Se registra sin CHD, para no volver a intentarlo mientras no cambien las entradas
+                    self.manifest.record(cue, mode, None, minimizer.get_build_signature())
+                elif os.path.exists(chd_path):
+                    self.manifest.record(cue, mode, chd_path, minimizer.get_build_signature())
+            self.manifest.save()
+        except (OSError, ValueError):
+            logging.exception('No se pudo registrar en el manifiesto ' + str(result.job))
+
+    def prepare_dedup(self, cue_paths):
+        """
+        Indexa las pistas de audio de toda la biblioteca para reutilizar las que se repiten entre discos.
+        Si no hay cach de pistas, se crea una solo para este lote, en la que nicamente se guardan las pistas repetidas.
+        La persistente ya guarda todas, as que con ella no hace falta el ndice.
+
+        Es lo nico que recorre la biblioteca entera antes de empezar, y solo se hace si se pide: la primera copia
+        de una pista repetida ya tiene que guardarse en la cach, y un ndice construido segn llegan los cues no la
+        reconocera como repetida hasta ver la segunda, as que en los juegos de dos discos no se reutilizara nada.
+
+        Parameters
+        ----------
+        cue_paths : iterable [str]
+            Las rutas de los ficheros cue
+
+        Returns
+        -------
+        (list [str], str)
+            Las rutas de los cues, ya recorridas, y el directorio de la cach del lote, o None si no se ha creado
+
+        """
+
+        if self.minimizer_options.get('track_cache') is not None:
+            logging.info('La cach de pistas ya reutiliza las pistas repetidas entre discos')
+            return cue_paths, None
+        msg = 'Buscando pistas de audio repetidas en toda la biblioteca antes de empezar...'
+        logging.info(msg)
+        print(msg)
+        cue_paths = list(cue_paths)
+        index = TrackIndex()
+        for cue_path in cue_paths:
+            try:
+                index.add_cue(cue_path)
+            except (OSError, ValueError):
+                logging.exception('No se pudieron indexar las pistas de ' + cue_path)
+        index.build()
+        if not index.candidates:
+            return cue_paths, None
+        path = tempfile.mkdtemp(prefix='.binCueMinimizer.dedup.', dir=self.original_dir)
+        self.minimizer_options['track_cache'] = TrackCache(path)
+        self.minimizer_options['track_index'] = index
+        return cue_paths, path
+
+    def run(self, cue_paths, modes):
+        """
+        Ejecuta todos los trabajos. Con un solo worker se ejecutan en este mismo proceso, lo que facilita la depuracin.
+
+        Parameters
+        ----------
+        cue_paths : iterable [str]
+            Las rutas de los ficheros cue. Si es un generador, el primer trabajo arranca en cuanto se obtiene su cue
+        modes : list [int]
+            Los modos de operacin a aplicar a cada cue
+
+        Returns
+        -------
+        list [JobResult]
+            El resultado de cada trabajo
+
+        """
+
+        # Las herramientas se resuelven aqu una sola vez y los trabajos reciben ya sus rutas
+        if 'tools' not in self.minimizer_options:
+            self.minimizer_options['tools'] = get_registry(str(self.original_dir))
+        dedup_dir = None
+        if self.dedup:
+            cue_paths, dedup_dir = self.prepare_dedup(cue_paths)
+        try:
+            jobs = self.get_jobs(cue_paths, modes)
+            self.skipped = 0
+            if self.manifest is not None:
+                jobs = self.get_pending_jobs(jobs)
+            results = []
+            if self.workers == 1:
+                cpuBudget.set_budget(cpuBudget.CpuBudget(self.cores))
+                try:
+                    for job in jobs:
+                        results.append(self.report(run_job(job)))
+                finally:
+                    cpuBudget.set_budget(None)
+            else:
+                self.run_in_pool(jobs, results)
+        finally:
+            if dedup_dir is not None:
+                del self.minimizer_options['track_cache']
+                del self.minimizer_options['track_index']
+                rmtree(dedup_dir, ignore_errors=True)
+        save_parse_cache()
+        if self.manifest is not None:
+            # Se guardan tambin los CHD que se hayan dado por buenos sin entrada previa en el manifiesto
+            self.manifest.save()
+        self.report_summary(results)
+        return results
+
+    def create_pool(self):
+        """
+        Crea el pool de procesos, con un presupuesto de CPU nuevo. Solo se puede compartir al crear los procesos
+
+        """
+
+        budget = cpuBudget.CpuBudget(self.cores)
+        logging.info('Lanzando trabajos en ' + str(self.workers) + ' procesos con ' + str(budget.cores) + ' ncleos')
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=cpuBudget.set_budget, initargs=(budget,))
+
+    def get_result(self, future, job):
+        """
+        Devuelve el resultado de un trabajo ejecutado en el pool. Si su proceso ha muerto (falta de memoria, una seal...)
+        el trabajo se da por fallido, en lugar de interrumpir el lote
+
+        Parameters
+        ----------
+        future : Future
+            El trabajo en el pool
+        job : Job
+            El trabajo
+
+        Returns
+        -------
+        JobResult
+            El resultado del trabajo
+
+        """
+
+        try:
+            return future.result()
+        except BrokenProcessPool as e:
+            logging.error('El proceso que ejecutaba ' + str(job) + ' ha terminado de forma inesperada')
+            return JobResult(job, False, 'el proceso ha terminado de forma inesperada (' + (str(e) or type(e).__name__) + ')')
+        except Exception as e:
+            logging.exception('Error recogiendo el resultado de ' + str(job))
+            return JobResult(job, False, str(e) or type(e).__name__)
+
+    def run_in_pool(self, jobs, results):
+        """
+        Ejecuta los trabajos en un pool de procesos. Si un proceso muere, los trabajos que estaban en el pool se dan por
+        fallidos y el resto se ejecutan en un pool nuevo, con un presupuesto de CPU nuevo: el anterior podra tener
+        ncleos reservados por el proceso muerto
+
+        Parameters
+        ----------
+        jobs : iterable [Job]
+            Los trabajos
+        results : list [JobResult]
+            La lista a la que aadir el resultado de cada trabajo
+
+        """
+
+        executor = self.create_pool()
+        # Solo se encolan unos pocos trabajos por proceso, para no recorrer toda la biblioteca por adelantado
+        futures = {}
+        try:
+            for job in jobs:
+                if len(futures) >= 2 * self.workers:
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        results.append(self.report(self.get_result(future, futures.pop(future))))
+                try:
+                    future = executor.submit(run_job, job)
+                except BrokenProcessPool:
+                    logging.warning('El pool de procesos se ha roto, se lanza uno nuevo')
+                    for future in as_completed(futures):
+                        results.append(self.report(self.get_result(future, futures[future])))
+                    futures = {}
+                    executor.shutdown(wait=False)
+                    executor = self.create_pool()
+                    future = executor.submit(run_job, job)
+                futures[future] = job
+            for future in as_completed(futures):
+                results.append(self.report(self.get_result(future, futures[future])))
+        finally:
+            executor.shutdown()
+
+    def report(self, result):
+        """
+        Informa del resultado de un trabajo
+
+        Parameters
+        ----------
+        result : JobResult
+            El resultado a informar
+
+        Returns
+        -------
+        JobResult
+            El mismo resultado, para poder encadenar la llamada
+
+        """
+
+        self.record(result)
+        if result.success:
+            msg = 'OK    ' + str(result.job)
+            if result.pruned_modes:
+                msg += ', sin ganancia suficiente en modo ' + ', '.join(str(mode) for mode in result.pruned_modes)
+            logging.info(msg)
+        else:
+            msg = 'ERROR ' + str(result.job) + ': ' + str(result.error)
+            logging.error(msg)
+        print(msg)
+        return result
+
+    def report_summary(self, results):
+        """
+        Muestra el resumen de la ejecucin del lote
+
+        Parameters
+        ----------
+        results : list [JobResult]
+            Los resultados de los trabajos
+
+        """
+
+        failed = [result for result in results if not result.success]
+        metrics = self.minimizer_options.get('metrics')
+        if metrics is not None and metrics.is_enabled():
+            # Los eventos de los trabajos ejecutados en otros procesos solo estn en el fichero
+            msg = format_summary(summarize(metrics.read_events(metrics.batch)), 'Etapas del lote ' + metrics.batch)
+            logging.info(msg)
+            print(msg)
+        msg = 'Trabajos completados: ' + str(len(results) - len(failed)) + '/' + str(len(results))
+        if self.skipped:
+            msg += '\n' + 'Trabajos al da: ' + str(self.skipped)
+        if failed:
+            msg += '\n' + 'Trabajos fallidos:'
+            for result in failed:
+                msg += '\n' + '\t' + str(result.job) + ': ' + str(result.error)
+        logging.info(msg)
+        print(msg)
@@ -27,25 +27,36 @@
 
 import logging
 import os
-import platform
 import shutil
 import re
-from binCueMinimizer.osUtils import run, delete_files
+from binCueMinimizer.osUtils import run, run_pipeline, delete_files, move_file, place_file
+from binCueMinimizer import wavFile, pcmQuantizer, silenceDetector, gainPredictor
+from binCueMinimizer.cpuBudget import use_cores
+from binCueMinimizer.toolRegistry import get_registry
+from binCueMinimizer.libraryScanner import get_bin_paths
+from binCueMinimizer.cueFile import CueFile
+from binCueMinimizer.track import Track
+from binCueMinimizer.stageMetrics import MetricsRecorder, summarize, format_summary, get_size,\
+    STAGE_COPY, STAGE_SPLIT, STAGE_BIN_TO_WAV, STAGE_LOSSYWAV, STAGE_COMPLIANCE, STAGE_WAV_TO_BIN, STAGE_U8, STAGE_STREAM, STAGE_TUNE, STAGE_CHDMAN, STAGE_SILENCE, STAGE_PREDICT, STATUS_ABORTED
 from binCueMinimizer.consts import MODE_NORMAL_CHD, MODE_LOSSYWAV,\
-    MODE_LOSSYWAV_HARD, MODE_U8WAV
+    MODE_LOSSYWAV_HARD, MODE_U8WAV, MODE_EVERYTHING
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from shutil import rmtree
 
 class BinCueMinimizer:
 
-    def __init__(self, operation_mode = 2, overwrite_chd = False):
+    def __init__(self, operation_mode = 2, overwrite_chd = False, original_dir = None, track_workers = None, streaming = False, native_pcm = True, virtual_tracks = True, tools = None, track_cache = None, track_index = None, metrics = None, detect_silence = True, predict_gain = True, min_gain = gainPredictor.MIN_GAIN, discard_oversized = True, watch_chd = True, chd_tuner = None):
         self.base_cue_to_chd_command = "chdman createcd -i %INPUT -o %OUTPUT"
         self.base_bin_to_wav_command = "ffmpeg -y -hide_banner -nostats -loglevel panic -f s16le -ar 44.1k -ac 2 -i %INPUT -f wav -flags +bitexact -acodec pcm_s16le -ar 44100 -ac 2 %OUTPUT"
         self.base_bin_to_wav_u8_command = "ffmpeg -y -hide_banner -nostats -loglevel panic -f s16le -ar 44.1k -ac 2 -i %INPUT -f wav -flags +bitexact -acodec pcm_u8 -ar 44100 -ac 2 %OUTPUT"
-        self.base_lossywav_command = "lossywav %INPUT -o ./ -q X -D 2 -U 4 -m -a 4 -s h -A --feedback 3 --limit 15848"
-        self.base_lossywav_hard_command = "lossywav %INPUT -o ./ -q X -D 1 -U 2 -m -a 7 -s h -A --feedback 0 --limit 12500"
+        self.base_lossywav_command = "lossywav %INPUT -o %OUTPUTDIR -q X -D 2 -U 4 -m -a 4 -s h -A --feedback 3 --limit 15848"
+        self.base_lossywav_hard_command = "lossywav %INPUT -o %OUTPUTDIR -q X -D 1 -U 2 -m -a 7 -s h -A --feedback 0 --limit 12500"
         self.base_lossywav_compliance_command = "ffmpeg -y -hide_banner -nostats -loglevel panic -i %INPUT -f wav -flags +bitexact -acodec pcm_s16le -ar 44100 -ac 2 %OUTPUT"
         self.base_wav_to_bin_command = "ffmpeg -y -hide_banner -nostats -loglevel panic -ac 2 -i %INPUT -f s16le -ar 44.1k -ac 2 %OUTPUT"
+        # En streaming el WAV llega por una tubera sin tamaos de chunk fiables, y la depuracin y el paso a bin se hacen a la vez
+        self.base_wav_to_bin_stream_command = "ffmpeg -y -hide_banner -nostats -loglevel panic -ignore_length 1 -i %INPUT -f s16le -acodec pcm_s16le -ar 44100 -ac 2 %OUTPUT"
+        self.lossywav_stream_options = "- --stdout --ignore-chunk-sizes"
         self.filename_chdman = "chdman"
         self.filename_lossywav = "lossyWAV"
         self.filename_ffmpeg = "ffmpeg"
@@ -53,34 +64,63 @@ class BinCueMinimizer:
         self.regex_track_line = re.compile(r'(?:TRACK|track|Track) \d* (AUDIO|audio|Audio)')
         self.operation_mode = operation_mode
         self.overwrite_chd = overwrite_chd
+        # Hilos para procesar pistas de audio en paralelo. Los conversores son monohilo, por lo que se usa un hilo por nucleo
+        if track_workers is None:
+            track_workers = os.cpu_count() or 1
+        self.track_workers = track_workers
+        # En modo streaming las etapas de audio se encadenan con tuberas en lugar de ficheros intermedios.
+        # Si alguna herramienta no puede leer de stdin o escribir en stdout, se marca aqu y se usarn ficheros para ella
+        self.streaming = streaming
+        self.streaming_tools = {self.filename_ffmpeg: True, self.filename_lossywav: True}
+        # El paso entre bin y WAV s16le solo aade o quita la cabecera RIFF, asi que se puede hacer sin ffmpeg
+        self.native_pcm = native_pcm
+        # Al partir un bin monofichero, las pistas de audio se leen directamente del original en lugar de copiarse
+        self.virtual_tracks = virtual_tracks
+        # Las pistas de audio en silencio o casi silencio no pasan por la cadena con prdidas: chdman ya las comprime casi por completo
+        self.detect_silence = detect_silence
+        # Antes de codificar, se estima con unas muestras la ganancia de cada pista y modo; los que no llegan al mnimo se descartan
+        self.predict_gain = predict_gain
+        self.min_gain = min_gain
+        self.predicted_gains = {}
+        # Modos que no han llegado a dar un CHD por no alcanzar la ganancia mnima, estimada o real
+        self.pruned_modes = []
+        # Los CHD con prdidas que no son menores que el CHD sin prdidas se descartan. Si adems se vigila a chdman,
+        # se le detiene en cuanto el CHD que est escribiendo pasa del tamao del CHD sin prdidas
+        self.discard_oversized = discard_oversized
+        self.watch_chd = watch_chd
+        # CHD sin prdidas con el que compararse, y el Future que lo est generando si se hace a la vez
+        self.lossless_chd = None
+        self.lossless_build = None
+        # Ajuste opcional de los cdecs y el tamao de hunk de chdman para cada tipo de disco (ChdTuner)
+        self.chd_tuner = chd_tuner
+        # Cach opcional de pistas ya procesadas (TrackCache)
+        self.track_cache = track_cache
+        # ndice opcional de las pistas repetidas en la biblioteca (TrackIndex). Con l, la cach solo se usa para esas pistas
+        self.track_index = track_index
+        # Registro opcional de la duracin y el rendimiento de cada etapa (MetricsRecorder)
+        if metrics is None:
+            metrics = MetricsRecorder()
+        self.metrics = metrics
         logging.info('Inicializando BinCueMinimizer en modo ' + str(operation_mode))
         
-        self.original_dir = Path().absolute()
+        if original_dir is None:
+            original_dir = Path().absolute()
+        self.original_dir = original_dir
         self.working_dir = None
+        # Las herramientas se buscan una sola vez por proceso: en el directorio original y si no en el PATH
+        if tools is None:
+            tools = get_registry(str(self.original_dir))
+        self.tools = tools
 
-    def get_dependencies(self):
-        """
-        Devuelve una lista de dependencias, ajustada al sistema operativo
-
-        """
-        
-        is_windows = platform.system() == 'Windows'
-        dependencies = [self.filename_chdman, self.filename_ffmpeg, self.filename_lossywav]
-        dependencies = [ filename + '.exe' if is_windows else filename for filename in dependencies]
-        return dependencies
-    
     def check_dependencies(self):
         """
         Busca las dependencias y da un error en caso de no encontrarlas
 
         """
         
-        for dependency in self.get_dependencies():
+        for dependency in [self.filename_chdman, self.filename_ffmpeg, self.filename_lossywav]:
             logging.debug('Comprobando ' + dependency)
-            if not os.path.isfile(os.path.join(self.get_original_dir(), dependency)):
-                msg = 'Error: No se encuentra el fichero necesario \"' + dependency + '\". Asegurese de tenerlo en la misma ruta que el script'
-                logging.error(msg)
-                raise SystemExit(msg)
+            self.tools.get_path(dependency)
     
     def create_working_dir(self, path = None):
         """
@@ -100,21 +140,21 @@ class BinCueMinimizer:
         
         if path is None:
             path = self.get_original_dir()
-        name_candidate = 'temp'
-        if os.path.isdir(os.path.join(path, name_candidate)):
-            logging.debug(name_candidate + ' existe. Busquemos otro')
-            count = 1
-            while os.path.isdir(os.path.join(path, name_candidate + str(count))):
-                logging.debug(name_candidate + str(count) + ' existe. Busquemos otro')
+        # Se intenta crear directamente en lugar de comprobar antes si existe, ya que
+        # puede haber otros procesos creando directorios de trabajo en la misma ruta
+        base_name = 'temp'
+        name_candidate = base_name
+        count = 0
+        while True:
+            try:
+                os.mkdir(os.path.join(path, name_candidate))
+                break
+            except FileExistsError:
+                logging.debug(name_candidate + ' existe. Busquemos otro')
                 count += 1
-            name_candidate = name_candidate + str(count)
+                name_candidate = base_name + str(count)
         logging.info('Creando directorio ' + name_candidate)
-        os.mkdir(os.path.join(path, name_candidate))
         self.working_dir = os.path.join(path, name_candidate)
-        # Copia las dependencias para poder ser usadas despues
-        for dependency in self.get_dependencies():
-            logging.debug('Copiando dependencia ' + dependency)
-            shutil.copy(os.path.join(path, dependency), self.working_dir)
         return self.working_dir
     
     def get_working_dir(self):
@@ -169,14 +209,23 @@ class BinCueMinimizer:
         
         return self.original_dir
     
-    def copy_files_to_original_dir(self, files):
+    def move_files_to_original_dir(self, files, path = None):
         """
-        Copia desde ficheros al directorio original de ejecucion
+        Mueve ficheros al directorio original de ejecucion, renombrndolos si es posible
+
+        Parameters
+        ----------
+        files : list [str]
+            Los ficheros a mover
+        path : str
+            El directorio destino, si no es el original de ejecucion
         
         """
         
+        if path is None:
+            path = self.get_original_dir()
         for file in files:
-            shutil.copy(os.path.join(self.get_working_dir(), file), self.get_original_dir())
+            move_file(os.path.join(self.get_working_dir(), file), path)
 
     def from_bin_to_wav_common(self, bins, command):
         """
@@ -202,7 +251,8 @@ class BinCueMinimizer:
             source = fbin
             target = source[:-3] + 'WAV'
             logging.info('Transformando ' + source + ' a ' + target)
-            run(command.split(), {'%INPUT': source, '%OUTPUT': target})
+            with use_cores(), self.metrics.measure(STAGE_BIN_TO_WAV, source, target) as event:
+                event.status = run(self.tools.get_command(command), {'%INPUT': source, '%OUTPUT': target}, usage=event)
             files_to_process.append(target)
         return files_to_process
     
@@ -222,6 +272,17 @@ class BinCueMinimizer:
     
         """
         
+        if self.native_pcm:
+            if type(bins) is not list:
+                bins = [bins]
+            files_to_process = []
+            for fbin in bins:
+                target = fbin[:-3] + 'WAV'
+                logging.info('Transformando ' + fbin + ' a ' + target)
+                with self.metrics.measure(STAGE_BIN_TO_WAV, fbin, target):
+                    wavFile.from_bin_to_wav(fbin, target)
+                files_to_process.append(target)
+            return files_to_process
         return self.from_bin_to_wav_common(bins, self.base_bin_to_wav_command)
     
     def from_bin_to_wav_u8(self, bins):
@@ -265,7 +326,9 @@ class BinCueMinimizer:
             source = wav
             target = source[:-3] + 'lossy.WAV'
             logging.info('Transformando ' + source + ' a ' + target)
-            run(command.split(), {'%INPUT': source})
+            # lossyWAV deja el resultado en el directorio indicado, que es el mismo del wav de entrada
+            with use_cores(), self.metrics.measure(STAGE_LOSSYWAV, source, target) as event:
+                event.status = run(self.tools.get_command(command), {'%INPUT': source, '%OUTPUTDIR': os.path.dirname(source) or '.'}, usage=event)
             files_to_process.append(target)
         return files_to_process
     
@@ -328,7 +391,11 @@ class BinCueMinimizer:
             source = wav
             target = source[:-9] + 'WAV'
             logging.info('Depurando ' + source + ' y convirtiendolos a ' + target)
-            run(self.base_lossywav_compliance_command.split(), {'%INPUT': source, '%OUTPUT': target})
+            # El destino puede ser un enlace a un wav compartido con otros modos
+            if os.path.lexists(target):
+                os.remove(target)
+            with use_cores(), self.metrics.measure(STAGE_COMPLIANCE, source, target) as event:
+                event.status = run(self.tools.get_command(self.base_lossywav_compliance_command), {'%INPUT': source, '%OUTPUT': target}, usage=event)
             files_to_process.append(target)
         return files_to_process
     
@@ -355,15 +422,967 @@ class BinCueMinimizer:
             source = wav
             target = source[:-3] + 'BIN'
             logging.info('Transformando ' + source + ' a ' + target)
-            run(self.base_wav_to_bin_command.split(), {'%INPUT': source, '%OUTPUT': target})
+            with use_cores(), self.metrics.measure(STAGE_WAV_TO_BIN, source, target) as event:
+                if self.native_pcm and wavFile.read_wav_format(source).is_cdda():
+                    wavFile.from_wav_to_bin(source, target)
+                else:
+                    # El destino puede ser un enlace al bin original, que no se debe sobreescribir
+                    if os.path.lexists(target):
+                        os.remove(target)
+                    event.status = run(self.tools.get_command(self.base_wav_to_bin_command), {'%INPUT': source, '%OUTPUT': target}, usage=event)
             files_to_process.append(target)
         return files_to_process
     
-    def get_chd_command(self):
+    def get_suffix(self):
+        """
+        Devuelve el sufijo de los CHD generados en el modo de operacion actual
+
+        Returns
+        -------
+        str
+            El sufijo, sin puntos en los extremos
+
+        """
+
+        if self.operation_mode == MODE_LOSSYWAV:
+            return "lossy"
+        elif self.operation_mode == MODE_LOSSYWAV_HARD:
+            return "lossy.hard"
+        elif self.operation_mode == MODE_U8WAV:
+            return "u8"
+        return ""
+
+    def get_chd_path(self, cue):
+        """
+        Devuelve la ruta del CHD que genera el modo de operacion actual para un cue
+
+        Parameters
+        ----------
+        cue : CueFile
+            El cue
+
+        Returns
+        -------
+        str
+            La ruta del CHD
+
+        """
+
+        if self.operation_mode == MODE_NORMAL_CHD or not cue.has_audio_tracks:
+            return cue.path[:-3] + 'CHD'
+        return cue.path[:-3] + self.get_suffix() + '.CHD'
+
+    def get_build_signature(self):
+        """
+        Describe de forma exacta cmo genera el CHD el modo de operacion actual: el comando de chdman,
+        la cadena de conversiones de audio y las versiones de las herramientas implicadas.
+
+        Returns
+        -------
+        str
+            La firma
+
+        """
+
+        signature = [self.base_cue_to_chd_command, self.tools.get_version(self.filename_chdman)]
+        if self.operation_mode != MODE_NORMAL_CHD:
+            signature += [self.tools.get_version(self.filename_ffmpeg), self.get_audio_chain_signature()]
+            # Las pistas que se dejan sin recodificar tambin cambian el CHD
+            if self.detect_silence and silenceDetector.is_available():
+                signature.append('silence<=' + str(silenceDetector.NEAR_SILENCE_PEAK) + '/' + str(silenceDetector.NEAR_SILENCE_RMS))
+            if self.can_predict_gain():
+                signature.append('gain>=' + str(self.min_gain))
+        # Los cdecs y el tamao de hunk dependen de lo decidido para cada tipo de disco, que no cambia una vez guardado
+        if self.chd_tuner is not None:
+            signature.append('tune<=' + str(self.chd_tuner.tolerance))
+        return '\n'.join(signature)
+
+    def get_audio_chain_signature(self):
+        """
+        Describe de forma exacta la cadena de conversiones de audio del modo de operacion actual: sus comandos
+        y la versin de las herramientas que cambian el audio. Dos pistas iguales procesadas con la misma
+        firma dan el mismo resultado, tanto si se usan las conversiones nativas como si no.
+    
+        Returns
+        -------
+        str
+            La firma de la cadena
+    
+        """
+
+        if self.operation_mode in [MODE_LOSSYWAV, MODE_LOSSYWAV_HARD]:
+            lossy_command = self.base_lossywav_command if self.operation_mode == MODE_LOSSYWAV else self.base_lossywav_hard_command
+            return '\n'.join([self.base_bin_to_wav_command, lossy_command, self.base_lossywav_compliance_command,
+                              self.base_wav_to_bin_command, self.tools.get_version(self.filename_lossywav)])
+        elif self.operation_mode == MODE_U8WAV:
+            return '\n'.join([self.base_bin_to_wav_u8_command, self.base_wav_to_bin_command])
+        return ''
+
+    def uses_track_cache(self, track):
+        """
+        Determina si la pista de audio se busca y se guarda en la cach de pistas procesadas
+    
+        """
+
+        return self.track_cache is not None and (self.track_index is None or self.track_index.is_candidate(track))
+
+    def get_track_cache_key(self, track):
+        """
+        Devuelve la clave de la pista en la cach de pistas procesadas
+    
+        """
+
+        return self.track_cache.get_key(track.get_content_hash(), self.get_audio_chain_signature())
+
+    def process_audio_track(self, track):
+        """
+        Lleva una pista de audio por toda la cadena de conversiones del modo de operacion actual.
+        Si la pista ya se proces antes con la misma cadena, se toma de la cach de pistas procesadas.
+    
+        Parameters
+        ----------
+        track : Track
+            La pista de audio
+    
+        Returns
+        -------
+        list [str]
+            Las rutas absolutas de los bin resultantes
+    
+        """
+
+        if self.is_track_left_as_is(track):
+            track.materialize()
+            return [track.path]
+        if not self.uses_track_cache(track):
+            return self.encode_audio_track(track)
+        key = self.get_track_cache_key(track)
+        if self.track_cache.get(key, track.path):
+            track.is_virtual = False
+            return [track.path]
+        new_bins = self.encode_audio_track(track)
+        self.track_cache.put(key, track.path)
+        return new_bins
+
+    def get_track_levels(self, track):
+        """
+        Devuelve los niveles de la pista de audio, analizndola la primera vez
+    
+        Parameters
+        ----------
+        track : Track
+            La pista de audio
+    
+        Returns
+        -------
+        AudioLevels
+            Los niveles de la pista
+    
+        """
+
+        if track.levels is None:
+            with self.metrics.measure(STAGE_SILENCE, track.tracksize if track.is_virtual else track.path):
+                if track.is_virtual:
+                    with track.get_view() as view:
+                        levels = silenceDetector.analyze(view)
+                else:
+                    levels = silenceDetector.analyze(track.path)
+            logging.debug('Niveles de la pista ' + track.id + ': ' + str(levels))
+            track.levels = levels
+        return track.levels
+
+    def is_silent_track(self, track):
+        """
+        Determina si la pista de audio puede quedarse tal cual en el modo de operacion actual por ser silencio.
+        En los modos lossyWAV basta con que sea casi silencio; en u8 tiene que ser silencio digital, que es lo nico que la cuantizacin deja igual.
+    
+        Parameters
+        ----------
+        track : Track
+            La pista de audio
+    
+        Returns
+        -------
+        bool
+            True si la pista no necesita pasar por la cadena de conversiones
+    
+        """
+
+        if not self.detect_silence or not silenceDetector.is_available():
+            return False
+        if self.operation_mode in [MODE_LOSSYWAV, MODE_LOSSYWAV_HARD]:
+            silent = self.get_track_levels(track).is_silent()
+        elif self.operation_mode == MODE_U8WAV:
+            silent = self.get_track_levels(track).is_digital_silence()
+        else:
+            return False
+        if silent:
+            logging.info('La pista ' + track.id + ' es silencio (' + str(track.levels) + '), se deja sin recodificar')
+        return silent
+
+    def is_gain_too_low(self, track):
+        """
+        Determina si la ganancia estimada de la pista de audio en el modo de operacion actual no llega al mnimo
+    
+        Parameters
+        ----------
+        track : Track
+            La pista de audio
+    
+        Returns
+        -------
+        bool
+            True si se estim la ganancia de la pista y es menor que la mnima
+    
+        """
+
+        gain = self.predicted_gains.get(track.id)
+        if gain is None or gain >= self.min_gain:
+            return False
+        logging.info('La pista ' + track.id + ' tiene una ganancia estimada del ' + format(gain * 100, '.1f') + '% en modo ' + str(self.operation_mode) + ', se deja sin recodificar')
+        return True
+
+    def is_track_left_as_is(self, track):
+        """
+        Determina si la pista de audio se deja tal cual en el modo de operacion actual, sin pasar por la cadena de conversiones:
+        por ser silencio o porque no merece la pena segn la ganancia estimada
+    
+        """
+
+        return self.is_silent_track(track) or self.is_gain_too_low(track)
+
+    def can_predict_gain(self):
+        return self.predict_gain and gainPredictor.is_available() and self.operation_mode in [MODE_LOSSYWAV, MODE_LOSSYWAV_HARD, MODE_U8WAV]
+
+    def get_track_size(self, track):
+        return track.tracksize if track.tracksize is not None else os.path.getsize(track.path)
+
+    def write_audio_sample(self, tracks, path):
+        """
+        Escribe en un solo bin las ventanas de muestra de todas las pistas de audio, una pista detrs de otra
+    
+        Parameters
+        ----------
+        tracks : list [Track]
+            Las pistas de audio
+        path : str
+            El bin de muestra a crear
+    
+        Returns
+        -------
+        list [int]
+            Los bytes de muestra de cada pista, en el mismo orden
+    
+        """
+
+        lengths = []
+        with open(path, 'wb') as file:
+            for track in tracks:
+                if track.is_virtual:
+                    with track.get_view() as view:
+                        lengths.append(gainPredictor.write_sample(view, file))
+                else:
+                    lengths.append(gainPredictor.write_sample(track.path, file))
+        return lengths
+
+    def estimate_sample_sizes(self, sample, lengths):
+        """
+        Estima el tamao en FLAC del trozo de muestra de cada pista
+    
+        Parameters
+        ----------
+        sample : str
+            El bin de muestra
+        lengths : list [int]
+            Los bytes de muestra de cada pista
+    
+        Returns
+        -------
+        list [int]
+            El tamao estimado de cada trozo
+    
+        """
+
+        with open(sample, 'rb') as file:
+            data = file.read()
+        sizes = []
+        offset = 0
+        for length in lengths:
+            sizes.append(gainPredictor.estimate_flac_size(data[offset:offset + length]))
+            offset += length
+        return sizes
+
+    def predict_gains(self, tracks, minimizers, path):
+        """
+        Estima la ganancia de cada modo con prdidas frente al audio sin prdidas, pasando por la cadena de cada modo
+        solo unas ventanas de muestra de cada pista. La ganancia de cada pista queda en predicted_gains de su modo.
+    
+        Parameters
+        ----------
+        tracks : list [Track]
+            Las pistas de audio
+        minimizers : list [BinCueMinimizer]
+            Los modos a estimar
+        path : str
+            El directorio en el que crear las muestras
+    
+        Returns
+        -------
+        dict {int: float}
+            La ganancia estimada de todo el audio del disco en cada modo
+    
+        """
+
+        os.mkdir(path)
+        try:
+            sample = os.path.join(path, 'sample.BIN')
+            with self.metrics.measure(STAGE_PREDICT, None, sample) as event:
+                lengths = self.write_audio_sample(tracks, sample)
+                event.input_bytes = sum(lengths)
+                lossless_sizes = self.estimate_sample_sizes(sample, lengths)
+            # Cada pista pesa en el total segn su tamao real, no segn el de su muestra
+            scales = [self.get_track_size(track) / length if length else 0 for track, length in zip(tracks, lengths)]
+            lossless_total = sum(size * scale for size, scale in zip(lossless_sizes, scales))
+
+            def encode_sample(minimizer):
+                mode_sample = os.path.join(path, 'sample' + str(minimizer.operation_mode) + '.BIN')
+                with self.metrics.measure(STAGE_PREDICT, sample, mode_sample):
+                    shutil.copy(sample, mode_sample)
+                    # Las conversiones de la muestra cuentan como prediccin, no como etapas de la cadena del modo
+                    metrics, minimizer.metrics = minimizer.metrics, MetricsRecorder()
+                    try:
+                        minimizer.encode_audio_track(Track('sample', path=mode_sample, track_type='AUDIO'))
+                    finally:
+                        minimizer.metrics = metrics
+                    return self.estimate_sample_sizes(mode_sample, lengths)
+
+            gains = {}
+            with ThreadPoolExecutor(max_workers=len(minimizers)) as executor:
+                encoded_samples = list(executor.map(encode_sample, minimizers))
+            for minimizer, lossy_sizes in zip(minimizers, encoded_samples):
+                mode = minimizer.operation_mode
+                minimizer.predicted_gains = {}
+                for track, lossless_size, lossy_size in zip(tracks, lossless_sizes, lossy_sizes):
+                    minimizer.predicted_gains[track.id] = gainPredictor.get_gain(lossless_size, lossy_size)
+                lossy_total = sum(size * scale for size, scale in zip(lossy_sizes, scales))
+                gains[mode] = gainPredictor.get_gain(lossless_total, lossy_total)
+                logging.info('Ganancia estimada del modo ' + str(mode) + ': ' + format(gains[mode] * 100, '.1f') + '% del audio')
+            return gains
+        finally:
+            rmtree(path, ignore_errors=True)
+
+    def encode_audio_track(self, track):
+        """
+        Lleva una pista de audio por toda la cadena de conversiones del modo de operacion actual
+    
+        Parameters
+        ----------
+        track : Track
+            La pista de audio
+    
+        Returns
+        -------
+        list [str]
+            Las rutas absolutas de los bin resultantes
+    
+        """
+
+        if self.operation_mode == MODE_U8WAV and self.native_pcm and pcmQuantizer.is_available():
+            return self.quantize_to_u8(track)
+        if self.streaming:
+            return self.process_audio_track_streaming(track)
+        audio_bin = track.path
+        new_bins = []
+        if self.operation_mode in [MODE_LOSSYWAV, MODE_LOSSYWAV_HARD]:
+            if track.is_virtual and self.native_pcm:
+                wavs = self.from_view_to_wav(track)
+            else:
+                track.materialize()
+                wavs = self.from_bin_to_wav(audio_bin)
+            if self.operation_mode == MODE_LOSSYWAV:
+                lossy_wavs = self.apply_lossywav_to_wav(wavs)
+            else:
+                lossy_wavs = self.apply_lossywav_hard_to_wav(wavs)
+            compliant_lossy_wavs = self.fix_lossywav_compliance(lossy_wavs)
+            delete_files(lossy_wavs)
+            new_bins = self.from_wav_to_bin(compliant_lossy_wavs)
+            delete_files(compliant_lossy_wavs)
+        elif self.operation_mode == MODE_U8WAV:
+            track.materialize()
+            u8_wavs = self.from_bin_to_wav_u8(audio_bin)
+            new_bins = self.from_wav_to_bin(u8_wavs)
+        # El bin final tiene que quedar donde apunta el cue, aunque su extension no sea .BIN en mayusculas
+        if new_bins and new_bins[0] != audio_bin:
+            os.replace(new_bins[0], audio_bin)
+            new_bins = [audio_bin]
+        return new_bins
+
+    def from_view_to_wav(self, track):
+        """
+        Convierte en WAV s16le una pista virtual, leyendo directamente de su bin original
+    
+        Parameters
+        ----------
+        track : Track
+            La pista virtual
+    
+        Returns
+        -------
+        list [str]
+            Las rutas absolutas de los ficheros wav
+    
+        """
+
+        target = track.path[:-3] + 'WAV'
+        logging.info('Transformando la pista ' + track.id + ' de ' + track.bin.path + ' a ' + target)
+        with self.metrics.measure(STAGE_BIN_TO_WAV, track.tracksize, target):
+            with track.get_view() as view:
+                wavFile.from_view_to_wav(view, target)
+        return [target]
+
+    def quantize_to_u8(self, track):
+        """
+        Recuantiza una pista de audio a 8 bits sin pasar por ffmpeg ni por ficheros WAV
+    
+        Parameters
+        ----------
+        track : Track
+            La pista de audio
+    
+        Returns
+        -------
+        list [str]
+            Las rutas absolutas de los bin resultantes
+    
+        """
+
+        audio_bin = track.path
+        logging.info('Cuantizando ' + audio_bin + ' a u8')
+        with use_cores(), self.metrics.measure(STAGE_U8, track.tracksize if track.is_virtual else audio_bin, audio_bin):
+            if track.is_virtual:
+                with track.get_view() as view:
+                    pcmQuantizer.quantize_to_u8(view, audio_bin)
+                track.is_virtual = False
+            else:
+                target = audio_bin[:-3] + 'u8.BIN'
+                pcmQuantizer.quantize_to_u8(audio_bin, target)
+                os.replace(target, audio_bin)
+        return [audio_bin]
+
+    def get_lossywav_stream_command(self, command):
+        """
+        Adapta un comando de lossyWAV para que lea de stdin y escriba en stdout
+    
+        Parameters
+        ----------
+        command : str
+            El comando de lossyWAV basado en ficheros
+    
+        Returns
+        -------
+        str
+            El comando para usar en una tubera
+    
+        """
+
+        return command.replace("%INPUT -o %OUTPUTDIR", self.lossywav_stream_options)
+
+    def get_audio_stages(self):
+        """
+        Devuelve las etapas de la cadena de audio del modo de operacion actual
+    
+        Returns
+        -------
+        list [(str, str, function)]
+            Por cada etapa, la herramienta que la ejecuta, su comando para streaming
+            y la funcin equivalente basada en ficheros
+    
+        """
+
+        if self.operation_mode in [MODE_LOSSYWAV, MODE_LOSSYWAV_HARD]:
+            if self.operation_mode == MODE_LOSSYWAV:
+                lossy_command = self.base_lossywav_command
+            else:
+                lossy_command = self.base_lossywav_hard_command
+            return [
+                (self.filename_ffmpeg, self.base_bin_to_wav_command, self.from_bin_to_wav),
+                (self.filename_lossywav, self.get_lossywav_stream_command(lossy_command), lambda wavs: self.apply_lossywav_common_to_wav(wavs, lossy_command)),
+                (self.filename_ffmpeg, self.base_wav_to_bin_stream_command, self.from_wav_to_bin)
+                ]
+        elif self.operation_mode == MODE_U8WAV:
+            return [
+                (self.filename_ffmpeg, self.base_bin_to_wav_u8_command, self.from_bin_to_wav_u8),
+                (self.filename_ffmpeg, self.base_wav_to_bin_stream_command, self.from_wav_to_bin)
+                ]
+        return []
+
+    def run_stream_segment(self, commands, source, target, source_view = None):
+        """
+        Ejecuta un tramo de etapas encadenadas por tuberas, leyendo de un fichero y escribiendo en otro
+    
+        Parameters
+        ----------
+        commands : list [str]
+            Los comandos del tramo, en orden
+        source : str
+            El fichero de entrada del primer comando
+        target : str
+            El fichero de salida del ltimo comando
+        source_view : memoryview
+            Si se indica, el primer comando lee estos datos por su entrada estndar en lugar de leer el fichero de entrada
+    
+        """
+
+        replacements = []
+        for position in range(len(commands)):
+            replacements.append({
+                '%INPUT': source if position == 0 and source_view is None else '-',
+                '%OUTPUT': target if position == len(commands) - 1 else '-'
+                })
+        logging.info('Transformando ' + source + ' a ' + target + ' en ' + str(len(commands)) + ' etapas encadenadas')
+        inputs = source if source_view is None else len(source_view)
+        # Cada etapa encadenada es un proceso que trabaja a la vez que los dems
+        with use_cores(len(commands)), self.metrics.measure(STAGE_STREAM, inputs, target) as event:
+            event.status = run_pipeline([self.tools.get_command(command) for command in commands], replacements, input_data=source_view, usage=event)
+
+    def process_audio_track_streaming(self, track):
+        """
+        Lleva una pista de audio por la cadena de conversiones encadenando las etapas mediante tuberas,
+        de forma que el audio va del bin original al bin final sin ficheros WAV intermedios. Solo se
+        escriben ficheros intermedios para las herramientas que no pueden trabajar en streaming.
+    
+        Parameters
+        ----------
+        track : Track
+            La pista de audio
+    
+        Returns
+        -------
+        list [str]
+            Las rutas absolutas de los bin resultantes
+    
+        """
+
+        audio_bin = track.path
+        # La salida no puede ser el propio bin de entrada mientras se est leyendo, as que se reemplaza al final
+        target = audio_bin[:-3] + 'stream.BIN'
+        stages = self.get_audio_stages()
+        # Una pista virtual se enva a la primera etapa directamente desde el bin original, si sta admite streaming
+        source_view = None
+        if track.is_virtual:
+            if stages and self.streaming_tools.get(stages[0][0], False):
+                source_view = track.get_view()
+            else:
+                track.materialize()
+        try:
+            intermediate_files = self.run_audio_stages_streaming(stages, audio_bin, target, source_view)
+        finally:
+            if source_view is not None:
+                source_view.release()
+                track.is_virtual = False
+        delete_files([intermediate for intermediate in intermediate_files if os.path.exists(intermediate)])
+        os.replace(target, audio_bin)
+        return [audio_bin]
+
+    def run_audio_stages_streaming(self, stages, audio_bin, target, source_view = None):
+        """
+        Recorre las etapas de audio agrupando en tuberas las que admiten streaming
+    
+        Parameters
+        ----------
+        stages : list [(str, str, function)]
+            Las etapas, tal y como las devuelve get_audio_stages
+        audio_bin : str
+            El bin de la pista de audio
+        target : str
+            El bin a generar
+        source_view : memoryview
+            Los datos de la pista, si es virtual
+    
+        Returns
+        -------
+        list [str]
+            Los ficheros intermedios que se han tenido que crear
+    
+        """
+
+        current = audio_bin
+        intermediate_files = []
+        pending_commands = []
+        for tool, stream_command, file_function in stages:
+            if self.streaming_tools.get(tool, False):
+                pending_commands.append(stream_command)
+                continue
+            # Esta herramienta no puede trabajar en streaming: se vuelca lo pendiente a fichero y se ejecuta ella sola
+            if pending_commands:
+                intermediate = current[:-3] + 'WAV' if current == audio_bin else current[:-3] + 'stream.WAV'
+                self.run_stream_segment(pending_commands, current, intermediate, source_view if current == audio_bin else None)
+                intermediate_files.append(intermediate)
+                current = intermediate
+                pending_commands = []
+            current = file_function(current)[0]
+            intermediate_files.append(current)
+        if pending_commands:
+            self.run_stream_segment(pending_commands, current, target, source_view if current == audio_bin else None)
+        else:
+            shutil.move(current, target)
+        return intermediate_files
+
+    def process_audio_tracks(self, tracks):
+        """
+        Procesa las pistas de audio en paralelo. Cada pista recorre su cadena de conversiones
+        de forma independiente en un pool de hilos acotado.
+    
+        Parameters
+        ----------
+        tracks : list [Track]
+            Las pistas de audio
+    
+        Returns
+        -------
+        list [str]
+            Las rutas absolutas de los bin resultantes, en el mismo orden que las pistas
+    
+        """
+
+        new_bins = []
+        with ThreadPoolExecutor(max_workers=self.track_workers) as executor:
+            for track_bins in executor.map(self.process_audio_track, tracks):
+                new_bins.extend(track_bins)
+        return new_bins
+
+    def decode_audio_tracks(self, tracks, minimizers = None):
+        """
+        Convierte a WAV s16le las pistas de audio, en paralelo, para poder compartir el resultado entre varios modos
+    
+        Parameters
+        ----------
+        tracks : list [Track]
+            Las pistas de audio
+        minimizers : list [BinCueMinimizer]
+            Los modos que usarn los WAV. Las pistas que todos ellos tengan en la cach no se decodifican
+    
+        Returns
+        -------
+        list [str]
+            Las rutas absolutas de los ficheros wav, en el mismo orden que las pistas, o None para las no decodificadas
+    
+        """
+
+        def decode(track):
+            if minimizers and all(minimizer.is_track_left_as_is(track) for minimizer in minimizers):
+                return None
+            if minimizers and all(minimizer.uses_track_cache(track) and minimizer.track_cache.contains(minimizer.get_track_cache_key(track)) for minimizer in minimizers):
+                return None
+            if track.is_virtual and self.native_pcm:
+                return self.from_view_to_wav(track)[0]
+            track.materialize()
+            return self.from_bin_to_wav(track.path)[0]
+
+        with ThreadPoolExecutor(max_workers=self.track_workers) as executor:
+            return list(executor.map(decode, tracks))
+
+    def place_track_bin(self, track, path):
+        """
+        Coloca el bin de una pista en el directorio indicado, enlazandolo si es posible, sin modificar la pista
+    
+        Parameters
+        ----------
+        track : Track
+            La pista
+        path : str
+            El directorio
+    
+        Returns
+        -------
+        str
+            La ruta del bin colocado
+    
+        """
+
+        target = os.path.join(path, os.path.basename(track.path))
+        if track.is_virtual:
+            with track.get_view() as view, open(target, 'wb') as file:
+                file.write(view)
+        else:
+            place_file(track.path, path)
+        return target
+
+    def encode_decoded_track(self, track, wav, path):
+        """
+        Genera el bin de una pista en el modo de operacion actual a partir de su WAV ya decodificado.
+        Todo se escribe en el directorio indicado, sin tocar la pista ni el WAV, que se comparten con otros modos.
+    
+        Parameters
+        ----------
+        track : Track
+            La pista de audio
+        wav : str
+            El WAV s16le de la pista
+        path : str
+            El directorio del modo
+    
+        Returns
+        -------
+        str
+            La ruta del bin generado, con el mismo nombre que el de la pista
+    
+        """
+
+        if self.is_track_left_as_is(track):
+            return self.place_track_bin(track, path)
+        target = os.path.join(path, os.path.basename(track.path))
+        use_cache = self.uses_track_cache(track)
+        if use_cache:
+            key = self.get_track_cache_key(track)
+            if self.track_cache.get(key, target):
+                return target
+        if self.operation_mode in [MODE_LOSSYWAV, MODE_LOSSYWAV_HARD]:
+            if wav is None:
+                # No se decodific porque estaba en la cach, pero ya no est
+                wav = self.from_bin_to_wav(self.place_track_bin(track, path))[0]
+            else:
+                place_file(wav, path)
+            local_wav = os.path.join(path, os.path.basename(wav))
+            if self.operation_mode == MODE_LOSSYWAV:
+                lossy_wavs = self.apply_lossywav_to_wav(local_wav)
+            else:
+                lossy_wavs = self.apply_lossywav_hard_to_wav(local_wav)
+            compliant_lossy_wavs = self.fix_lossywav_compliance(lossy_wavs)
+            delete_files(lossy_wavs)
+            new_bins = self.from_wav_to_bin(compliant_lossy_wavs)
+            delete_files(compliant_lossy_wavs)
+            os.replace(new_bins[0], target)
+        elif self.operation_mode == MODE_U8WAV:
+            if self.native_pcm and pcmQuantizer.is_available():
+                logging.info('Cuantizando la pista ' + track.id + ' a u8 en ' + target)
+                with use_cores(), self.metrics.measure(STAGE_U8, track.tracksize if track.is_virtual else track.path, target):
+                    if track.is_virtual:
+                        with track.get_view() as view:
+                            pcmQuantizer.quantize_to_u8(view, target)
+                    else:
+                        pcmQuantizer.quantize_to_u8(track.path, target + '.tmp')
+                        os.replace(target + '.tmp', target)
+            else:
+                local_bin = self.place_track_bin(track, path)
+                u8_wavs = self.from_bin_to_wav_u8(local_bin)
+                new_bins = self.from_wav_to_bin(u8_wavs)
+                delete_files(u8_wavs)
+                os.replace(new_bins[0], target)
+        if use_cache:
+            self.track_cache.put(key, target)
+        return target
+
+    def minimise_decoded_cue(self, cue, tracks, wavs, path):
+        """
+        Genera el CHD del modo de operacion actual a partir de las pistas ya separadas y decodificadas
+    
+        Parameters
+        ----------
+        cue : CueFile
+            El cue, ya separado en pistas dentro del directorio de trabajo
+        tracks : list [Track]
+            Las pistas de audio
+        wavs : list [str]
+            Los WAV de las pistas de audio, en el mismo orden, o None si no se han decodificado
+        path : str
+            El directorio en el que trabajar este modo
+    
+        Returns
+        -------
+        list [str]
+            Las rutas absolutas de los CHD resultantes
+    
+        """
+
+        os.mkdir(path)
+        shutil.copy(cue.path, path)
+        for track in cue.tracks:
+            if not track.is_audio_track:
+                place_file(track.path, path)
+        if wavs is None:
+            wavs = [None] * len(tracks)
+        with ThreadPoolExecutor(max_workers=self.track_workers) as executor:
+            list(executor.map(lambda pair: self.encode_decoded_track(pair[0], pair[1], path), zip(tracks, wavs)))
+        return self.from_cue_to_chd(os.path.join(path, os.path.basename(cue.path)), suffix=self.get_suffix())
+
+    def prune_modes(self, tracks, minimizers, path):
+        """
+        Descarta los modos cuya ganancia estimada sobre el audio del disco no llega a la mnima. Los descartados quedan en pruned_modes
+    
+        Parameters
+        ----------
+        tracks : list [Track]
+            Las pistas de audio
+        minimizers : list [BinCueMinimizer]
+            Los modos con prdidas
+        path : str
+            El directorio en el que crear las muestras
+    
+        Returns
+        -------
+        list [BinCueMinimizer]
+            Los modos que merece la pena generar
+    
+        """
+
+        gains = self.predict_gains(tracks, minimizers, path)
+        kept = []
+        for minimizer in minimizers:
+            mode = minimizer.operation_mode
+            if gains[mode] < self.min_gain:
+                msg = 'No se genera el modo ' + str(mode) + ': la ganancia estimada es del ' + format(gains[mode] * 100, '.1f') + '%, menor que el ' + format(self.min_gain * 100, '.1f') + '% mnimo'
+                logging.info(msg)
+                print(msg)
+                self.pruned_modes.append(mode)
+            else:
+                kept.append(minimizer)
+        return kept
+
+    def minimise_cue_all_modes(self, cue, modes = None):
+        """
+        Minimiza el cue en todos los modos a la vez. El CHD sin prdidas se genera en paralelo desde el cue original,
+        y la copia, separacin y decodificacin de las pistas se hacen una sola vez para todos los modos con prdidas,
+        que despus se ejecutan en paralelo cada uno en su propio subdirectorio.
+    
+        Parameters
+        ----------
+        cue : CueFile
+            El cue a procesar
+        modes : list [int]
+            Los modos con prdidas a generar. Por defecto, todos
+
+        """
+
+        if modes is None:
+            modes = [MODE_LOSSYWAV, MODE_LOSSYWAV_HARD, MODE_U8WAV]
+        with ThreadPoolExecutor(max_workers=1 + len(modes)) as executor:
+            lossless = executor.submit(self.from_cue_to_chd, cue.path)
+            lossless_chd = os.path.abspath(cue.path[:-3] + 'CHD')
+            if cue.has_audio_tracks and modes:
+                cue_dir = os.path.dirname(os.path.abspath(cue.path))
+                working_dir = self.create_working_dir()
+                try:
+                    cue = self.copy_cue_to_dir(cue, working_dir)
+                    self.enter_working_dir()
+                    try:
+                        if cue.is_monofile_multitrack():
+                            cue = self.split_cue_tracks(cue)
+                        try:
+                            tracks = cue.get_audio_bins()
+                            minimizers = []
+                            for mode in modes:
+                                minimizers.append(BinCueMinimizer(operation_mode=mode, overwrite_chd=self.overwrite_chd, original_dir=self.original_dir,
+                                                                  track_workers=self.track_workers, native_pcm=self.native_pcm, tools=self.tools,
+                                                                  track_cache=self.track_cache, track_index=self.track_index, metrics=self.metrics, detect_silence=self.detect_silence,
+                                                                  predict_gain=self.predict_gain, min_gain=self.min_gain,
+                                                                  discard_oversized=self.discard_oversized, watch_chd=self.watch_chd, chd_tuner=self.chd_tuner))
+                                minimizers[-1].lossless_chd = lossless_chd
+                                minimizers[-1].lossless_build = lossless
+                            if self.predict_gain and gainPredictor.is_available():
+                                minimizers = self.prune_modes(tracks, minimizers, os.path.join(working_dir, 'sample'))
+                            wavs = None
+                            lossy_minimizers = [minimizer for minimizer in minimizers if minimizer.operation_mode in [MODE_LOSSYWAV, MODE_LOSSYWAV_HARD]]
+                            if lossy_minimizers:
+                                wavs = self.decode_audio_tracks(tracks, lossy_minimizers)
+                            branches = []
+                            for minimizer in minimizers:
+                                mode = minimizer.operation_mode
+                                branches.append(executor.submit(minimizer.minimise_decoded_cue, cue, tracks, wavs, os.path.join(working_dir, 'mode' + str(mode))))
+                            new_chds = []
+                            for branch in branches:
+                                new_chds.extend(branch.result())
+                            for minimizer in minimizers:
+                                self.pruned_modes.extend(minimizer.pruned_modes)
+                        finally:
+                            cue.close()
+                        # Los CHD se dejan junto al cue original, igual que el CHD sin prdidas
+                        self.move_files_to_original_dir(new_chds, cue_dir)
+                    finally:
+                        self.exit_working_dir()
+                finally:
+                    self.delete_working_dir()
+            lossless.result()
+
+    def copy_cue_to_dir(self, cue, path):
+        """
+        Coloca el cue y sus bin en el directorio de trabajo, midiendo la etapa
+    
+        Parameters
+        ----------
+        cue : CueFile
+            El cue
+        path : str
+            El directorio de trabajo
+    
+        Returns
+        -------
+        CueFile
+            El cue colocado
+    
+        """
+
+        bins = [bin_file.path for bin_file in cue.bins]
+        with self.metrics.measure(STAGE_COPY, bins, get_size(bins)):
+            return cue.copy_to_dir(path)
+
+    def split_cue_tracks(self, cue):
+        """
+        Parte un cue monofichero en un fichero por pista, midiendo la etapa. Las pistas virtuales no se escriben
+        y no cuentan como bytes de salida
+    
+        Parameters
+        ----------
+        cue : CueFile
+            El cue
+    
+        Returns
+        -------
+        CueFile
+            El cue partido
+    
+        """
+
+        with self.metrics.measure(STAGE_SPLIT, [bin_file.path for bin_file in cue.bins]) as event:
+            new_cue = cue.split_tracks(virtual_audio=self.virtual_tracks)
+            event.output_bytes = sum(track.tracksize for track in new_cue.tracks if not track.is_virtual)
+        return new_cue
+
+    def get_chd_command(self, processors = None, settings = None):
         command = self.base_cue_to_chd_command
         if self.overwrite_chd:
             command += " --force"
+        if processors is not None:
+            command += " -np " + str(processors)
+        if settings is not None:
+            command += " -c " + settings['codecs'] + " -hs " + str(settings['hunk_size'])
         return command
+
+    def get_chd_settings(self, cue, processors = None):
+        """
+        Obtiene del ajuste de chdman, si se usa, los cdecs y el tamao de hunk para el tipo de disco del cue
+    
+        Parameters
+        ----------
+        cue : str
+            El cue que se va a convertir en CHD
+        processors : int
+            Los ncleos que puede usar chdman en las pruebas
+    
+        Returns
+        -------
+        dict
+            Los cdecs ('codecs') y el tamao de hunk ('hunk_size'), o None para usar los de chdman
+    
+        """
+
+        if self.chd_tuner is None:
+            return None
+        # Cada modo deja el audio de una forma, y cada versin de chdman puede comprimir de otra. El CHD sin prdidas
+        # es el mismo lo genere el modo MODE_NORMAL_CHD o MODE_EVERYTHING, as que se distingue por la extensin
+        label = '.'.join(filter(None, [self.get_suffix(), 'CHD'])) + '|' + self.tools.get_version(self.filename_chdman)
+        with self.metrics.measure(STAGE_TUNE, cue):
+            return self.chd_tuner.tune(CueFile(cue), label, self.tools, processors)
     
     def from_cue_to_chd(self, cues, suffix = None):
         """
@@ -393,12 +1412,132 @@ class BinCueMinimizer:
             msg = 'Procesando ' + source + '...'
             logging.info(msg)
             print(msg)
-            run(self.get_chd_command().split(), {'%INPUT': source, '%OUTPUT': target})
+            # Solo se compara el tamao de los CHD con prdidas, que son los que tienen sufijo
+            check_size = bool(suffix) and self.discard_oversized
+            aborted = []
+            def watch():
+                if self.is_chd_oversized(target):
+                    aborted.append(target)
+                    return True
+                return False
+            # chdman reparte los hunks entre varios hilos: se le dan los ncleos libres que le correspondan
+            with use_cores(stretch=True) as processors:
+                settings = self.get_chd_settings(source, processors)
+                with self.metrics.measure(STAGE_CHDMAN, [source] + get_bin_paths(source), target) as event:
+                    event.status = run(self.tools.get_command(self.get_chd_command(processors, settings)), {'%INPUT': source, '%OUTPUT': target}, usage=event,
+                                       watch=watch if check_size and self.watch_chd else None)
+                    if aborted:
+                        event.status = STATUS_ABORTED
+            if check_size and (aborted or not self.is_chd_worth_keeping(target)):
+                delete_files([target])
+                self.pruned_modes.append(self.operation_mode)
+                msg = source + ' descartado: su CHD no es menor que el CHD sin prdidas'
+                logging.info(msg)
+                print(msg)
+                self.delete_stale_chd(target)
+                continue
             files_to_process.append(target)
             msg = source + ' transformado a CHD'
             logging.info(msg)
             print(msg)
         return files_to_process
+
+    def delete_stale_chd(self, target):
+        """
+        Borra el CHD de una ejecucin anterior del modo actual, que ya no debe existir si el nuevo se ha descartado.
+        Est junto al CHD sin prdidas con el que se ha comparado el nuevo, que es el directorio del cue original
+
+        Parameters
+        ----------
+        target : str
+            El CHD descartado, en el directorio de trabajo
+
+        """
+
+        if self.lossless_chd is None:
+            return
+        stale_chd = os.path.join(os.path.dirname(self.lossless_chd), os.path.basename(target))
+        if os.path.abspath(stale_chd) != os.path.abspath(target) and os.path.exists(stale_chd):
+            delete_files([stale_chd])
+            msg = 'Borrado ' + stale_chd + ', de una ejecucin anterior: el CHD de este modo se ha descartado'
+            logging.info(msg)
+            print(msg)
+
+    def set_lossless_reference(self, cue):
+        """
+        Toma como referencia de tamao el CHD sin prdidas del cue, si existe y es posterior a todos sus ficheros de entrada
+    
+        Parameters
+        ----------
+        cue : CueFile
+            El cue original
+
+        """
+
+        chd_path = os.path.abspath(cue.path[:-3] + 'CHD')
+        try:
+            chd_mtime = os.stat(chd_path).st_mtime_ns
+            if all(os.stat(path).st_mtime_ns <= chd_mtime for path in [cue.path] + [bin_file.path for bin_file in cue.bins]):
+                logging.debug('Se compararn los CHD con el CHD sin prdidas ' + chd_path)
+                self.lossless_chd = chd_path
+        except OSError:
+            pass
+
+    def get_lossless_size(self, wait = False):
+        """
+        Devuelve el tamao del CHD sin prdidas con el que se compara el CHD del modo actual
+    
+        Parameters
+        ----------
+        wait : bool
+            Si el CHD sin prdidas se est generando a la vez, esperar a que termine
+    
+        Returns
+        -------
+        int
+            El tamao en bytes, o None si no hay con qu comparar o todava no se sabe
+    
+        """
+
+        if self.lossless_chd is None:
+            return None
+        if self.lossless_build is not None:
+            if not wait and not self.lossless_build.done():
+                return None
+            if self.lossless_build.exception() is not None:
+                return None
+        try:
+            return os.path.getsize(self.lossless_chd)
+        except OSError:
+            return None
+
+    def is_chd_oversized(self, path):
+        """
+        Determina si el CHD, quizs a medio escribir, ya ha pasado del tamao del CHD sin prdidas
+    
+        """
+
+        limit = self.get_lossless_size()
+        try:
+            return limit is not None and os.path.getsize(path) > limit
+        except OSError:
+            return False
+
+    def is_chd_worth_keeping(self, path):
+        """
+        Determina si el CHD terminado es menor que el CHD sin prdidas, esperando a ste si hace falta.
+        Sin CHD sin prdidas con el que comparar, se conserva
+    
+        """
+
+        limit = self.get_lossless_size(wait=True)
+        if limit is None or not os.path.exists(path):
+            return True
+        size = os.path.getsize(path)
+        if size >= limit:
+            logging.info('El CHD ' + path + ' ocupa ' + str(size) + ' bytes y el CHD sin prdidas ' + str(limit))
+            return False
+        return True
     
     def minimise_cue(self, cue):
         """
@@ -411,6 +1550,7 @@ class BinCueMinimizer:
 
         """
         self.check_dependencies()
+        self.metrics = self.metrics.for_disc(os.path.abspath(cue.path))
         if cue.is_processable():
             if self.operation_mode != 1 and not cue.has_audio_tracks:
                 msg  = '************************ PRECAUCION ************************'
@@ -423,41 +1563,36 @@ class BinCueMinimizer:
                 msg += '************************ PRECAUCION ************************'
                 logging.info(msg)
                 print(msg)
-            if self.operation_mode == MODE_NORMAL_CHD or not cue.has_audio_tracks:
+            if self.operation_mode == MODE_EVERYTHING:
+                self.minimise_cue_all_modes(cue)
+            elif self.operation_mode == MODE_NORMAL_CHD or not cue.has_audio_tracks:
                 self.from_cue_to_chd(cue.path)
             elif self.operation_mode != MODE_NORMAL_CHD and cue.has_audio_tracks:
+                cue_dir = os.path.dirname(os.path.abspath(cue.path))
+                if self.discard_oversized:
+                    self.set_lossless_reference(cue)
                 working_dir = self.create_working_dir()
                 try:
-                    cue = cue.copy_to_dir(working_dir)
+                    cue = self.copy_cue_to_dir(cue, working_dir)
                     self.enter_working_dir()
                     try:
                         if cue.is_monofile_multitrack():
-                            cue = cue.split_tracks()
-                        audio_bins = []
-                        for audio_bin in cue.get_audio_bins():
-                            audio_bins.append(audio_bin.path)
-                        suffix = ""
-                        if self.operation_mode in [MODE_LOSSYWAV, MODE_LOSSYWAV_HARD]:
-                            wavs = self.from_bin_to_wav(audio_bins)
-                            if self.operation_mode  == MODE_LOSSYWAV:
-                                suffix = "lossy"
-                                lossy_wavs = self.apply_lossywav_to_wav(wavs)
-                            else:
-                                suffix = "lossy.hard"
-                                lossy_wavs = self.apply_lossywav_hard_to_wav(wavs)
-                            compliant_lossy_wavs = self.fix_lossywav_compliance(lossy_wavs)
-                            delete_files(lossy_wavs)
-                            new_bins = self.from_wav_to_bin(compliant_lossy_wavs)
-                            delete_files(compliant_lossy_wavs)
-                            new_chds = self.from_cue_to_chd(cue.path, suffix=suffix)
-                        elif self.operation_mode == MODE_U8WAV:
-                            suffix = "u8"
-                            u8_wavs = self.from_bin_to_wav_u8(audio_bins)
-                            new_bins = self.from_wav_to_bin(u8_wavs)
-                        new_chds = self.from_cue_to_chd(cue.path, suffix=suffix)
+                            cue = self.split_cue_tracks(cue)
+                        try:
+                            tracks = cue.get_audio_bins()
+                            if self.can_predict_gain():
+                                self.predict_gains(tracks, [self], os.path.join(working_dir, 'sample'))
+                            new_bins = self.process_audio_tracks(tracks)
+                        finally:
+                            cue.close()
+                        # chdman solo arranca cuando todas las pistas han terminado
+                        new_chds = self.from_cue_to_chd(cue.path, suffix=self.get_suffix())
                         delete_files(new_bins)
-                        self.copy_files_to_original_dir(new_chds)
+                        # Los CHD se dejan junto al cue original, igual que el CHD sin prdidas
+                        self.move_files_to_original_dir(new_chds, cue_dir)
                     finally:
                         self.exit_working_dir()
                 finally:
                     self.delete_working_dir()
+        if self.metrics.is_enabled():
+            logging.info(format_summary(summarize(self.metrics.events), 'Etapas de ' + self.metrics.disc))
@@ -25,16 +25,57 @@
 # Commons on their website http://creativecommons.org/licenses/by-nc-sa/4.0/
 #
 
+import mmap
+import threading
 from os import path as osp
 
 class Bin:
-    path = None
-    num = 0
-    framesize = None
-    filesize = None
+    __slots__ = ('path', 'num', 'framesize', 'filesize', 'mapping', 'mapping_lock')
     
-    def __init__(self, path, num = None):
+    def __init__(self, path, num = None, filesize = None):
         self.path = path
-        self.filesize = osp.getsize(path)
+        self.num = 0
+        self.framesize = None
+        self.mapping = None
+        # El tamao se puede indicar para ficheros que todavia no se han escrito
+        self.filesize = filesize if filesize is not None else osp.getsize(path)
         if num:
             self.num = num
+        self.mapping_lock = threading.Lock()
+
+    def get_view(self, offset, length):
+        """
+        Devuelve una vista de solo lectura sobre una parte del fichero, proyectado en memoria.
+        La vista se debe liberar con release() (o usarla en un with) antes de cerrar el fichero.
+
+        Parameters
+        ----------
+        offset : int
+            La posicin en bytes donde empieza la vista
+        length : int
+            El tamao en bytes de la vista
+
+        Returns
+        -------
+        memoryview
+            La vista sobre el fichero
+
+        """
+
+        with self.mapping_lock:
+            if self.mapping is None:
+                with open(self.path, 'rb') as file:
+                    self.mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        with memoryview(self.mapping) as view:
+            return view[offset:offset + length]
+
+    def close(self):
+        """
+        Cierra la proyeccin en memoria del fichero, si la hubiera
+
+        """
+
+        with self.mapping_lock:
+            if self.mapping is not None:
+                self.mapping.close()
+                self.mapping = None
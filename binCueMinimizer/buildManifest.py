@@ -0,0 +1,216 @@
+# coding=cp1252
+#
+# buildManifest.py
+#
+# Creative Commons Attribution-NonCommercial-ShareAlike 4.0 International (CC BY-NC-SA 4.0) 2019 granmacco <@granmacco>
+# https://github.com/granmacco
+#
+# Script inspired by @krcroft's reddit post on June 25th, 2019
+# https://www.reddit.com/r/RetroPie/comments/c50djy/chd_compression_summary_for_psx/
+# https://github.com/krcroft
+# Thank you very much, without you, this automation wouldn't have existed!
+#
+# Also, special thanks to the Plata o Roms team for finding @krcroft's post, 
+# putting me on the right track and inspiring some of the features of this script.
+# http://t.me/RaspberryPiEmuladores
+# Thank you very much for sharing your knowledge and for striving for excellence!
+#
+# Lastly, but not least, a very special thanks to @Sergi_0, for providing new ideas and methodologies to this script.
+# https://github.com/Sergi_0
+# Thank you very much for your kindness and time!!
+#
+# This code is licensed under Creative Commons BY-NC-SA 4.0
+# You may redistribute it and/or modify it under the terms of the 
+# Creative Commons BY-NC-SA 4.0 License, as published by the Creative
+# Commons on their website http://creativecommons.org/licenses/by-nc-sa/4.0/
+#
+
+
+import json
+import logging
+import os
+import threading
+from binCueMinimizer.trackCache import hash_data
+
+MANIFEST_VERSION = 1
+
+class BuildManifest:
+    """
+    Registro de los CHD generados: para cada cue y modo guarda el tamao, la fecha y opcionalmente el hash
+    de los ficheros de entrada, la firma de la cadena de conversin (comandos y versiones de las herramientas)
+    y el CHD resultante. Permite saltar los trabajos cuyo CHD sigue al da.
+
+    """
+
+    path = None
+    hash_inputs = False
+    entries = None
+
+    def __init__(self, path, hash_inputs = False):
+        self.path = os.path.abspath(path)
+        self.hash_inputs = hash_inputs
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """
+        Carga el manifiesto del disco. Si no existe o no se puede leer se empieza uno vaco
+
+        """
+
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                contents = json.load(file)
+            if contents.get('version') == MANIFEST_VERSION:
+                self.entries = contents.get('entries', {})
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError):
+            logging.exception('No se pudo leer el manifiesto ' + self.path + ', se empieza uno nuevo')
+
+    def save(self):
+        """
+        Guarda el manifiesto en el disco de forma atmica
+
+        """
+
+        with self.lock:
+            temporary_path = self.path + '.part'
+            with open(temporary_path, 'w', encoding='utf-8') as file:
+                json.dump({'version': MANIFEST_VERSION, 'entries': self.entries}, file, indent=1, sort_keys=True)
+            os.replace(temporary_path, self.path)
+
+    def get_entry_key(self, cue_path, mode):
+        return os.path.abspath(cue_path) + '|' + str(mode)
+
+    def describe_file(self, path, hash_file = False):
+        """
+        Describe un fichero por su tamao, su fecha de modificacin y, si se pide, su hash
+
+        Returns
+        -------
+        dict
+            La descripcin del fichero
+
+        """
+
+        stat = os.stat(path)
+        description = {'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+        if hash_file:
+            description['hash'] = hash_data(path)
+        return description
+
+    def get_inputs(self, cue):
+        """
+        Devuelve las rutas absolutas de los ficheros de entrada de un cue: el propio cue y sus bin
+
+        Parameters
+        ----------
+        cue : CueFile
+            El cue
+
+        Returns
+        -------
+        list [str]
+            Las rutas, sin repetidos
+
+        """
+
+        inputs = [os.path.abspath(cue.path)]
+        for bin_file in cue.bins:
+            path = os.path.abspath(bin_file.path)
+            if path not in inputs:
+                inputs.append(path)
+        return inputs
+
+    def is_file_current(self, path, description):
+        """
+        Determina si un fichero sigue siendo el descrito. Si solo ha cambiado la fecha y la descripcin
+        incluye el hash, se compara el contenido
+
+        """
+
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        if stat.st_size != description['size']:
+            return False
+        if stat.st_mtime_ns == description['mtime']:
+            return True
+        if 'hash' in description and hash_data(path) == description['hash']:
+            description['mtime'] = stat.st_mtime_ns
+            return True
+        return False
+
+    def is_current(self, cue, mode, chd_path, signature):
+        """
+        Determina si el CHD de un cue en un modo est al da. Los cues sin entrada en el manifiesto
+        se consideran al da si su CHD existe y es ms reciente que todas sus entradas, como hara make,
+        y en ese caso se registran.
+
+        Parameters
+        ----------
+        cue : CueFile
+            El cue
+        mode : int
+            El modo de operacin
+        chd_path : str
+            La ruta del CHD que genera ese modo
+        signature : str
+            La firma de la cadena de conversin del modo
+
+        Returns
+        -------
+        bool
+            True si no hace falta volver a generar el CHD
+
+        """
+
+        inputs = self.get_inputs(cue)
+        entry = self.entries.get(self.get_entry_key(cue.path, mode))
+        if entry is None:
+            try:
+                chd_mtime = os.stat(chd_path).st_mtime_ns
+                if all(os.stat(path).st_mtime_ns <= chd_mtime for path in inputs):
+                    self.record(cue, mode, chd_path, signature)
+                    return True
+            except OSError:
+                pass
+            return False
+        if entry['mode'] != mode or entry['signature'] != signature:
+            return False
+        # Los modos descartados por no merecer la pena no tienen CHD: basta con que las entradas no hayan cambiado
+        if entry['chd'] is not None and (os.path.abspath(chd_path) != entry['chd']['path'] or not self.is_file_current(chd_path, entry['chd'])):
+            return False
+        if sorted(inputs) != sorted(entry['inputs'].keys()):
+            return False
+        return all(self.is_file_current(path, description) for path, description in entry['inputs'].items())
+
+    def record(self, cue, mode, chd_path, signature):
+        """
+        Registra el CHD generado para un cue en un modo
+
+        Parameters
+        ----------
+        cue : CueFile
+            El cue
+        mode : int
+            El modo de operacin
+        chd_path : str
+            La ruta del CHD generado, o None si el modo se descart sin generarlo
+        signature : str
+            La firma de la cadena de conversin del modo
+
+        """
+
+        inputs = {}
+        for path in self.get_inputs(cue):
+            inputs[path] = self.describe_file(path, self.hash_inputs)
+        chd = None
+        if chd_path is not None:
+            chd = self.describe_file(chd_path)
+            chd['path'] = os.path.abspath(chd_path)
+        with self.lock:
+            self.entries[self.get_entry_key(cue.path, mode)] = {'mode': mode, 'signature': signature, 'inputs': inputs, 'chd': chd}
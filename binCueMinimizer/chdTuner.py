@@ -0,0 +1,276 @@
+# coding=cp1252
+#
+# chdTuner.py
+#
+# Creative Commons Attribution-NonCommercial-ShareAlike 4.0 International (CC BY-NC-SA 4.0) 2019 granmacco <@granmacco>
+# https://github.com/granmacco
+#
+# Script inspired by @krcroft's reddit post on June 25th, 2019
+# https://www.reddit.com/r/RetroPie/comments/c50djy/chd_compression_summary_for_psx/
+# https://github.com/krcroft
+# Thank you very much, without you, this automation wouldn't have existed!
+#
+# Also, special thanks to the Plata o Roms team for finding @krcroft's post, 
+# putting me on the right track and inspiring some of the features of this script.
+# http://t.me/RaspberryPiEmuladores
+# Thank you very much for sharing your knowledge and for striving for excellence!
+#
+# Lastly, but not least, a very special thanks to @Sergi_0, for providing new ideas and methodologies to this script.
+# https://github.com/Sergi_0
+# Thank you very much for your kindness and time!!
+#
+# This code is licensed under Creative Commons BY-NC-SA 4.0
+# You may redistribute it and/or modify it under the terms of the 
+# Creative Commons BY-NC-SA 4.0 License, as published by the Creative
+# Commons on their website http://creativecommons.org/licenses/by-nc-sa/4.0/
+#
+
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from shutil import rmtree
+from binCueMinimizer.osUtils import run, copy_data
+from binCueMinimizer.stageMetrics import StageEvent, STAGE_TUNE
+
+TUNING_VERSION = 1
+# Unidad de los hunks de chdman para CD: un frame de 2352 bytes ms 96 de subcdigo
+CD_FRAME_BYTES = 2448
+# Combinaciones a probar. La primera es la que usa chdman por defecto y gana los empates
+CODEC_SETS = ['cdlz,cdzl,cdfl', 'cdzl,cdfl', 'cdlz,cdfl', 'cdzl']
+HUNK_SIZES = [8 * CD_FRAME_BYTES, 4 * CD_FRAME_BYTES, 16 * CD_FRAME_BYTES]
+# Tamao aproximado de la muestra de cada disco, repartida entre sus pistas segn su tamao
+SAMPLE_BYTES = 16 * 1024 * 1024
+# La muestra no pasa de esta fraccin del disco, para que en los discos pequeos probar no cueste ms que convertirlos
+SAMPLE_FRACTION = 8
+# Cada ventana de muestra abarca varios hunks seguidos, para que los cdecs vean datos contiguos como en el disco
+SAMPLE_WINDOW_FRAMES = 32 * 8
+# Se elige la combinacin ms rpida entre las que no ocupan ms de este margen sobre la ms pequea
+SIZE_TOLERANCE = 0.02
+
+def get_disc_type(extents):
+    """
+    Clasifica un disco por los tipos de sus pistas de datos y la proporcin de audio, redondeada a cuartos
+
+    Parameters
+    ----------
+    extents : list [(Track, str, int, int)]
+        Las pistas del disco, como las devuelve CueFile.get_track_extents
+
+    Returns
+    -------
+    str
+        El tipo de disco, p.ej. 'MODE2/2352 audio 75%'
+
+    """
+
+    total = sum(size for track, path, offset, size in extents)
+    audio = sum(size for track, path, offset, size in extents if track.is_audio_track)
+    data_types = sorted({track.type.upper() for track, path, offset, size in extents if not track.is_audio_track})
+    share = round(4 * audio / total) * 25 if total else 0
+    return '+'.join(data_types or ['AUDIO']) + ' audio ' + str(share) + '%'
+
+def write_sample(extents, path):
+    """
+    Crea un cue de muestra con unas ventanas de cada pista del disco, repartidas a lo largo de ella
+
+    Parameters
+    ----------
+    extents : list [(Track, str, int, int)]
+        Las pistas del disco, como las devuelve CueFile.get_track_extents
+    path : str
+        El directorio en el que crear el cue y sus bin
+
+    Returns
+    -------
+    str
+        La ruta del cue de muestra
+
+    """
+
+    total = sum(size for track, source, offset, size in extents)
+    fraction = min(1 / SAMPLE_FRACTION, SAMPLE_BYTES / total) if total else 1.0
+    lines = []
+    number = 0
+    for track, source, offset, size in extents:
+        frames = size // track.framesize
+        if not frames:
+            continue
+        window = min(frames, SAMPLE_WINDOW_FRAMES)
+        windows = max(1, min(frames // window, round(frames * fraction / window)))
+        number += 1
+        name = 'sample %02d.bin' % number
+        with open(source, 'rb') as source_file, open(os.path.join(path, name), 'wb') as target_file:
+            for i in range(windows):
+                start = (frames - window) * (2 * i + 1) // (2 * windows)
+                copy_data(source_file.fileno(), target_file.fileno(), offset + start * track.framesize, window * track.framesize)
+        lines += ['FILE "' + name + '" BINARY', '  TRACK %02d %s' % (number, track.type.upper()), '    INDEX 01 00:00:00']
+    cue_path = os.path.join(path, 'sample.cue')
+    with open(cue_path, 'w') as file:
+        file.write('\n'.join(lines) + '\n')
+    return cue_path
+
+def get_cost(event, seconds):
+    """
+    Devuelve lo que ha costado una prueba: el tiempo de CPU de chdman si se ha podido medir, o si no el tiempo real
+
+    """
+
+    if event.processes:
+        return event.user_seconds + event.system_seconds
+    return seconds
+
+class ChdTuner:
+    """
+    Elige los cdecs y el tamao de hunk de chdman para cada tipo de disco. Comprime con cada combinacin una muestra
+    del disco, la vuelve a extraer, y se queda con la que menos tiempo suma entre las dos cosas de entre las que no
+    ocupan ms de SIZE_TOLERANCE sobre la ms pequea: la extraccin es lo que hace el emulador al leer el CHD.
+    Las decisiones se guardan en un fichero, as que cada tipo de disco solo se prueba una vez.
+
+    """
+
+    path = None
+    tolerance = SIZE_TOLERANCE
+    decisions = None
+
+    def __init__(self, path, tolerance = SIZE_TOLERANCE):
+        self.path = os.path.abspath(path)
+        self.tolerance = tolerance
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def load(self):
+        """
+        Lee las decisiones del disco. Si no existen o no se pueden leer se empieza sin ninguna
+
+        """
+
+        self.decisions = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                contents = json.load(file)
+            if contents.get('version') == TUNING_VERSION:
+                self.decisions = contents.get('decisions', {})
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError):
+            logging.exception('No se pudieron leer los ajustes de chdman ' + self.path + ', se empieza de cero')
+
+    def get(self, key):
+        with self.lock:
+            if self.decisions is None or key not in self.decisions:
+                # Otro proceso del lote puede haberlo decidido ya
+                self.load()
+            return self.decisions.get(key)
+
+    def record(self, key, decision):
+        """
+        Guarda una decisin en el disco de forma atmica, junto a las que hayan guardado otros procesos entretanto
+
+        """
+
+        with self.lock:
+            self.load()
+            self.decisions[key] = decision
+            temporary_path = self.path + '.' + str(os.getpid()) + '.part'
+            with open(temporary_path, 'w', encoding='utf-8') as file:
+                json.dump({'version': TUNING_VERSION, 'decisions': self.decisions}, file, indent=1, sort_keys=True)
+            os.replace(temporary_path, self.path)
+
+    def run_trial(self, tools, cue_path, path, codecs, hunk_size, processors = None):
+        """
+        Comprime la muestra con una combinacin y la vuelve a extraer
+
+        Returns
+        -------
+        (int, float)
+            El tamao del CHD y lo que han costado ambas cosas, o None si chdman ha fallado
+
+        """
+
+        chd_path = os.path.join(path, 'trial.chd')
+        command = 'chdman createcd -i %INPUT -o %OUTPUT -c ' + codecs + ' -hs ' + str(hunk_size)
+        if processors is not None:
+            command += ' -np ' + str(processors)
+        event = StageEvent(STAGE_TUNE)
+        start = time.monotonic()
+        try:
+            if run(tools.get_command(command), {'%INPUT': cue_path, '%OUTPUT': chd_path}, usage=event) != 0:
+                return None
+            size = os.path.getsize(chd_path)
+            if run(tools.get_command('chdman extractcd -i %INPUT -o %OUTPUT -ob %OUTPUTBIN'),
+                   {'%INPUT': chd_path, '%OUTPUT': os.path.join(path, 'trial.cue'), '%OUTPUTBIN': os.path.join(path, 'trial.bin')}, usage=event) != 0:
+                return None
+            return size, get_cost(event, time.monotonic() - start)
+        finally:
+            for name in ['trial.chd', 'trial.cue', 'trial.bin']:
+                if os.path.exists(os.path.join(path, name)):
+                    os.remove(os.path.join(path, name))
+
+    def tune(self, cue, label, tools, processors = None):
+        """
+        Devuelve los cdecs y el tamao de hunk para un cue, probndolos si su tipo de disco no se ha probado todava
+
+        Parameters
+        ----------
+        cue : CueFile
+            El cue que se va a convertir en CHD
+        label : str
+            Lo que adems del tipo de disco distingue a las decisiones, p.ej. el modo y la versin de chdman
+        tools : ToolRegistry
+            Las herramientas
+        processors : int
+            Los ncleos que puede usar chdman
+
+        Returns
+        -------
+        dict
+            La decisin, con 'codecs' y 'hunk_size', o None si no se ha podido decidir
+
+        """
+
+        extents = cue.get_track_extents()
+        if not extents:
+            return None
+        key = label + '|' + get_disc_type(extents) + '|' + str(self.tolerance)
+        decision = self.get(key)
+        if decision is not None:
+            return decision
+        logging.info('Probando combinaciones de chdman para ' + key)
+        sample_dir = tempfile.mkdtemp(prefix='.binCueMinimizer.tune.', dir=os.path.dirname(os.path.abspath(cue.path)))
+        try:
+            sample_cue = write_sample(extents, sample_dir)
+            results = []
+            for hunk_size in HUNK_SIZES:
+                for codecs in CODEC_SETS:
+                    result = self.run_trial(tools, sample_cue, sample_dir, codecs, hunk_size, processors)
+                    if result is None:
+                        logging.warning('chdman no admite -c ' + codecs + ' -hs ' + str(hunk_size))
+                        continue
+                    logging.debug('-c ' + codecs + ' -hs ' + str(hunk_size) + ': ' + str(result[0]) + ' bytes, ' + str(round(result[1], 3)) + ' s')
+                    results.append((codecs, hunk_size) + result)
+        except OSError:
+            logging.exception('No se pudo ajustar chdman para ' + cue.path)
+            return None
+        finally:
+            rmtree(sample_dir, ignore_errors=True)
+        if not results:
+            return None
+        smallest = min(size for codecs, hunk_size, size, cost in results)
+        # A igual coste gana la primera, que es la combinacin por defecto
+        codecs, hunk_size, size, cost = min((result for result in results if result[2] <= smallest * (1 + self.tolerance)), key=lambda result: result[3])
+        decision = {'codecs': codecs, 'hunk_size': hunk_size, 'size_ratio': size / smallest, 'seconds': cost}
+        self.record(key, decision)
+        logging.info('Ajuste de chdman para ' + key + ': -c ' + codecs + ' -hs ' + str(hunk_size))
+        return decision
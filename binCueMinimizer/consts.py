@@ -51,4 +51,25 @@ MODE_LOSSYWAV_HARD  = 3
 MODE_U8WAV          = 4
 MODE_EVERYTHING     = 5
 SWITCH_FORCE        = 6
+SWITCH_WORKERS      = 7
+SWITCH_STREAMING    = 8
+SWITCH_CACHE        = 9
+SWITCH_INCREMENTAL  = 10
+SWITCH_METRICS      = 11
+SWITCH_DEDUP        = 12
+SWITCH_TUNE         = 13
 EXIT                = 0
+
+# Directorio de la cach de pistas de audio procesadas, relativo al directorio de trabajo
+TRACK_CACHE_DIR = '.binCueMinimizer.cache'
+# Manifiesto de los CHD generados, relativo al directorio de trabajo
+BUILD_MANIFEST_FILE = '.binCueMinimizer.manifest.json'
+# Ficheros y directorios que no se recorren al buscar cues: los ocultos (cach, manifiesto) y los directorios de trabajo,
+# que solo se crean en la raz y se llaman temp, temp1, temp2...
+SCAN_EXCLUDE = ['.*', '/temp', '/temp[1-9]', '/temp[1-9][0-9]', '/temp[1-9][0-9][0-9]']
+# Cach de los cues ya tokenizados, relativa al directorio de trabajo
+PARSE_CACHE_FILE = '.binCueMinimizer.cues.json'
+# Eventos de las etapas ejecutadas, en formato JSON lines, junto al log
+METRICS_FILE = 'binCueMinimizer.metrics.jsonl'
+# Cdecs y tamao de hunk de chdman elegidos para cada tipo de disco, relativo al directorio de trabajo
+CHD_TUNING_FILE = '.binCueMinimizer.tuning.json'
@@ -0,0 +1,179 @@
+# coding=cp1252
+#
+# cpuBudget.py
+#
+# Creative Commons Attribution-NonCommercial-ShareAlike 4.0 International (CC BY-NC-SA 4.0) 2019 granmacco <@granmacco>
+# https://github.com/granmacco
+#
+# Script inspired by @krcroft's reddit post on June 25th, 2019
+# https://www.reddit.com/r/RetroPie/comments/c50djy/chd_compression_summary_for_psx/
+# https://github.com/krcroft
+# Thank you very much, without you, this automation wouldn't have existed!
+#
+# Also, special thanks to the Plata o Roms team for finding @krcroft's post, 
+# putting me on the right track and inspiring some of the features of this script.
+# http://t.me/RaspberryPiEmuladores
+# Thank you very much for sharing your knowledge and for striving for excellence!
+#
+# Lastly, but not least, a very special thanks to @Sergi_0, for providing new ideas and methodologies to this script.
+# https://github.com/Sergi_0
+# Thank you very much for your kindness and time!!
+#
+# This code is licensed under Creative Commons BY-NC-SA 4.0
+# You may redistribute it and/or modify it under the terms of the 
+# Creative Commons BY-NC-SA 4.0 License, as published by the Creative
+# Commons on their website http://creativecommons.org/licenses/by-nc-sa/4.0/
+#
+
+
+import logging
+import math
+import multiprocessing
+import os
+from contextlib import contextmanager, nullcontext
+
+# Presupuesto del proceso actual. En los procesos del pool lo fija el inicializador
+_budget = None
+
+def set_budget(budget):
+    """
+    Fija el presupuesto de CPU que usan los trabajos de este proceso. Sirve como inicializador del pool de procesos
+
+    Parameters
+    ----------
+    budget : CpuBudget
+        El presupuesto, o None para no limitar el uso de CPU
+
+    """
+
+    global _budget
+    _budget = budget
+
+def get_budget():
+    return _budget
+
+def use_cores(cores = 1, stretch = False):
+    """
+    Reserva ncleos del presupuesto del proceso mientras dura el bloque. Sin presupuesto no se espera nada
+
+    Parameters
+    ----------
+    cores : int
+        Los ncleos que necesita la etapa, o el mnimo si puede usar ms
+    stretch : bool
+        Si la etapa puede aprovechar ms ncleos que los que necesita
+
+    Returns
+    -------
+    context manager
+        Devuelve los ncleos concedidos, o None si no hay presupuesto
+
+    """
+
+    if _budget is None:
+        return nullcontext(None)
+    return _budget.reserve(cores, stretch)
+
+@contextmanager
+def running_job():
+    """
+    Cuenta el trabajo como en marcha mientras dura el bloque, para repartir los ncleos entre los trabajos activos
+
+    """
+
+    if _budget is None:
+        yield
+        return
+    _budget.start_job()
+    try:
+        yield
+    finally:
+        _budget.finish_job()
+
+class CpuBudget:
+    """
+    Presupuesto global de ncleos, compartido por todos los procesos del lote. Cada etapa reserva los ncleos que
+    va a ocupar antes de lanzar su herramienta y los devuelve al terminar: ffmpeg, lossyWAV y la cuantizacin
+    ocupan uno, y chdman recibe con -np los que haya libres, hasta su parte proporcional entre los trabajos en marcha.
+    As la mquina se mantiene ocupada sin lanzar ms hilos que ncleos.
+
+    Solo se puede pasar a otros procesos al crearlos, p.ej. con el inicializador del pool.
+
+    """
+
+    cores = 1
+    condition = None
+    free = None
+    jobs = None
+
+    def __init__(self, cores = None):
+        if cores is None:
+            cores = os.cpu_count() or 1
+        self.cores = max(1, int(cores))
+        self.condition = multiprocessing.Condition()
+        # Ambos valores se protegen con la condicin
+        self.free = multiprocessing.RawValue('i', self.cores)
+        self.jobs = multiprocessing.RawValue('i', 0)
+
+    def get_share(self):
+        """
+        Devuelve los ncleos que le tocan a cada trabajo en marcha
+
+        """
+
+        return math.ceil(self.cores / max(1, self.jobs.value))
+
+    def acquire(self, cores = 1, stretch = False):
+        """
+        Espera a que haya ncleos libres y los reserva
+
+        Parameters
+        ----------
+        cores : int
+            Los ncleos que necesita la etapa. Nunca se piden ms que los del presupuesto
+        stretch : bool
+            Si es True, se conceden adems los ncleos libres, sin pasar de la parte de cada trabajo
+
+        Returns
+        -------
+        int
+            Los ncleos concedidos
+
+        """
+
+        cores = max(1, min(cores, self.cores))
+        with self.condition:
+            self.condition.wait_for(lambda: self.free.value >= cores)
+            granted = cores
+            if stretch:
+                granted = max(cores, min(self.free.value, self.get_share()))
+            self.free.value -= granted
+        logging.debug('Reservados ' + str(granted) + ' ncleos')
+        return granted
+
+    def release(self, cores):
+        with self.condition:
+            self.free.value += cores
+            self.condition.notify_all()
+
+    @contextmanager
+    def reserve(self, cores = 1, stretch = False):
+        """
+        Reserva ncleos mientras dura el bloque, devolviendo los concedidos
+
+        """
+
+        granted = self.acquire(cores, stretch)
+        try:
+            yield granted
+        finally:
+            self.release(granted)
+
+    def start_job(self):
+        with self.condition:
+            self.jobs.value += 1
+
+    def finish_job(self):
+        with self.condition:
+            self.jobs.value -= 1
+            self.condition.notify_all()
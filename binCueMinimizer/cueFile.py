@@ -27,13 +27,123 @@
 
 import copy
 import logging
-import re
 import os.path as osp
 import shutil
 from binCueMinimizer.binFile import Bin
+from binCueMinimizer.osUtils import copy_data, copy_data_with_checksum, place_file
+from binCueMinimizer.timestamp import format_msf
 from binCueMinimizer.track import Track
+from binCueMinimizer.parseCache import ParseCache
 from ntpath import basename
 
+RECORD_FILE = 'FILE'
+RECORD_TRACK = 'TRACK'
+RECORD_INDEX = 'INDEX'
+RECORD_PREGAP = 'PREGAP'
+
+# Cach de cues tokenizados del proceso, opcional (ParseCache)
+parse_cache = None
+
+def use_parse_cache(path):
+    """
+    Activa en este proceso la cach persistente de cues tokenizados
+
+    Parameters
+    ----------
+    path : str
+        El fichero de la cach. Con None se desactiva
+
+    """
+
+    global parse_cache
+    parse_cache = None if path is None else ParseCache(path)
+
+def save_parse_cache():
+    """
+    Guarda la cach de cues tokenizados, si est activa
+
+    """
+
+    if parse_cache is not None:
+        try:
+            parse_cache.save()
+        except OSError:
+            logging.exception('No se pudo guardar la cach de cues ' + parse_cache.path)
+
+def is_timestamp(string):
+    parts = string.split(':')
+    return len(parts) == 3 and all(part.isdigit() for part in parts)
+
+def tokenize_cue(lines):
+    """
+    Convierte las lneas de un cue en registros, en una sola pasada y decidiendo por la primera palabra de cada lnea.
+    Las lneas que no interesan o que estn mal formadas se ignoran.
+
+    Parameters
+    ----------
+    lines : iterable [str]
+        Las lneas del cue
+
+    Returns
+    -------
+    list [list [str]]
+        Los registros: [FILE, fichero], [TRACK, nmero, tipo], [INDEX, "nmero mm:ss:ff"] y [PREGAP, "mm:ss:ff"]
+
+    """
+
+    records = []
+    for line in lines:
+        parts = line.split(None, 1)
+        if not parts:
+            continue
+        keyword = parts[0].lstrip('\ufeff').upper()
+        rest = parts[1] if len(parts) > 1 else ''
+        if keyword == RECORD_INDEX:
+            parts = rest.split()
+            if len(parts) >= 2 and parts[0].isdigit() and is_timestamp(parts[1]):
+                records.append([RECORD_INDEX, parts[0] + ' ' + parts[1]])
+        elif keyword == RECORD_TRACK:
+            parts = rest.split()
+            if len(parts) >= 2 and parts[0].isdigit():
+                records.append([RECORD_TRACK, parts[0], parts[1]])
+        elif keyword == RECORD_FILE:
+            # El nombre va entre comillas, simples o dobles, y puede contener espacios
+            start = min([position for position in (rest.find('"'), rest.find("'")) if position >= 0], default=-1)
+            end = max(rest.rfind('"'), rest.rfind("'"))
+            if 0 <= start < end:
+                records.append([RECORD_FILE, rest[start + 1:end]])
+        elif keyword == RECORD_PREGAP:
+            parts = rest.split()
+            if parts and is_timestamp(parts[0]):
+                records.append([RECORD_PREGAP, parts[0]])
+    return records
+
+def read_cue_records(path):
+    """
+    Lee y tokeniza un cue, usando la cach de cues tokenizados si est activa
+
+    Parameters
+    ----------
+    path : str
+        La ruta del cue
+
+    Returns
+    -------
+    list [list [str]]
+        Los registros del cue
+
+    """
+
+    if parse_cache is not None:
+        records = parse_cache.get(path)
+        if records is not None:
+            return records
+    with open(path, "r") as file:
+        records = tokenize_cue(file)
+    if parse_cache is not None:
+        parse_cache.put(path, records)
+    return records
+
 class CueFile:
     path = None
     framesize = None
@@ -42,14 +152,6 @@ class CueFile:
     has_audio_tracks = False
     has_data_tracks = False
     was_found_processable = True
-    
-    regex_file_line = r'(?:FILE|file|File) (?:\'|\")(.*)(?:\'|\").*'
-    regex_track_line = r'(?:TRACK|track|Track) (\d+) (\S+)'
-    regex_index_line = r'(?:INDEX|index|Index) (\d+ \d+:\d+:\d+)'
-    regex_pregap_line = r'(?:PREGAP|pregap|Pregap) (\d+:\d+:\d+)'
-    compiled_regex_file_line = re.compile(regex_file_line)
-    compiled_regex_track_line = re.compile(regex_track_line)
-    compiled_regex_index_line = re.compile(regex_index_line)
 
     def __init__(self, cue = None):
         self.tracks = []
@@ -78,6 +180,33 @@ class CueFile:
                 files_to_process.append(track)
         return files_to_process
 
+    def get_track_extents(self):
+        """
+        Devuelve dnde est cada pista sin separarlas: su fichero, su posicin y su tamao
+
+        Returns
+        -------
+        list [(Track, str, int, int)]
+            Cada pista con su fichero, la posicin en bytes en la que empieza y su tamao, en el orden del cue.
+            Vaca si el cue tiene varios ficheros con varias pistas cada uno
+
+        """
+
+        if self.is_monofile_multitrack():
+            bin_file = self.bins[0]
+            # Igual que al separar las pistas: cada una va desde su primer indice hasta el de la siguiente
+            extents = []
+            end = bin_file.filesize // self.framesize
+            for track in reversed(self.tracks):
+                start = track.get_start_in_frames()
+                extents.append((track, bin_file.path, start * track.framesize, (end - start) * track.framesize))
+                end = start
+            extents.reverse()
+            return extents
+        if len(self.bins) == len(self.tracks):
+            return [(track, track.path, 0, track.bin.filesize) for track in self.tracks]
+        return []
+
     def parse_cue(self, cue):
         """
         Parsea un fichero cue e inicializa la estructura de datos
@@ -90,42 +219,27 @@ class CueFile:
         """
 
         self.path = cue
-        cue_contents = None
         last_bin = None
         last_track = None
         last_pregap = None
-        with open(cue, "r") as file:
-            cue_contents = file.read().split('\n')
-
-        for line in cue_contents:
-        
-            # Es linea de fichero?    
-            results = re.search(self.regex_file_line, line)
-            if results:
-                last_bin = Bin(osp.join(osp.dirname(cue), results.group(1)))
-                self.bins.append(last_bin)
-                
-            # Es linea de pista?
-            results = re.search(self.regex_track_line, line)
-            if results:
-                last_track = Track(bin_file=last_bin, track_id=results.group(1), track_type = results.group(2), parent_cue = self)
+        for record in read_cue_records(cue):
+            keyword = record[0]
+            if keyword == RECORD_INDEX:
+                last_track.add_index(record[1], pregap = last_pregap)
+                last_pregap = None
+            elif keyword == RECORD_TRACK:
+                last_track = Track(bin_file=last_bin, track_id=record[1], track_type = record[2], parent_cue = self)
                 last_track.check_if_exists()
                 self.tracks.append(last_track)
                 if last_track.framesize and not self.framesize:
                     self.framesize = last_track.framesize
                 self.has_audio_tracks |= last_track.is_audio_track
                 self.has_data_tracks |= last_track.is_data_track
-              
-            # Es linea de indice?
-            results = re.search(self.regex_index_line, line)
-            if results:
-                last_track.add_index(results.group(1), pregap = last_pregap)
-                last_pregap = None
-                
-            # Es linea de pregap?
-            results = re.search(self.regex_pregap_line, line)
-            if results:
-                last_pregap = results.group(1)
+            elif keyword == RECORD_FILE:
+                last_bin = Bin(osp.join(osp.dirname(cue), record[1]))
+                self.bins.append(last_bin)
+            elif keyword == RECORD_PREGAP:
+                last_pregap = record[1]
 
         if self.is_processable():
             if len(self.bins) == len(self.tracks):
@@ -167,20 +281,33 @@ class CueFile:
                     logging.error(msg)
         return self.was_found_processable
     
-    def copy_to_dir(self, path):
+    def close(self):
+        """
+        Cierra las proyecciones en memoria de los bin de este cue, si las hubiera
+
         """
-        Copia los ficheros relativos a este cue a la ruta especificada
+
+        for track in self.tracks:
+            if track.bin:
+                track.bin.close()
+
+    def copy_to_dir(self, path, strategies = None):
+        """
+        Lleva los ficheros relativos a este cue a la ruta especificada. Los bin se enlazan si es posible
+        en lugar de copiarse (ver osUtils.place_file); el cue siempre se copia, ya que se puede reescribir.
     
         Parameters
         ----------
         path : str
             La nueva ruta
+        strategies : list [str]
+            Las formas de colocacin de los bin a probar, en orden
 
         """
     
         logging.debug('Copiando juego ' + self.path + ' al directorio ' + path)
         for bin_file in self.bins:
-            shutil.copy(osp.join(path, bin_file.path), path)
+            place_file(osp.join(path, bin_file.path), path, strategies)
         shutil.copy(self.path, path)
         new_cue = copy.copy(self)
         new_cue.update_path(path)
@@ -221,21 +348,33 @@ class CueFile:
             cue_contents += 'FILE "' + basename(self.bins[0].path) + '" BINARY' + '\n'
             for track in self.tracks:
                 cue_contents += '  TRACK ' + track.id + ' ' + track.type + '\n'
-                for index in track.indexes:
-                    cue_contents += '    INDEX ' + track.indexes[index].id + ' ' + str(track.indexes[index].timestamp) + '\n'
+                if track.pregap:
+                    cue_contents += '    PREGAP ' + format_msf(track.pregap) + '\n'
+                for index in track.indexes.values():
+                    cue_contents += '    INDEX ' + index.id + ' ' + format_msf(index.length_in_frames) + '\n'
         else:
             for track in self.tracks:
                 cue_contents += 'FILE "' + basename(track.path) + '" BINARY' + '\n'
                 cue_contents += '  TRACK ' + track.id + ' ' + track.type + '\n'
-                for index in track.indexes:
-                    cue_contents += '    INDEX ' + track.indexes[index].id + ' ' + str(track.indexes[index].timestamp) + '\n'
+                if track.pregap:
+                    cue_contents += '    PREGAP ' + format_msf(track.pregap) + '\n'
+                for index in track.indexes.values():
+                    cue_contents += '    INDEX ' + index.id + ' ' + format_msf(index.length_in_frames) + '\n'
         with open(path, 'w') as file:
             file.write(cue_contents)
     
-    def split_tracks(self):
+    def split_tracks(self, checksum = False, virtual_audio = False):
         """
         Separa el bin nico en multiples pistas, creando un nuevo cue, el cual devuelve.
     
+        Parameters
+        ----------
+        checksum : bool
+            Si se debe calcular el CRC32 de cada pista durante la copia. Sin l la copia la hace el kernel
+        virtual_audio : bool
+            Si es True, las pistas de audio no se copian: quedan como vistas sobre el bin original
+            y ser la etapa que las recodifique quien escriba su fichero
+
         Returns
         -------
         CueFile
@@ -250,7 +389,7 @@ class CueFile:
             actual_offset = max_offset
             new_cue.bins = []
             for track in reversed(new_cue.tracks):
-                starting_point = track.indexes["01"].length_in_frames
+                starting_point = track.get_start_in_frames()
                 track.tracksize = (actual_offset - starting_point) * track.framesize
                 actual_offset = starting_point
                 original_track_basename = basename(track.path)
@@ -259,20 +398,29 @@ class CueFile:
                 track.parent_cue = new_cue
                 track.set_indexes_to_zero()
                 
-            # Tras calcular las nuevas longitudes de pista y los nuevos nombres, partimos el bin original
+            # Tras calcular las nuevas longitudes de pista y los nuevos nombres, partimos el bin original en una sola pasada
+            offset = 0
             with open(source_bin_file.path, 'rb') as source_file:
                 for track in new_cue.tracks:
+                    track.offset = offset
+                    if virtual_audio and track.is_audio_track:
+                        logging.debug('La pista ' + track.id + ' queda como vista sobre el fichero ' + source_bin_file.path)
+                        track.is_virtual = True
+                        offset += track.tracksize
+                        continue
                     logging.debug('Separando la pista ' + track.id + ' del fichero ' + source_bin_file.path)
-                    written = 0
-                    chunksize = 8192
                     with open(track.path, 'wb') as target_file:
-                        while written != track.tracksize:
-                            if chunksize + written > track.tracksize:
-                                chunksize = track.tracksize - written
-                            chunk = source_file.read(chunksize)
-                            target_file.write(chunk)
-                            written += chunksize
-                new_cue.bins.append(Bin(track.path))
+                        if checksum:
+                            written, track.checksum = copy_data_with_checksum(source_file.fileno(), target_file.fileno(), offset, track.tracksize)
+                        else:
+                            written = copy_data(source_file.fileno(), target_file.fileno(), offset, track.tracksize)
+                    if written != track.tracksize:
+                        msg = 'La pista ' + track.id + ' de ' + source_bin_file.path + ' debera tener ' + str(track.tracksize) + ' bytes, pero solo se pudieron copiar ' + str(written)
+                        logging.error(msg)
+                        raise IOError(msg)
+                    logging.debug('Pista ' + track.id + ': ' + str(written) + ' bytes' + (', CRC32 ' + format(track.checksum, '08X') if checksum else ''))
+                    offset += written
+                new_cue.bins.append(Bin(track.path, filesize=track.tracksize))
             new_cue.write_cue()
             return new_cue
         else:
@@ -0,0 +1,209 @@
+# coding=cp1252
+#
+# gainPredictor.py
+#
+# Creative Commons Attribution-NonCommercial-ShareAlike 4.0 International (CC BY-NC-SA 4.0) 2019 granmacco <@granmacco>
+# https://github.com/granmacco
+#
+# Script inspired by @krcroft's reddit post on June 25th, 2019
+# https://www.reddit.com/r/RetroPie/comments/c50djy/chd_compression_summary_for_psx/
+# https://github.com/krcroft
+# Thank you very much, without you, this automation wouldn't have existed!
+#
+# Also, special thanks to the Plata o Roms team for finding @krcroft's post, 
+# putting me on the right track and inspiring some of the features of this script.
+# http://t.me/RaspberryPiEmuladores
+# Thank you very much for sharing your knowledge and for striving for excellence!
+#
+# Lastly, but not least, a very special thanks to @Sergi_0, for providing new ideas and methodologies to this script.
+# https://github.com/Sergi_0
+# Thank you very much for your kindness and time!!
+#
+# This code is licensed under Creative Commons BY-NC-SA 4.0
+# You may redistribute it and/or modify it under the terms of the 
+# Creative Commons BY-NC-SA 4.0 License, as published by the Creative
+# Commons on their website http://creativecommons.org/licenses/by-nc-sa/4.0/
+#
+
+
+import logging
+import os
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Tamao de un sector de CD
+SECTOR_BYTES = 2352
+# Ventanas de muestra por pista, de un segundo cada una, repartidas a lo largo de la pista
+SAMPLE_WINDOWS = 8
+SAMPLE_WINDOW_BYTES = 75 * SECTOR_BYTES
+# La muestra no pasa de esta fraccin de la pista, para que estimar no cueste casi lo mismo que codificar las pistas cortas
+SAMPLE_FRACTION = 16
+# Tamao de bloque del cdec FLAC de chdman para CD (cdfl): un hunk de 8 frames de 2448 bytes, dividido entre 4
+# y reducido a la mitad hasta no superar los 2352 de un sector
+FLAC_BLOCK_SAMPLES = 1224
+# Ganancia mnima estimada, respecto al audio sin prdidas, para que merezca la pena aplicar un modo con prdidas
+MIN_GAIN = 0.05
+
+def is_available():
+    """
+    Determina si se puede estimar la ganancia en el propio proceso
+
+    Returns
+    -------
+    bool
+        True si numpy est instalado
+
+    """
+
+    return numpy is not None
+
+def get_sample_windows(size, windows = SAMPLE_WINDOWS, window_bytes = SAMPLE_WINDOW_BYTES):
+    """
+    Reparte las ventanas de muestra a lo largo de una pista, alineadas a sector
+
+    Parameters
+    ----------
+    size : int
+        El tamao de la pista en bytes
+    windows : int
+        El nmero de ventanas
+    window_bytes : int
+        El tamao de cada ventana
+
+    Returns
+    -------
+    list [(int, int)]
+        La posicin y el tamao de cada ventana. Si la pista es ms corta que una ventana, una sola con toda la pista
+
+    """
+
+    if size <= window_bytes:
+        return [(0, size)] if size else []
+    windows = max(1, min(windows, size // (SAMPLE_FRACTION * window_bytes)))
+    sectors = (size - window_bytes) // SECTOR_BYTES
+    return [(sectors * (2 * i + 1) // (2 * windows) * SECTOR_BYTES, window_bytes) for i in range(windows)]
+
+def write_sample(source, target, windows = SAMPLE_WINDOWS, window_bytes = SAMPLE_WINDOW_BYTES):
+    """
+    Aade al final de un fichero las ventanas de muestra de una pista de audio
+
+    Parameters
+    ----------
+    source : str o memoryview
+        El bin de la pista, o directamente sus datos
+    target : file
+        El fichero de muestra, abierto en binario
+    windows : int
+        El nmero de ventanas
+    window_bytes : int
+        El tamao de cada ventana
+
+    Returns
+    -------
+    int
+        Los bytes escritos
+
+    """
+
+    is_path = isinstance(source, str)
+    size = os.path.getsize(source) if is_path else source.nbytes
+    written = 0
+    if is_path:
+        with open(source, 'rb') as file:
+            for offset, length in get_sample_windows(size, windows, window_bytes):
+                file.seek(offset)
+                written += target.write(file.read(length))
+    else:
+        for offset, length in get_sample_windows(size, windows, window_bytes):
+            written += target.write(source[offset:offset + length])
+    return written
+
+def estimate_channel_bits(channel):
+    """
+    Estima los bits que necesita FLAC para un canal ya dividido en bloques, eligiendo en cada bloque
+    el mejor predictor fijo (orden 0 a 2) y codificando el residuo con Rice. Los bits bajos que son 0
+    en todo el bloque (los que deja a 0 lossyWAV o la cuantizacin a u8) no se codifican, igual que en FLAC.
+
+    Parameters
+    ----------
+    channel : numpy.ndarray
+        Las muestras, en una matriz de bloques x muestras de enteros de 32 bits
+
+    Returns
+    -------
+    float
+        Los bits estimados
+
+    """
+
+    combined = numpy.bitwise_or.reduce(channel, axis=1)
+    # Bits bajos a 0 en todo el bloque: posicin del bit menos significativo del OR de todas las muestras
+    lowest_bit = combined & -combined
+    wasted = numpy.where(combined != 0, numpy.log2(numpy.maximum(lowest_bit, 1)), 0).astype(numpy.int32)
+    shifted = channel >> wasted[:, None]
+    residuals = [shifted, numpy.diff(shifted, axis=1), numpy.diff(shifted, n=2, axis=1)]
+    mean = numpy.min([numpy.abs(residual).mean(axis=1) for residual in residuals], axis=0)
+    # Parmetro Rice ptimo aproximado para una distribucin laplaciana de media dada
+    rice = numpy.maximum(numpy.floor(numpy.log2(numpy.maximum(mean, 1))), 0)
+    # Si el residuo no compensa, FLAC guarda las muestras tal cual
+    bits_per_sample = numpy.minimum(rice + 1 + 2 * mean / 2 ** rice, 16 - wasted)
+    # Un bloque todo ceros se codifica como constante
+    return float(numpy.where(combined != 0, bits_per_sample * channel.shape[1], 16).sum())
+
+def estimate_flac_size(source):
+    """
+    Estima el tamao que tendra en FLAC un audio s16le estreo, con el tamao de bloque que usa chdman
+
+    Parameters
+    ----------
+    source : str, bytes o memoryview
+        El bin de audio, o directamente sus datos
+
+    Returns
+    -------
+    int
+        El tamao estimado en bytes
+
+    """
+
+    if not is_available():
+        raise RuntimeError('numpy no est instalado')
+    if isinstance(source, str):
+        samples = numpy.fromfile(source, dtype='<i2')
+    else:
+        samples = numpy.frombuffer(source, dtype='<i2')
+    blocks = len(samples) // (2 * FLAC_BLOCK_SAMPLES)
+    if blocks == 0:
+        return len(samples) * 2
+    frames = samples[:blocks * 2 * FLAC_BLOCK_SAMPLES].astype(numpy.int32).reshape(blocks, FLAC_BLOCK_SAMPLES, 2)
+    left = frames[:, :, 0]
+    right = frames[:, :, 1]
+    side = left - right
+    mid = (left + right) >> 1
+    left_bits = estimate_channel_bits(left)
+    right_bits = estimate_channel_bits(right)
+    side_bits = estimate_channel_bits(side)
+    mid_bits = estimate_channel_bits(mid)
+    # FLAC elige la mejor combinacin estreo; aqu se aproxima eligiendo la mejor para toda la muestra
+    bits = min(left_bits + right_bits, left_bits + side_bits, right_bits + side_bits, mid_bits + side_bits)
+    # El resto que no llega a un bloque completo se cuenta sin comprimir
+    tail = len(samples) - blocks * 2 * FLAC_BLOCK_SAMPLES
+    logging.debug('Tamao FLAC estimado: ' + str(int(bits // 8)) + ' bytes de ' + str(len(samples) * 2))
+    return int(bits // 8) + tail * 2
+
+def get_gain(lossless_size, lossy_size):
+    """
+    Devuelve la ganancia de un tamao con prdidas frente al tamao sin prdidas
+
+    Returns
+    -------
+    float
+        La fraccin del tamao sin prdidas que se ahorra. Negativa si el resultado es mayor
+
+    """
+
+    if lossless_size <= 0:
+        return 0.0
+    return 1 - lossy_size / lossless_size
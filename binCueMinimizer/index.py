@@ -26,24 +26,32 @@
 #
 
 import re
-from binCueMinimizer.consts import frames_por_segundo
-from binCueMinimizer.timestamp import Timestamp
+import sys
+from binCueMinimizer.timestamp import Timestamp, parse_frames
 
 class Index:
-    id = None
-    timestamp = None
-    length_in_frames = None
+    # El indice se guarda como nmero de frames desde el inicio del fichero; se pasa a MM:SS:FF solo al escribir el cue
+    __slots__ = ('id', 'length_in_frames')
     
     regex_line = r'(\d+) (\d+:\d+:\d+)'
-    regex_timestamp = r'(\d+):(\d+):(\d+)'
     compiled_regex_line = re.compile(regex_line)
-    compiled_regex_timestamp = re.compile(regex_timestamp)
     
-    def __init__(self, line = None, index_id = None, timestamp = None):
+    def __init__(self, line = None, index_id = None, timestamp = None, length_in_frames = None):
+        self.id = None
+        self.length_in_frames = None
         if line:
             self.set_from_string(line)
         elif index_id and timestamp:
             self.set(index_id, timestamp)
+        elif index_id and length_in_frames is not None:
+            self.id = index_id
+            self.length_in_frames = length_in_frames
+
+    @property
+    def timestamp(self):
+        if self.length_in_frames is None:
+            return None
+        return Timestamp(total_frames=self.length_in_frames)
         
     def set_from_string(self, line):
         """
@@ -56,7 +64,12 @@ class Index:
 
         """
 
-        results = re.search(self.regex_line, line)
+        parts = line.split()
+        if len(parts) == 2 and parts[0].isdigit():
+            # Caso habitual, sin expresiones regulares
+            self.set(parts[0], parts[1])
+            return
+        results = self.compiled_regex_line.search(line)
         if results:
             self.set(results.group(1), results.group(2))
         
@@ -73,9 +86,9 @@ class Index:
 
         """
 
-        self.id = index_id
-        self.timestamp = Timestamp(timestamp)
-        self.length_in_frames = self.from_timestamp_to_frames()
+        # Los ids se repiten en todas las pistas ("00", "01"...), as que se comparte una sola copia
+        self.id = sys.intern(index_id)
+        self.length_in_frames = parse_frames(timestamp)
         
     def from_timestamp_to_frames(self):
-        return self.timestamp.frames + (self.timestamp.secs * frames_por_segundo) + (self.timestamp.mins * 60 * frames_por_segundo)
+        return self.length_in_frames
@@ -0,0 +1,98 @@
+# coding=cp1252
+#
+# libraryScanner.py
+#
+# Creative Commons Attribution-NonCommercial-ShareAlike 4.0 International (CC BY-NC-SA 4.0) 2019 granmacco <@granmacco>
+# https://github.com/granmacco
+#
+# Script inspired by @krcroft's reddit post on June 25th, 2019
+# https://www.reddit.com/r/RetroPie/comments/c50djy/chd_compression_summary_for_psx/
+# https://github.com/krcroft
+# Thank you very much, without you, this automation wouldn't have existed!
+#
+# Also, special thanks to the Plata o Roms team for finding @krcroft's post, 
+# putting me on the right track and inspiring some of the features of this script.
+# http://t.me/RaspberryPiEmuladores
+# Thank you very much for sharing your knowledge and for striving for excellence!
+#
+# Lastly, but not least, a very special thanks to @Sergi_0, for providing new ideas and methodologies to this script.
+# https://github.com/Sergi_0
+# Thank you very much for your kindness and time!!
+#
+# This code is licensed under Creative Commons BY-NC-SA 4.0
+# You may redistribute it and/or modify it under the terms of the 
+# Creative Commons BY-NC-SA 4.0 License, as published by the Creative
+# Commons on their website http://creativecommons.org/licenses/by-nc-sa/4.0/
+#
+
+
+import hashlib
+import logging
+import os
+from binCueMinimizer.cueFile import read_cue_records, RECORD_FILE
+from binCueMinimizer.osUtils import scan_files
+
+def get_bin_paths(cue_path):
+    """
+    Lee las rutas de los bin enlazados por un cue a partir de sus registros, sin construir sus pistas
+
+    Parameters
+    ----------
+    cue_path : str
+        La ruta del cue
+
+    Returns
+    -------
+    list [str]
+        Las rutas reales de los bin, normalizadas
+
+    """
+
+    bin_paths = []
+    for record in read_cue_records(cue_path):
+        if record[0] == RECORD_FILE:
+            bin_path = os.path.join(os.path.dirname(cue_path), record[1])
+            bin_paths.append(os.path.normcase(os.path.realpath(bin_path)))
+    return bin_paths
+
+def scan_cues(path = None, include = None, exclude = None, recursive = True):
+    """
+    Recorre una biblioteca devolviendo sus cues segn se encuentran, para poder empezar a procesar el primero
+    sin esperar al resto. Si varios cues enlazan los mismos bin solo se devuelve el primero.
+    De cada cue devuelto solo se guarda un resumen de sus bin, as que la memoria apenas crece con la biblioteca.
+
+    Parameters
+    ----------
+    path : str
+        El directorio a recorrer. Por defecto, el directorio de ejecucin
+    include : list [str]
+        Patrones glob que deben cumplir los cues
+    exclude : list [str]
+        Patrones glob de ficheros y directorios a ignorar
+    recursive : bool
+        Si se recorren tambin los subdirectorios
+
+    Returns
+    -------
+    generator [str]
+        Las rutas absolutas de los cues
+
+    """
+
+    seen_bins = set()
+    for cue_path in scan_files(path, extension='cue', include=include, exclude=exclude, recursive=recursive):
+        try:
+            bin_paths = get_bin_paths(cue_path)
+        except (OSError, UnicodeDecodeError):
+            # Se devuelve igualmente para que su trabajo informe del error
+            logging.exception('No se pudo leer ' + cue_path)
+            bin_paths = []
+        if bin_paths:
+            key = hashlib.sha1('\n'.join(sorted(bin_paths)).encode('utf-8', 'surrogateescape')).digest()
+            if key in seen_bins:
+                msg = 'El cue ' + cue_path + ' enlaza los mismos BIN que otro ya encontrado. Se ignora.'
+                logging.info(msg)
+                print(msg)
+                continue
+            seen_bins.add(key)
+        yield cue_path
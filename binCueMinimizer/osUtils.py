@@ -30,12 +30,34 @@ import os
 import os.path as osp
 import subprocess
 import sys
-from subprocess import call
+import threading
+import time
+import zlib
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 from ntpath import basename
 from shutil import copy, rmtree
 from pathlib import Path
+from fnmatch import fnmatch, fnmatchcase
 
-def run(command, replacements = None):
+# Tamao del buffer para las copias que no puede hacer el kernel
+COPY_BUFFER_SIZE = 4 * 1024 * 1024
+# Cada cunto se consulta si un proceso vigilado debe detenerse, y cada cunto se mira si ha terminado, en segundos
+WATCH_INTERVAL = 0.5
+POLL_INTERVAL = 0.02
+
+# Formas de colocar un fichero en otro directorio, de ms barata a ms cara
+PLACE_HARDLINK = 'hardlink'
+PLACE_REFLINK = 'reflink'
+PLACE_SYMLINK = 'symlink'
+PLACE_COPY = 'copy'
+PLACE_STRATEGIES = [PLACE_HARDLINK, PLACE_REFLINK, PLACE_SYMLINK, PLACE_COPY]
+# ioctl FICLONE de Linux: _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+def run(command, replacements = None, usage = None, watch = None):
     """
     Lanza el comando suministrado, realizando sustituciones si se especifican.
 
@@ -45,6 +67,10 @@ def run(command, replacements = None):
         El comando con sus diferentes argumentos
     replacements : dictionary { str : str }
         Los reemplazos a realizar, siendo la clave el valor a sustituir y el valor la sustitucin en s
+    usage : object
+        Si se indica, se le suman con add_usage los recursos consumidos por el proceso (p.ej. un StageEvent)
+    watch : function
+        Si se indica, se llama peridicamente mientras el proceso est en marcha; si devuelve True, se detiene el proceso
     
     Returns
     -------
@@ -53,15 +79,160 @@ def run(command, replacements = None):
 
     """
     
-    if replacements:
-        for replacement in replacements:
-            command = [replacements[replacement] if x == replacement else x for x in command]
+    command = replace_arguments(command, replacements)
     logging.debug('Running ' + ' '.join(command))
     if not type(command) == list:
         raise TypeError(sys._getframe().f_code.co_name + ' must be called with an %r' % 'list of str')
-    result = call(command, stdout=subprocess.PIPE, shell=False)
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, shell=False)
+    result = wait_process(process, usage, watch)
     return result
 
+def has_finished(process):
+    """
+    Determina si un proceso ha terminado sin recogerlo, para que despus se puedan leer sus recursos con os.wait4
+
+    """
+
+    if hasattr(os, 'waitid'):
+        return os.waitid(os.P_PID, process.pid, os.WEXITED | os.WNOHANG | os.WNOWAIT) is not None
+    return process.poll() is not None
+
+def wait_process(process, usage = None, watch = None):
+    """
+    Espera a que termine un proceso. Donde existe os.wait4 se recogen adems los recursos que ha consumido
+
+    Parameters
+    ----------
+    process : subprocess.Popen
+        El proceso
+    usage : object
+        Si se indica, se le suman con add_usage los recursos consumidos por el proceso
+    watch : function
+        Si se indica, se llama cada WATCH_INTERVAL segundos mientras el proceso est en marcha; si devuelve True, se mata el proceso
+
+    Returns
+    -------
+    int
+        El cdigo de retorno, negativo si el proceso termin por una seal
+
+    """
+
+    if watch is not None:
+        next_watch = time.monotonic() + WATCH_INTERVAL
+        while not has_finished(process):
+            if time.monotonic() >= next_watch:
+                if watch():
+                    logging.info('Deteniendo ' + str(process.args[0]))
+                    process.kill()
+                    break
+                next_watch += WATCH_INTERVAL
+            time.sleep(POLL_INTERVAL)
+    if usage is None or not hasattr(os, 'wait4'):
+        return process.wait()
+    try:
+        pid, status, rusage = os.wait4(process.pid, 0)
+    except ChildProcessError:
+        # Ya lo ha recogido otro
+        return process.wait()
+    if os.WIFSIGNALED(status):
+        process.returncode = -os.WTERMSIG(status)
+    else:
+        process.returncode = os.WEXITSTATUS(status)
+    usage.add_usage(rusage)
+    return process.returncode
+
+def replace_arguments(command, replacements = None):
+    """
+    Realiza las sustituciones indicadas en los argumentos del comando
+
+    Parameters
+    ----------
+    commmand : list
+        El comando con sus diferentes argumentos
+    replacements : dictionary { str : str }
+        Los reemplazos a realizar, siendo la clave el valor a sustituir y el valor la sustitucin en s
+
+    Returns
+    -------
+    list
+        El comando con las sustituciones aplicadas
+
+    """
+
+    if replacements:
+        for replacement in replacements:
+            command = [replacements[replacement] if x == replacement else x for x in command]
+    return command
+
+def feed_stdin(stream, data):
+    """
+    Escribe los datos en la entrada estndar de un proceso y la cierra
+
+    """
+
+    try:
+        stream.write(data)
+    except BrokenPipeError:
+        logging.debug('El proceso cerr su entrada antes de leer todos los datos')
+    finally:
+        try:
+            stream.close()
+        except BrokenPipeError:
+            pass
+
+def run_pipeline(commands, replacements = None, input_data = None, usage = None):
+    """
+    Lanza los comandos suministrados encadenando la salida estndar de cada uno con la entrada
+    estndar del siguiente, como hara una tubera de la consola.
+
+    Parameters
+    ----------
+    commands : list [list]
+        Los comandos, en orden, con sus diferentes argumentos
+    replacements : list [dictionary { str : str }]
+        Los reemplazos a realizar en cada comando, en el mismo orden que los comandos
+    input_data : bytes-like
+        Si se indica, datos a enviar por la entrada estndar del primer comando
+    usage : object
+        Si se indica, se le suman con add_usage los recursos consumidos por cada proceso
+
+    Returns
+    -------
+    int
+        El primer cdigo de retorno distinto de 0, o 0 si todos los comandos terminaron bien
+
+    """
+
+    if not type(commands) == list or not all(type(command) == list for command in commands):
+        raise TypeError(sys._getframe().f_code.co_name + ' must be called with an %r' % 'list of list of str')
+    if replacements is None:
+        replacements = [None] * len(commands)
+    processes = []
+    for position, command in enumerate(commands):
+        command = replace_arguments(command, replacements[position])
+        logging.debug('Running ' + ' '.join(command) + (' |' if position < len(commands) - 1 else ''))
+        if processes:
+            stdin = processes[-1].stdout
+        else:
+            stdin = subprocess.PIPE if input_data is not None else None
+        stdout = subprocess.PIPE if position < len(commands) - 1 else subprocess.DEVNULL
+        process = subprocess.Popen(command, stdin=stdin, stdout=stdout, shell=False)
+        if processes:
+            # Se cierra nuestra copia para que el proceso anterior reciba SIGPIPE si el siguiente termina antes
+            processes[-1].stdout.close()
+        processes.append(process)
+    feeder = None
+    if input_data is not None:
+        feeder = threading.Thread(target=feed_stdin, args=(processes[0].stdin, input_data))
+        feeder.start()
+    results = [wait_process(process, usage) for process in processes]
+    if feeder:
+        feeder.join()
+    for result in results:
+        if result != 0:
+            return result
+    return 0
+
 def create_dir(path = None):
     """
     Crea un directorio de trabajo
@@ -123,6 +294,190 @@ def copy_files_to(path, files):
         for file in files:
             copy(file, path)
 
+def copy_data(source_fd, target_fd, offset, count):
+    """
+    Copia un rango de bytes de un fichero a otro. Se intenta que la copia la haga el kernel sin pasar
+    por Python (copy_file_range y despus sendfile), y si no se puede se copia con un buffer grande.
+
+    Parameters
+    ----------
+    source_fd : int
+        El descriptor del fichero origen
+    target_fd : int
+        El descriptor del fichero destino. Se escribe en su posicin actual
+    offset : int
+        La posicin del fichero origen desde la que copiar
+    count : int
+        El nmero de bytes a copiar
+
+    Returns
+    -------
+    int
+        El nmero de bytes copiados
+
+    """
+
+    remaining = count
+    if remaining > 0 and hasattr(os, 'copy_file_range'):
+        try:
+            while remaining > 0:
+                copied = os.copy_file_range(source_fd, target_fd, remaining, offset)
+                if copied == 0:
+                    break
+                offset += copied
+                remaining -= copied
+        except OSError as e:
+            logging.debug('copy_file_range no disponible (' + str(e) + '), probando sendfile')
+    if remaining > 0 and hasattr(os, 'sendfile'):
+        try:
+            while remaining > 0:
+                copied = os.sendfile(target_fd, source_fd, offset, remaining)
+                if copied == 0:
+                    break
+                offset += copied
+                remaining -= copied
+        except OSError as e:
+            logging.debug('sendfile no disponible (' + str(e) + '), copiando con buffer')
+    if remaining > 0:
+        os.lseek(source_fd, offset, os.SEEK_SET)
+        while remaining > 0:
+            chunk = os.read(source_fd, min(remaining, COPY_BUFFER_SIZE))
+            if not chunk:
+                break
+            os.write(target_fd, chunk)
+            remaining -= len(chunk)
+    return count - remaining
+
+def copy_data_with_checksum(source_fd, target_fd, offset, count):
+    """
+    Copia un rango de bytes de un fichero a otro calculando a la vez su CRC32. Al tener que ver los datos
+    no se puede delegar en el kernel, pero se hace en una sola pasada con un buffer grande.
+
+    Parameters
+    ----------
+    source_fd : int
+        El descriptor del fichero origen
+    target_fd : int
+        El descriptor del fichero destino. Se escribe en su posicin actual
+    offset : int
+        La posicin del fichero origen desde la que copiar
+    count : int
+        El nmero de bytes a copiar
+
+    Returns
+    -------
+    (int, int)
+        El nmero de bytes copiados y el CRC32 de los mismos
+
+    """
+
+    remaining = count
+    checksum = 0
+    os.lseek(source_fd, offset, os.SEEK_SET)
+    while remaining > 0:
+        chunk = os.read(source_fd, min(remaining, COPY_BUFFER_SIZE))
+        if not chunk:
+            break
+        checksum = zlib.crc32(chunk, checksum)
+        os.write(target_fd, chunk)
+        remaining -= len(chunk)
+    return count - remaining, checksum
+
+def reflink(source, target):
+    """
+    Clona un fichero compartiendo sus bloques en disco (btrfs, XFS...). Solo disponible en Linux.
+
+    Parameters
+    ----------
+    source : str
+        El fichero a clonar
+    target : str
+        El fichero a crear
+
+    """
+
+    if fcntl is None:
+        raise OSError('reflink no disponible en este sistema')
+    with open(source, 'rb') as source_file, open(target, 'wb') as target_file:
+        try:
+            fcntl.ioctl(target_file.fileno(), FICLONE, source_file.fileno())
+        except OSError:
+            target_file.close()
+            os.remove(target)
+            raise
+
+def place_file(source, path, strategies = None):
+    """
+    Coloca un fichero en el directorio indicado sin copiarlo si es posible: primero se intenta un
+    enlace duro, despus un reflink, despus un enlace simblico y, como ltimo recurso, una copia.
+    Quien use el fichero colocado no debe escribir sobre l, sino crear uno nuevo y renombrarlo encima.
+
+    Parameters
+    ----------
+    source : str
+        El fichero a colocar
+    path : str
+        El directorio en el que colocarlo
+    strategies : list [str]
+        Las formas de colocacin a probar, en orden. Por defecto, PLACE_STRATEGIES
+
+    Returns
+    -------
+    str
+        La forma de colocacin que se ha usado
+
+    """
+
+    if strategies is None:
+        strategies = PLACE_STRATEGIES
+    source = osp.abspath(source)
+    target = osp.join(path, basename(source))
+    for strategy in strategies:
+        try:
+            if strategy == PLACE_HARDLINK:
+                os.link(source, target)
+            elif strategy == PLACE_REFLINK:
+                reflink(source, target)
+            elif strategy == PLACE_SYMLINK:
+                os.symlink(source, target)
+            else:
+                copy(source, target)
+            logging.debug('Colocado ' + source + ' en ' + path + ' mediante ' + strategy)
+            return strategy
+        except OSError as e:
+            logging.debug('No se pudo colocar ' + source + ' mediante ' + strategy + ': ' + str(e))
+    raise OSError('No se pudo colocar ' + source + ' en ' + path)
+
+def move_file(source, path):
+    """
+    Mueve un fichero al directorio indicado. Si est en el mismo sistema de ficheros se renombra de forma
+    atmica; si no, se copia a un nombre temporal en el destino y despus se renombra, para que nunca
+    quede a medias un fichero con el nombre definitivo.
+
+    Parameters
+    ----------
+    source : str
+        El fichero a mover
+    path : str
+        El directorio destino
+
+    Returns
+    -------
+    str
+        La ruta final del fichero
+
+    """
+
+    target = osp.join(path, basename(source))
+    try:
+        os.replace(source, target)
+    except OSError:
+        temporary_target = target + '.part'
+        copy(source, temporary_target)
+        os.replace(temporary_target, target)
+        os.remove(source)
+    return target
+
 def delete_files(files):
     """
     Borra los ficheros especificados
@@ -132,30 +487,83 @@ def delete_files(files):
         for file in files:
             os.remove(file) 
 
-def list_files(path = None, extension = None):
+def scan_files(path = None, extension = None, include = None, exclude = None, recursive = True):
     """
-    Dada una ruta, obtiene los ficheros.cue
+    Dada una ruta, recorre sus ficheros con la extensin indicada, devolvindolos segn se encuentran.
+    Los directorios se recorren con os.scandir y una pila, sin construir nunca la lista completa.
+    Los enlaces a directorios se siguen, pero cada directorio se recorre una sola vez, aunque se llegue a l por
+    varios caminos o haya enlaces circulares.
 
     Parameters
     ----------
     path : str
-        El directorio a comprobar. Por defecto, el directorio de ejecucin
+        El directorio a recorrer. Por defecto, el directorio de ejecucin
+    extension : str
+        La extensin de los ficheros a devolver, sin el punto
+    include : list [str]
+        Patrones glob que deben cumplir los ficheros, comparados con su ruta relativa. Por defecto, todos
+    exclude : list [str]
+        Patrones glob de ficheros y directorios a ignorar, comparados con su nombre y con su ruta relativa.
+        Los que empiezan por / solo se comparan con la ruta relativa a la raz, distinguiendo maysculas
+    recursive : bool
+        Si se recorren tambin los subdirectorios
 
     Returns
     -------
-    list [str]
-        Las rutas de los ficheros cue
+    generator [str]
+        Las rutas absolutas de los ficheros
 
     """
-    
+
     if path is None:
         path = Path().absolute()
-    files_to_process = []
-    for filename in os.listdir(path):
-        filepath = os.path.join(path, filename)
-        if osp.isdir(filepath):
+    path = os.path.abspath(path)
+    include = include or []
+    exclude = exclude or []
+    suffix = None if extension is None else '.' + extension.casefold()
+
+    def matches(entry, patterns):
+        relative_path = osp.relpath(entry.path, path).replace(os.sep, '/')
+        for pattern in patterns:
+            if pattern.startswith('/'):
+                if fnmatchcase('/' + relative_path, pattern):
+                    return True
+            elif fnmatch(entry.name, pattern) or fnmatch(relative_path, pattern):
+                return True
+        return False
+
+    # Directorios ya recorridos, por dispositivo e inodo, para no entrar dos veces en el mismo a travs de enlaces
+    visited_dirs = set()
+    pending_dirs = [path]
+    while pending_dirs:
+        directory = pending_dirs.pop()
+        try:
+            dir_stat = os.stat(directory)
+            if (dir_stat.st_dev, dir_stat.st_ino) in visited_dirs:
+                logging.debug('Ya recorrido, se ignora ' + directory)
+                continue
+            visited_dirs.add((dir_stat.st_dev, dir_stat.st_ino))
+            with os.scandir(directory) as iterator:
+                entries = sorted(iterator, key=lambda entry: entry.name)
+        except OSError:
+            logging.exception('No se pudo recorrer ' + directory)
             continue
-        elif os.path.splitext(filename)[1].casefold() == '.' + extension.casefold():
-            logging.debug('Encontrado ' + extension + ': ' + filepath)
-            files_to_process.append(filepath)
-    return files_to_process
\ No newline at end of file
+        subdirs = []
+        for entry in entries:
+            if matches(entry, exclude):
+                continue
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                logging.exception('No se pudo comprobar ' + entry.path)
+                continue
+            if is_dir:
+                if recursive:
+                    subdirs.append(entry.path)
+            elif suffix is None or os.path.splitext(entry.name)[1].casefold() == suffix:
+                if include and not matches(entry, include):
+                    continue
+                logging.debug('Encontrado ' + str(extension) + ': ' + entry.path)
+                yield entry.path
+        # Se apilan al revs para recorrerlos en orden alfabtico
+        pending_dirs.extend(reversed(subdirs))
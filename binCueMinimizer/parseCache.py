@@ -0,0 +1,147 @@
+# coding=cp1252
+#
+# parseCache.py
+#
+# Creative Commons Attribution-NonCommercial-ShareAlike 4.0 International (CC BY-NC-SA 4.0) 2019 granmacco <@granmacco>
+# https://github.com/granmacco
+#
+# Script inspired by @krcroft's reddit post on June 25th, 2019
+# https://www.reddit.com/r/RetroPie/comments/c50djy/chd_compression_summary_for_psx/
+# https://github.com/krcroft
+# Thank you very much, without you, this automation wouldn't have existed!
+#
+# Also, special thanks to the Plata o Roms team for finding @krcroft's post, 
+# putting me on the right track and inspiring some of the features of this script.
+# http://t.me/RaspberryPiEmuladores
+# Thank you very much for sharing your knowledge and for striving for excellence!
+#
+# Lastly, but not least, a very special thanks to @Sergi_0, for providing new ideas and methodologies to this script.
+# https://github.com/Sergi_0
+# Thank you very much for your kindness and time!!
+#
+# This code is licensed under Creative Commons BY-NC-SA 4.0
+# You may redistribute it and/or modify it under the terms of the 
+# Creative Commons BY-NC-SA 4.0 License, as published by the Creative
+# Commons on their website http://creativecommons.org/licenses/by-nc-sa/4.0/
+#
+
+
+import json
+import logging
+import os
+import threading
+
+PARSE_CACHE_VERSION = 1
+
+class ParseCache:
+    """
+    Cach persistente del contenido ya tokenizado de los cues, indexada por su ruta y vlida mientras
+    no cambien su fecha de modificacin ni su tamao. Se carga entera en memoria la primera vez que se usa,
+    de forma que volver a recorrer una biblioteca solo cuesta un stat por cue.
+
+    """
+
+    path = None
+    entries = None
+    modified = False
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def load(self):
+        """
+        Carga la cach del disco, si no se ha cargado ya. Si no existe o no se puede leer se empieza una vaca
+
+        """
+
+        if self.entries is not None:
+            return
+        self.entries = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                contents = json.load(file)
+            if contents.get('version') == PARSE_CACHE_VERSION:
+                self.entries = contents.get('entries', {})
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError):
+            logging.exception('No se pudo leer la cach de cues ' + self.path + ', se empieza una nueva')
+
+    def get_stamp(self, path):
+        stat = os.stat(path)
+        return [stat.st_mtime_ns, stat.st_size]
+
+    def get(self, path):
+        """
+        Devuelve el contenido tokenizado de un cue si est en la cach y el cue no ha cambiado
+
+        Parameters
+        ----------
+        path : str
+            La ruta del cue
+
+        Returns
+        -------
+        list [list [str]]
+            Los registros del cue, o None si no est o ha cambiado
+
+        """
+
+        with self.lock:
+            self.load()
+            entry = self.entries.get(os.path.abspath(path))
+        if entry is None:
+            return None
+        try:
+            if entry['stamp'] != self.get_stamp(path):
+                return None
+        except OSError:
+            return None
+        return entry['records']
+
+    def put(self, path, records):
+        """
+        Guarda el contenido tokenizado de un cue
+
+        Parameters
+        ----------
+        path : str
+            La ruta del cue
+        records : list [list [str]]
+            Los registros del cue
+
+        """
+
+        try:
+            stamp = self.get_stamp(path)
+        except OSError:
+            return
+        with self.lock:
+            self.load()
+            self.entries[os.path.abspath(path)] = {'stamp': stamp, 'records': records}
+            self.modified = True
+
+    def save(self):
+        """
+        Guarda la cach en el disco de forma atmica, si ha cambiado
+
+        """
+
+        with self.lock:
+            if not self.modified:
+                return
+            temporary_path = self.path + '.' + str(os.getpid()) + '.part'
+            with open(temporary_path, 'w', encoding='utf-8') as file:
+                json.dump({'version': PARSE_CACHE_VERSION, 'entries': self.entries}, file, separators=(',', ':'))
+            os.replace(temporary_path, self.path)
+            self.modified = False
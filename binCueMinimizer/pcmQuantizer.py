@@ -0,0 +1,89 @@
+# coding=cp1252
+#
+# pcmQuantizer.py
+#
+# Creative Commons Attribution-NonCommercial-ShareAlike 4.0 International (CC BY-NC-SA 4.0) 2019 granmacco <@granmacco>
+# https://github.com/granmacco
+#
+# Script inspired by @krcroft's reddit post on June 25th, 2019
+# https://www.reddit.com/r/RetroPie/comments/c50djy/chd_compression_summary_for_psx/
+# https://github.com/krcroft
+# Thank you very much, without you, this automation wouldn't have existed!
+#
+# Also, special thanks to the Plata o Roms team for finding @krcroft's post, 
+# putting me on the right track and inspiring some of the features of this script.
+# http://t.me/RaspberryPiEmuladores
+# Thank you very much for sharing your knowledge and for striving for excellence!
+#
+# Lastly, but not least, a very special thanks to @Sergi_0, for providing new ideas and methodologies to this script.
+# https://github.com/Sergi_0
+# Thank you very much for your kindness and time!!
+#
+# This code is licensed under Creative Commons BY-NC-SA 4.0
+# You may redistribute it and/or modify it under the terms of the 
+# Creative Commons BY-NC-SA 4.0 License, as published by the Creative
+# Commons on their website http://creativecommons.org/licenses/by-nc-sa/4.0/
+#
+
+
+import logging
+import os
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Muestras de 16 bits por bloque: 8 MB de audio
+BLOCK_SAMPLES = 4 * 1024 * 1024
+# Un frame de audio de CD son dos muestras de 16 bits (estreo)
+FRAME_BYTES = 4
+# Cuantizar a 8 bits sin signo y volver a 16 bits con signo, como hace ffmpeg (sin dither), equivale a poner a 0 el byte bajo
+U8_MASK = 0xFF00
+
+def is_available():
+    """
+    Determina si se puede cuantizar en el propio proceso
+
+    Returns
+    -------
+    bool
+        True si numpy est instalado
+
+    """
+
+    return numpy is not None
+
+def quantize_to_u8(source, target, block_samples = BLOCK_SAMPLES):
+    """
+    Recuantiza un bin de audio s16le a la resolucin de pcm_u8, dejndolo de nuevo en s16le.
+    El resultado es idntico bit a bit al de pasar por ffmpeg a pcm_u8 y volver a s16le.
+
+    Parameters
+    ----------
+    source : str o memoryview
+        El bin de origen, o directamente los datos de la pista
+    target : str
+        El bin a crear. Debe ser distinto del origen
+    block_samples : int
+        El nmero de muestras a procesar en cada bloque
+
+    """
+
+    if not is_available():
+        raise RuntimeError('numpy no est instalado')
+    is_path = isinstance(source, str)
+    # ffmpeg descarta el ltimo frame si est incompleto
+    data_size = (os.path.getsize(source) if is_path else source.nbytes) // FRAME_BYTES * FRAME_BYTES
+    logging.debug('Cuantizando ' + (source if is_path else 'pista') + ' a u8')
+    with open(target, 'wb') as target_file:
+        if data_size == 0:
+            return
+        if is_path:
+            samples = numpy.memmap(source, dtype='<u2', mode='r', shape=(data_size // 2,))
+        else:
+            samples = numpy.frombuffer(source, dtype='<u2', count=data_size // 2)
+        try:
+            for start in range(0, len(samples), block_samples):
+                numpy.bitwise_and(samples[start:start + block_samples], U8_MASK).astype('<u2', copy=False).tofile(target_file)
+        finally:
+            del samples
@@ -0,0 +1,174 @@
+# coding=cp1252
+#
+# silenceDetector.py
+#
+# Creative Commons Attribution-NonCommercial-ShareAlike 4.0 International (CC BY-NC-SA 4.0) 2019 granmacco <@granmacco>
+# https://github.com/granmacco
+#
+# Script inspired by @krcroft's reddit post on June 25th, 2019
+# https://www.reddit.com/r/RetroPie/comments/c50djy/chd_compression_summary_for_psx/
+# https://github.com/krcroft
+# Thank you very much, without you, this automation wouldn't have existed!
+#
+# Also, special thanks to the Plata o Roms team for finding @krcroft's post, 
+# putting me on the right track and inspiring some of the features of this script.
+# http://t.me/RaspberryPiEmuladores
+# Thank you very much for sharing your knowledge and for striving for excellence!
+#
+# Lastly, but not least, a very special thanks to @Sergi_0, for providing new ideas and methodologies to this script.
+# https://github.com/Sergi_0
+# Thank you very much for your kindness and time!!
+#
+# This code is licensed under Creative Commons BY-NC-SA 4.0
+# You may redistribute it and/or modify it under the terms of the 
+# Creative Commons BY-NC-SA 4.0 License, as published by the Creative
+# Commons on their website http://creativecommons.org/licenses/by-nc-sa/4.0/
+#
+
+
+import logging
+import os
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Muestras de 16 bits por bloque: 2 MB de audio, unos 12 segundos
+BLOCK_SAMPLES = 1024 * 1024
+# Muestras por segundo de audio de CD (44.1 kHz estreo)
+SAMPLES_PER_SECOND = 2 * 44100
+# Por debajo de este pico (unos -60 dBFS) y de este RMS (unos -78 dBFS) la pista se considera casi silencio
+NEAR_SILENCE_PEAK = 32
+NEAR_SILENCE_RMS = 4.0
+
+class AudioLevels:
+    """
+    Niveles de una pista de audio s16le: pico, RMS y ceros. Si el anlisis se cort al superar el pico
+    indicado, solo el pico es fiable y el resto corresponde a la parte analizada.
+
+    """
+
+    samples = 0
+    peak = 0
+    rms = 0.0
+    zero_samples = 0
+    longest_zero_run = 0
+    complete = True
+
+    def is_digital_silence(self):
+        """
+        Determina si la pista es silencio digital, todo ceros
+
+        Returns
+        -------
+        bool
+            True si todas las muestras son 0
+
+        """
+
+        return self.complete and self.peak == 0
+
+    def is_silent(self):
+        """
+        Determina si la pista es silencio o casi silencio
+
+        Returns
+        -------
+        bool
+            True si el pico y el RMS estn por debajo de los umbrales de casi silencio
+
+        """
+
+        return self.complete and self.peak <= NEAR_SILENCE_PEAK and self.rms <= NEAR_SILENCE_RMS
+
+    def __str__(self):
+        if not self.complete:
+            return 'pico > ' + str(NEAR_SILENCE_PEAK)
+        return 'pico ' + str(self.peak) + ', RMS ' + format(self.rms, '.2f') + ', ceros ' + format(self.zero_samples * 100 / max(self.samples, 1), '.1f') + \
+               '%, mayor racha de ceros ' + format(self.longest_zero_run / SAMPLES_PER_SECOND, '.2f') + ' s'
+
+def is_available():
+    """
+    Determina si se puede analizar el audio en el propio proceso
+
+    Returns
+    -------
+    bool
+        True si numpy est instalado
+
+    """
+
+    return numpy is not None
+
+def analyze(source, peak_limit = NEAR_SILENCE_PEAK, block_samples = BLOCK_SAMPLES):
+    """
+    Mide el pico, el RMS y las rachas de ceros de un bin de audio s16le, por bloques.
+    En cuanto el pico supera el lmite se deja de leer: la pista ya no puede ser silencio.
+
+    Parameters
+    ----------
+    source : str o memoryview
+        El bin de audio, o directamente los datos de la pista
+    peak_limit : int
+        El pico a partir del cual se corta el anlisis. Con None se analiza la pista entera
+    block_samples : int
+        El nmero de muestras a procesar en cada bloque
+
+    Returns
+    -------
+    AudioLevels
+        Los niveles de la pista
+
+    """
+
+    if not is_available():
+        raise RuntimeError('numpy no est instalado')
+    is_path = isinstance(source, str)
+    data_size = (os.path.getsize(source) if is_path else source.nbytes) // 2 * 2
+    logging.debug('Analizando el nivel de ' + (source if is_path else 'pista'))
+    levels = AudioLevels()
+    if data_size == 0:
+        return levels
+    if is_path:
+        samples = numpy.memmap(source, dtype='<i2', mode='r', shape=(data_size // 2,))
+    else:
+        samples = numpy.frombuffer(source, dtype='<i2', count=data_size // 2)
+    try:
+        squares = 0.0
+        # Racha de ceros que llega hasta el final del bloque anterior
+        current_run = 0
+        for start in range(0, len(samples), block_samples):
+            block = samples[start:start + block_samples]
+            # Con int16, abs(-32768) desborda, as que se toman mximo y mnimo por separado
+            levels.peak = max(levels.peak, int(block.max()), -int(block.min()))
+            if peak_limit is not None and levels.peak > peak_limit:
+                levels.complete = False
+                break
+            levels.samples += len(block)
+            values = block.astype(numpy.float64)
+            squares += float(numpy.dot(values, values))
+            zeros = block == 0
+            block_zeros = int(numpy.count_nonzero(zeros))
+            levels.zero_samples += block_zeros
+            if block_zeros == len(block):
+                current_run += len(block)
+                continue
+            if block_zeros:
+                # Los cambios de cero a no cero delimitan las rachas: [inicio, fin) por parejas
+                edges = numpy.flatnonzero(numpy.diff(numpy.concatenate(([False], zeros, [False])).view(numpy.int8)))
+                runs = edges[1::2] - edges[::2]
+                if edges[0] == 0:
+                    runs[0] += current_run
+                else:
+                    levels.longest_zero_run = max(levels.longest_zero_run, current_run)
+                levels.longest_zero_run = max(levels.longest_zero_run, int(runs.max()))
+                current_run = int(runs[-1]) if edges[-1] == len(block) else 0
+            else:
+                levels.longest_zero_run = max(levels.longest_zero_run, current_run)
+                current_run = 0
+        levels.longest_zero_run = max(levels.longest_zero_run, current_run)
+        if levels.samples:
+            levels.rms = (squares / levels.samples) ** 0.5
+    finally:
+        del samples
+    return levels
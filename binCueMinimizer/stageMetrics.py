@@ -0,0 +1,356 @@
+# coding=cp1252
+#
+# stageMetrics.py
+#
+# Creative Commons Attribution-NonCommercial-ShareAlike 4.0 International (CC BY-NC-SA 4.0) 2019 granmacco <@granmacco>
+# https://github.com/granmacco
+#
+# Script inspired by @krcroft's reddit post on June 25th, 2019
+# https://www.reddit.com/r/RetroPie/comments/c50djy/chd_compression_summary_for_psx/
+# https://github.com/krcroft
+# Thank you very much, without you, this automation wouldn't have existed!
+#
+# Also, special thanks to the Plata o Roms team for finding @krcroft's post, 
+# putting me on the right track and inspiring some of the features of this script.
+# http://t.me/RaspberryPiEmuladores
+# Thank you very much for sharing your knowledge and for striving for excellence!
+#
+# Lastly, but not least, a very special thanks to @Sergi_0, for providing new ideas and methodologies to this script.
+# https://github.com/Sergi_0
+# Thank you very much for your kindness and time!!
+#
+# This code is licensed under Creative Commons BY-NC-SA 4.0
+# You may redistribute it and/or modify it under the terms of the 
+# Creative Commons BY-NC-SA 4.0 License, as published by the Creative
+# Commons on their website http://creativecommons.org/licenses/by-nc-sa/4.0/
+#
+
+
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+STAGE_COPY          = 'copy'
+STAGE_SPLIT         = 'split'
+STAGE_SILENCE       = 'silence'
+STAGE_PREDICT       = 'predict'
+STAGE_BIN_TO_WAV    = 'bin_to_wav'
+STAGE_LOSSYWAV      = 'lossywav'
+STAGE_COMPLIANCE    = 'compliance'
+STAGE_WAV_TO_BIN    = 'wav_to_bin'
+STAGE_U8            = 'u8'
+STAGE_STREAM        = 'stream'
+STAGE_TUNE          = 'tune'
+STAGE_CHDMAN        = 'chdman'
+
+# Estado de las etapas que terminan con una excepcin en lugar de con un cdigo de salida
+STATUS_ERROR = 'error'
+# Estado de las etapas detenidas a propsito antes de terminar, que no cuentan como fallidas
+STATUS_ABORTED = 'aborted'
+
+class StageEvent:
+    """
+    Una ejecucin de una etapa: qu se hizo, sobre qu disco, cunto tard, cuntos bytes movi y cmo termin.
+    De las etapas que lanzan procesos se guardan tambin los recursos que consumieron: tiempo de CPU de usuario
+    y de sistema, memoria mxima y bloques ledos y escritos. Las etapas nativas solo miden el tiempo real.
+
+    """
+
+    batch = None
+    disc = None
+    stage = None
+    target = None
+    start = None
+    seconds = None
+    input_bytes = 0
+    output_bytes = 0
+    status = 0
+    processes = 0
+    user_seconds = 0.0
+    system_seconds = 0.0
+    max_rss_kb = 0
+    blocks_in = 0
+    blocks_out = 0
+
+    def __init__(self, stage, batch = None, disc = None, target = None):
+        self.stage = stage
+        self.batch = batch
+        self.disc = disc
+        self.target = target
+
+    def add_usage(self, rusage):
+        """
+        Suma los recursos consumidos por un proceso hijo, tal como los devuelve os.wait4
+
+        """
+
+        self.processes += 1
+        self.user_seconds += rusage.ru_utime
+        self.system_seconds += rusage.ru_stime
+        # En macOS ru_maxrss va en bytes y en el resto de sistemas en KB
+        max_rss_kb = rusage.ru_maxrss // 1024 if sys.platform == 'darwin' else rusage.ru_maxrss
+        self.max_rss_kb = max(self.max_rss_kb, max_rss_kb)
+        self.blocks_in += rusage.ru_inblock
+        self.blocks_out += rusage.ru_oublock
+
+    def get_mb_per_second(self):
+        """
+        Devuelve el rendimiento de la etapa en MB/s, medido sobre los bytes de entrada
+
+        """
+
+        if not self.seconds:
+            return None
+        return self.input_bytes / (1024 * 1024) / self.seconds
+
+    def to_dict(self):
+        return {'batch': self.batch, 'disc': self.disc, 'stage': self.stage, 'target': self.target, 'pid': os.getpid(),
+                'start': self.start, 'seconds': self.seconds, 'input_bytes': self.input_bytes, 'output_bytes': self.output_bytes,
+                'mb_per_s': self.get_mb_per_second(), 'status': self.status, 'processes': self.processes,
+                'user_seconds': self.user_seconds, 'system_seconds': self.system_seconds, 'max_rss_kb': self.max_rss_kb,
+                'blocks_in': self.blocks_in, 'blocks_out': self.blocks_out}
+
+def get_size(files):
+    """
+    Suma el tamao de los ficheros indicados. Los que no existen cuentan como 0
+
+    Parameters
+    ----------
+    files : str, list [str] o int
+        Los ficheros, o directamente el nmero de bytes
+
+    Returns
+    -------
+    int
+        El nmero de bytes
+
+    """
+
+    if files is None:
+        return 0
+    if isinstance(files, int):
+        return files
+    if not isinstance(files, (list, tuple)):
+        files = [files]
+    size = 0
+    for file in files:
+        try:
+            size += os.path.getsize(file)
+        except OSError:
+            pass
+    return size
+
+class MetricsRecorder:
+    """
+    Registra las etapas ejecutadas como eventos en un fichero JSON lines, una lnea por evento.
+    Varios procesos pueden escribir en el mismo fichero, ya que cada evento se aade con una sola escritura.
+    Sin fichero no se mide nada.
+
+    """
+
+    path = None
+    batch = None
+    disc = None
+    events = None
+
+    def __init__(self, path = None, batch = None, disc = None):
+        self.path = None if path is None else os.path.abspath(path)
+        if batch is None and path is not None:
+            batch = uuid.uuid4().hex
+        self.batch = batch
+        self.disc = disc
+        self.events = []
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def is_enabled(self):
+        return self.path is not None
+
+    def for_disc(self, disc):
+        """
+        Devuelve un registrador del mismo lote para un disco, con su propia lista de eventos
+
+        Parameters
+        ----------
+        disc : str
+            La ruta del cue del disco
+
+        Returns
+        -------
+        MetricsRecorder
+            El registrador del disco
+
+        """
+
+        return MetricsRecorder(self.path, batch=self.batch, disc=disc)
+
+    @contextmanager
+    def measure(self, stage, inputs = None, outputs = None):
+        """
+        Mide una etapa. El cdigo de salida se puede asignar al estado del evento devuelto;
+        si la etapa lanza una excepcin, se registra con estado de error.
+
+        Parameters
+        ----------
+        stage : str
+            La etapa (STAGE_*)
+        inputs : str, list [str] o int
+            Los ficheros de entrada, o el nmero de bytes de entrada
+        outputs : str, list [str] o int
+            Los ficheros de salida, o el nmero de bytes de salida. Se miden al terminar la etapa
+
+        """
+
+        event = StageEvent(stage, batch=self.batch, disc=self.disc)
+        if not self.is_enabled():
+            yield event
+            return
+        if outputs is not None and not isinstance(outputs, int):
+            event.target = outputs if isinstance(outputs, str) else ', '.join(outputs)
+        event.input_bytes = get_size(inputs)
+        event.start = time.time()
+        start = time.perf_counter()
+        try:
+            yield event
+        except BaseException:
+            event.status = STATUS_ERROR
+            raise
+        finally:
+            event.seconds = time.perf_counter() - start
+            if outputs is not None:
+                event.output_bytes = get_size(outputs)
+            self.record(event)
+
+    def record(self, event):
+        """
+        Guarda un evento en el fichero y en la lista de eventos del registrador
+
+        """
+
+        line = (json.dumps(event.to_dict(), sort_keys=True) + '\n').encode('utf-8')
+        with self.lock:
+            self.events.append(event.to_dict())
+            descriptor = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(descriptor, line)
+            finally:
+                os.close(descriptor)
+
+    def read_events(self, batch = None):
+        """
+        Lee los eventos del fichero
+
+        Parameters
+        ----------
+        batch : str
+            Si se indica, solo se devuelven los eventos de ese lote
+
+        Returns
+        -------
+        generator [dict]
+            Los eventos
+
+        """
+
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                for line in file:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        continue
+                    if batch is None or event.get('batch') == batch:
+                        yield event
+        except FileNotFoundError:
+            return
+
+def summarize(events):
+    """
+    Agrupa los eventos por etapa
+
+    Parameters
+    ----------
+    events : iterable [dict]
+        Los eventos
+
+    Returns
+    -------
+    dict { str : dict }
+        Para cada etapa, el nmero de ejecuciones, las fallidas, los segundos y bytes totales, los MB/s,
+        el tiempo de CPU de sus procesos, la proporcin de CPU sobre el tiempo real, su memoria mxima
+        y los bloques ledos y escritos
+
+    """
+
+    summary = {}
+    for event in events:
+        stage = summary.setdefault(event['stage'], {'count': 0, 'failures': 0, 'seconds': 0.0, 'input_bytes': 0, 'output_bytes': 0,
+                                                    'processes': 0, 'user_seconds': 0.0, 'system_seconds': 0.0, 'max_rss_kb': 0,
+                                                    'blocks_in': 0, 'blocks_out': 0})
+        stage['count'] += 1
+        if event['status'] not in (0, STATUS_ABORTED):
+            stage['failures'] += 1
+        stage['seconds'] += event['seconds'] or 0.0
+        stage['input_bytes'] += event['input_bytes']
+        stage['output_bytes'] += event['output_bytes']
+        # Los eventos anteriores a la medicin de recursos no tienen estos campos
+        stage['processes'] += event.get('processes', 0)
+        stage['user_seconds'] += event.get('user_seconds', 0.0)
+        stage['system_seconds'] += event.get('system_seconds', 0.0)
+        stage['max_rss_kb'] = max(stage['max_rss_kb'], event.get('max_rss_kb', 0))
+        stage['blocks_in'] += event.get('blocks_in', 0)
+        stage['blocks_out'] += event.get('blocks_out', 0)
+    for stage in summary.values():
+        stage['mb_per_s'] = stage['input_bytes'] / (1024 * 1024) / stage['seconds'] if stage['seconds'] else None
+        # Cerca de 1 (o de ms con varios hilos) la etapa est limitada por la CPU; muy por debajo, por la E/S
+        stage['cpu_ratio'] = (stage['user_seconds'] + stage['system_seconds']) / stage['seconds'] if stage['processes'] and stage['seconds'] else None
+    return summary
+
+def format_summary(summary, title):
+    """
+    Da formato de tabla al resumen de las etapas, de la ms lenta a la ms rpida en tiempo total
+
+    Parameters
+    ----------
+    summary : dict { str : dict }
+        El resumen, tal como lo devuelve summarize
+    title : str
+        El ttulo de la tabla
+
+    Returns
+    -------
+    str
+        La tabla
+
+    """
+
+    msg = title
+    total = {'count': 0, 'failures': 0, 'seconds': 0.0, 'input_bytes': 0, 'output_bytes': 0, 'processes': 0,
+             'user_seconds': 0.0, 'system_seconds': 0.0, 'max_rss_kb': 0, 'blocks_in': 0, 'blocks_out': 0}
+    for stage in summary.values():
+        for key in total:
+            total[key] = max(total[key], stage[key]) if key == 'max_rss_kb' else total[key] + stage[key]
+    total['mb_per_s'] = None
+    total['cpu_ratio'] = (total['user_seconds'] + total['system_seconds']) / total['seconds'] if total['processes'] and total['seconds'] else None
+    msg += '\n' + '\t' + 'Etapa'.ljust(12) + 'Veces'.rjust(7) + 'Fallos'.rjust(8) + 'Segundos'.rjust(11) + 'MB entrada'.rjust(12) + 'MB salida'.rjust(11) + 'MB/s'.rjust(9)
+    msg += 'CPU usr'.rjust(10) + 'CPU sys'.rjust(10) + 'CPU/real'.rjust(10) + 'RSS MB'.rjust(9) + 'Bloq. ledos'.rjust(14) + 'Bloq. escritos'.rjust(16)
+    for name, stage in sorted(summary.items(), key=lambda item: item[1]['seconds'], reverse=True) + [('TOTAL', total)]:
+        mb_per_s = '-' if stage['mb_per_s'] is None else '%.1f' % stage['mb_per_s']
+        msg += '\n' + '\t' + name.ljust(12) + str(stage['count']).rjust(7) + str(stage['failures']).rjust(8) + ('%.2f' % stage['seconds']).rjust(11)
+        msg += ('%.1f' % (stage['input_bytes'] / (1024 * 1024))).rjust(12) + ('%.1f' % (stage['output_bytes'] / (1024 * 1024))).rjust(11) + mb_per_s.rjust(9)
+        if stage['processes']:
+            msg += ('%.2f' % stage['user_seconds']).rjust(10) + ('%.2f' % stage['system_seconds']).rjust(10) + ('%.2f' % stage['cpu_ratio']).rjust(10)
+            msg += ('%.1f' % (stage['max_rss_kb'] / 1024)).rjust(9) + str(stage['blocks_in']).rjust(14) + str(stage['blocks_out']).rjust(16)
+    return msg
@@ -28,32 +28,87 @@
 import re
 from binCueMinimizer.consts import frames_por_segundo, segundos_por_minuto
 
+# timestamp = min:sec:frames
+regex_timestamp = r'(\d+):(\d+):(\d+)'
+compiled_regex_timestamp = re.compile(regex_timestamp)
+
+def parse_frames(string):
+    """
+    Convierte un timestamp en formato MM:SS:FF a su nmero total de frames
+
+    Parameters
+    ----------
+    string : str
+        El timestamp
+
+    Returns
+    -------
+    int
+        El nmero de frames
+
+    """
+
+    parts = string.strip().split(':')
+    if len(parts) == 3 and all(part.isdigit() for part in parts):
+        # Caso habitual, sin expresiones regulares
+        return (int(parts[0]) * segundos_por_minuto + int(parts[1])) * frames_por_segundo + int(parts[2])
+    results = compiled_regex_timestamp.search(string)
+    if results:
+        return (int(results.group(1)) * segundos_por_minuto + int(results.group(2))) * frames_por_segundo + int(results.group(3))
+    raise ValueError('No se pudo determinar el timestamp. Valor: ' + string)
+
+def format_msf(frames):
+    """
+    Convierte un nmero de frames a un timestamp en formato MM:SS:FF, tal y como se escribe en el cue
+
+    Parameters
+    ----------
+    frames : int
+        El nmero de frames
+
+    Returns
+    -------
+    str
+        El timestamp
+
+    """
+
+    secs, frames = divmod(frames, frames_por_segundo)
+    mins, secs = divmod(secs, segundos_por_minuto)
+    return '%02d:%02d:%02d' % (mins, secs, frames)
+
 class Timestamp:
-    mins = 0
-    secs = 0
-    frames = 0
+    # Solo se guarda el nmero total de frames; minutos, segundos y frames se calculan al pedirlos
+    __slots__ = ('total_frames',)
     separator = ":"
-    # timestamp = min:sec:frames
-    regex_timestamp = r'(\d+):(\d+):(\d+)'
     
-    def __init__(self, string=None, mins=None, secs=None, frames=None):
+    def __init__(self, string=None, mins=None, secs=None, frames=None, total_frames=None):
         if string:
-            results = re.search(self.regex_timestamp, string)
-            if results:
-                self.mins = int(results.group(1))
-                self.secs = int(results.group(2))
-                self.frames = int(results.group(3))
-            else:
-                raise ValueError('No se pudo determinar el timestamp. Valor: ' + string)
+            self.total_frames = parse_frames(string)
         elif mins is not None and secs is not None and frames is not None:
-            self.mins = mins
-            self.secs = secs
-            self.frames = frames
+            self.total_frames = (mins * segundos_por_minuto + secs) * frames_por_segundo + frames
+        elif total_frames is not None:
+            self.total_frames = total_frames
         else:
             raise ValueError('No se puede instanciar un timestamp sin un string o sin los valores')
+
+    @property
+    def mins(self):
+        return self.total_frames // (frames_por_segundo * segundos_por_minuto)
+
+    @property
+    def secs(self):
+        return self.total_frames // frames_por_segundo % segundos_por_minuto
+
+    @property
+    def frames(self):
+        return self.total_frames % frames_por_segundo
+        
+    def __copy__(self):
+        return Timestamp(total_frames=self.total_frames)
         
     def __str__(self):
-        return str(self.mins).zfill(2) + self.separator + str(self.secs).zfill(2) + self.separator + str(self.frames).zfill(2)
+        return format_msf(self.total_frames)
     
     def substract(self, timestamp):
         """
@@ -66,15 +121,7 @@ class Timestamp:
 
         """
 
-        self.frames = self.frames - timestamp.frames
-        if self.frames < 0:
-            self.frames += frames_por_segundo
-            self.secs -= 1
-        self.secs = self.secs - timestamp.secs
-        if self.secs < 0:
-            self.secs += segundos_por_minuto
-            self.mins -= 1
-        self.mins = self.mins - timestamp.mins
+        self.total_frames -= timestamp.total_frames
         return self
         
     def add(self, timestamp):
@@ -88,13 +135,5 @@ class Timestamp:
 
         """
 
-        self.frames = self.frames + timestamp.frames
-        if self.frames >= frames_por_segundo:
-            self.frames %= frames_por_segundo
-            self.secs += 1
-        self.secs = self.secs + timestamp.secs
-        if self.secs >= segundos_por_minuto:
-            self.secs %= segundos_por_minuto
-            self.mins += 1
-        self.mins = self.mins + timestamp.mins
-        return self
\ No newline at end of file
+        self.total_frames += timestamp.total_frames
+        return self
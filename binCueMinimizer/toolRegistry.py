@@ -0,0 +1,213 @@
+# coding=cp1252
+#
+# toolRegistry.py
+#
+# Creative Commons Attribution-NonCommercial-ShareAlike 4.0 International (CC BY-NC-SA 4.0) 2019 granmacco <@granmacco>
+# https://github.com/granmacco
+#
+# Script inspired by @krcroft's reddit post on June 25th, 2019
+# https://www.reddit.com/r/RetroPie/comments/c50djy/chd_compression_summary_for_psx/
+# https://github.com/krcroft
+# Thank you very much, without you, this automation wouldn't have existed!
+#
+# Also, special thanks to the Plata o Roms team for finding @krcroft's post, 
+# putting me on the right track and inspiring some of the features of this script.
+# http://t.me/RaspberryPiEmuladores
+# Thank you very much for sharing your knowledge and for striving for excellence!
+#
+# Lastly, but not least, a very special thanks to @Sergi_0, for providing new ideas and methodologies to this script.
+# https://github.com/Sergi_0
+# Thank you very much for your kindness and time!!
+#
+# This code is licensed under Creative Commons BY-NC-SA 4.0
+# You may redistribute it and/or modify it under the terms of the 
+# Creative Commons BY-NC-SA 4.0 License, as published by the Creative
+# Commons on their website http://creativecommons.org/licenses/by-nc-sa/4.0/
+#
+
+
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import threading
+
+# Nombre de fichero de cada herramienta, ya que los comandos no siempre respetan las maysculas
+TOOL_NAMES = {
+    'chdman': 'chdman',
+    'ffmpeg': 'ffmpeg',
+    'lossywav': 'lossyWAV'
+    }
+# Argumentos con los que cada herramienta muestra su versin en la primera lnea de su salida
+VERSION_ARGUMENTS = {
+    'chdman': ['--help'],
+    'ffmpeg': ['-version'],
+    'lossywav': ['--version']
+    }
+
+class Tool:
+    name = None
+    path = None
+    version = None
+
+    def __init__(self, name, path):
+        self.name = name
+        self.path = path
+
+class ToolRegistry:
+    tools_dir = None
+    tools = None
+
+    def __init__(self, tools_dir = None):
+        self.tools_dir = tools_dir
+        self.tools = {}
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        # El registro se enva ya resuelto a los procesos del pool; el lock no se puede serializar
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def get_filename(self, name):
+        """
+        Devuelve el nombre de fichero del ejecutable, ajustado al sistema operativo
+
+        """
+
+        return name + '.exe' if platform.system() == 'Windows' else name
+
+    def resolve(self, name):
+        """
+        Localiza la herramienta, primero en el directorio configurado y despus en el PATH.
+        El resultado se guarda, por lo que cada herramienta solo se busca una vez.
+
+        Parameters
+        ----------
+        name : str
+            El nombre de la herramienta, sin extensin
+
+        Returns
+        -------
+        Tool
+            La herramienta, o None si no se encuentra
+
+        """
+
+        key = name.casefold()
+        name = TOOL_NAMES.get(key, name)
+        with self.lock:
+            if key not in self.tools:
+                path = None
+                filename = self.get_filename(name)
+                if self.tools_dir and os.path.isfile(os.path.join(self.tools_dir, filename)):
+                    path = os.path.abspath(os.path.join(self.tools_dir, filename))
+                else:
+                    path = shutil.which(name)
+                    if path:
+                        path = os.path.abspath(path)
+                logging.debug('Herramienta ' + name + ': ' + str(path))
+                self.tools[key] = Tool(name, path) if path else None
+            return self.tools[key]
+
+    def get_path(self, name):
+        """
+        Devuelve la ruta absoluta de la herramienta
+
+        Parameters
+        ----------
+        name : str
+            El nombre de la herramienta
+
+        Returns
+        -------
+        str
+            La ruta absoluta del ejecutable
+
+        """
+
+        tool = self.resolve(name)
+        if tool is None:
+            msg = 'Error: No se encuentra el fichero necesario \"' + self.get_filename(name) + '\". Asegurese de tenerlo en la misma ruta que el script o en el PATH'
+            logging.error(msg)
+            raise SystemExit(msg)
+        return tool.path
+
+    def get_version(self, name):
+        """
+        Devuelve la versin de la herramienta, tal y como la muestra ella misma. Se consulta una sola vez.
+
+        Parameters
+        ----------
+        name : str
+            El nombre de la herramienta
+
+        Returns
+        -------
+        str
+            La primera lnea de la salida de la herramienta, o una cadena vaca si no muestra nada
+
+        """
+
+        path = self.get_path(name)
+        tool = self.resolve(name)
+        if tool.version is None:
+            try:
+                result = subprocess.run([path] + VERSION_ARGUMENTS.get(name.casefold(), []), stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, timeout=30)
+                lines = [line.strip() for line in result.stdout.decode(errors='replace').splitlines() if line.strip()]
+                tool.version = lines[0] if lines else ''
+            except (OSError, subprocess.TimeoutExpired) as e:
+                logging.warning('No se pudo obtener la version de ' + name + ': ' + str(e))
+                tool.version = ''
+        return tool.version
+
+    def get_command(self, command):
+        """
+        Convierte un comando en lista de argumentos, sustituyendo el nombre de la herramienta por su ruta absoluta
+
+        Parameters
+        ----------
+        command : str
+            El comando, empezando por el nombre de la herramienta
+
+        Returns
+        -------
+        list [str]
+            El comando listo para ejecutar
+
+        """
+
+        arguments = command.split()
+        arguments[0] = self.get_path(arguments[0])
+        return arguments
+
+# Un registro por directorio de herramientas y proceso
+registries = {}
+registries_lock = threading.Lock()
+
+def get_registry(tools_dir = None):
+    """
+    Devuelve el registro de herramientas del directorio indicado, crendolo si no existe
+
+    Parameters
+    ----------
+    tools_dir : str
+        El directorio donde buscar las herramientas antes que en el PATH
+
+    Returns
+    -------
+    ToolRegistry
+        El registro compartido
+
+    """
+
+    key = str(tools_dir)
+    with registries_lock:
+        if key not in registries:
+            registries[key] = ToolRegistry(tools_dir)
+        return registries[key]
@@ -26,33 +26,38 @@
 #
 
 import logging
-import re
 import os.path as osp
+import sys
 from binCueMinimizer.consts import Framesizes
 from binCueMinimizer.index import Index
 from binCueMinimizer.binFile import Bin
-from binCueMinimizer.timestamp import Timestamp
-import copy
+from binCueMinimizer.timestamp import format_msf, parse_frames
+from binCueMinimizer.trackCache import hash_data
 
 class Track:
-    id = None
-    path = None
-    type = None
-    is_audio_track = False
-    is_data_track = False
-    indexes = None
-    frames = None
-    framesize = None
-    tracksize = None
-    parent_cue = None
-    binFile = None
-    
-    regex_timestamp = r'(\d+):(\d+):(\d+)'
-    compiled_regex_timestamp = re.compile(regex_timestamp)
+    # Con __slots__ las pistas no llevan un __dict__ por instancia: un catlogo de toda una biblioteca ocupa mucho menos
+    __slots__ = ('id', 'path', 'type', 'is_audio_track', 'is_data_track', 'indexes', 'pregap', 'framesize', 'tracksize',
+                 'offset', 'is_virtual', 'checksum', 'content_hash', 'levels', 'parent_cue', 'bin')
     
     def __init__(self, track_id, bin_file = None, path = None, track_type = None, framesize = None, parent_cue = None):
-        self.id = track_id
+        self.id = sys.intern(track_id)
+        self.path = None
+        self.type = None
+        self.is_audio_track = False
+        self.is_data_track = False
         self.indexes = {}
+        # Frames de PREGAP: silencio que genera quien lee el cue y que no est en el bin
+        self.pregap = None
+        self.framesize = None
+        self.tracksize = None
+        self.offset = None
+        self.is_virtual = False
+        self.checksum = None
+        self.content_hash = None
+        # Niveles de audio (silenceDetector.AudioLevels), calculados al decidir si la pista es silencio
+        self.levels = None
+        self.parent_cue = None
+        self.bin = None
         if bin_file:
             self.path = bin_file.path
             self.bin = bin_file
@@ -64,7 +69,7 @@ class Track:
             if self.bin:
                 self.bin.framesize = framesize
         if track_type:
-            self.type = track_type
+            self.type = sys.intern(track_type)
             self.is_audio_track = self.type.casefold() == 'AUDIO'.casefold()
             self.is_data_track = not self.is_audio_track
             self.framesize = Framesizes[track_type.casefold()]
@@ -86,18 +91,39 @@ class Track:
 
         """
 
-        index = Index(string)
+        if pregap:
+            # No es un INDEX 00: sus frames no estn en el bin, as que no deben mover el inicio de la pista
+            self.pregap = parse_frames(pregap)
+        self.set_index(Index(string))
+
+    def set_index(self, index):
+        """
+        Aade un indice ya construido a la pista
+
+        Parameters
+        ----------
+        index : Index
+            El indice a aadir
+
+        """
+
         if index.id in self.indexes:
             self.log_error_repeated_index(index)
         self.indexes[index.id] = index
-        if pregap:
-            # timestamp = min:sec:frames
-            timestamp_pregap = Timestamp(pregap)
-            timestamp_index01 = index.timestamp
-            timestamp_index00 = copy.copy(timestamp_index01)
-            timestamp_index00 = timestamp_index00.substract(timestamp_pregap)
-            index_00 = "00 " + str(timestamp_index00)
-            self.add_index(index_00)
+
+    def get_start_in_frames(self):
+        """
+        Devuelve el frame del fichero en el que empieza la pista: su primer indice, el INDEX 00 si lo tiene.
+        El PREGAP no cuenta, ya que no est en el fichero
+
+        Returns
+        -------
+        int
+            El frame de inicio
+
+        """
+
+        return min(index.length_in_frames for index in self.indexes.values())
 
     def check_if_exists(self):
         """
@@ -110,30 +136,73 @@ class Track:
     
         """
         
-        if self.path and not osp.exists(self.path):
+        if self.path and not self.is_virtual and not osp.exists(self.path):
             self.log_error_track_not_exists()
             return False
         else:
             return True
         
+    def get_view(self):
+        """
+        Devuelve una vista de solo lectura sobre los datos de la pista dentro de su bin original.
+        Solo aplicable a pistas virtuales, que aun no se han escrito en su propio fichero.
+
+        Returns
+        -------
+        memoryview
+            La vista sobre los datos de la pista
+    
+        """
+
+        return self.bin.get_view(self.offset, self.tracksize)
+
+    def get_content_hash(self):
+        """
+        Devuelve el hash SHA-256 de los datos de la pista, calculndolo la primera vez
+
+        Returns
+        -------
+        str
+            El hash, en hexadecimal
+    
+        """
+
+        if self.content_hash is None:
+            if self.is_virtual:
+                with self.get_view() as view:
+                    self.content_hash = hash_data(view)
+            else:
+                self.content_hash = hash_data(self.path)
+        return self.content_hash
+
+    def materialize(self):
+        """
+        Escribe en su propio fichero los datos de una pista virtual, para las etapas que necesitan leer de un fichero
+
+        """
+
+        if self.is_virtual:
+            logging.debug('Escribiendo la pista virtual ' + self.id + ' en ' + self.path)
+            with self.get_view() as view, open(self.path, 'wb') as file:
+                file.write(view)
+            self.is_virtual = False
+
     def set_indexes_to_zero(self):
         """
-        Pasa los indices de su base a actual a una base 0. Solo aplicable si tenemos INDEX 00 e INDEX 01, y solo es til si hablamos de un fichero multipista
+        Pasa los indices de su base actual a una base 0, restndoles el inicio de la pista. Solo es til si hablamos de un fichero multipista
     
         """
         
-        if '00' in self.indexes and '01' in self.indexes:
-            timestamp_index_00 = self.indexes['00'].timestamp
-            timestamp_index_01 = self.indexes['01'].timestamp
-            new_index_01 = '01 ' + str(copy.copy(timestamp_index_01).substract(timestamp_index_00))
-            new_index_00 = '00 ' + str(Timestamp(mins=0, secs=0, frames=0))
-            logging.debug('Se ajusta el indice 00 ' + str(timestamp_index_00) +  ' a ' + new_index_00)
-            logging.debug('Se ajusta el indice 01 ' + str(timestamp_index_01) +  ' a ' + new_index_01)
-            self.indexes = {}
-            self.add_index(new_index_00)
-            self.add_index(new_index_01)
+        if not self.indexes:
+            logging.debug('La pista ' + self.id + ' no tiene indices, por lo que no hace falta ajustar')
+            return
+        start = self.get_start_in_frames()
+        if start:
+            for index in self.indexes.values():
+                logging.debug('Se ajusta el indice ' + index.id + ' ' + format_msf(index.length_in_frames) + ' a ' + format_msf(index.length_in_frames - start))
+                index.length_in_frames -= start
         else:
-            logging.debug('Falta el indice 00 o el 01, por lo que no hace falta ajustar')
+            logging.debug('La pista ' + self.id + ' ya empieza en 0, por lo que no hace falta ajustar')
 
     def log_error_repeated_index(self, index):
         """
@@ -151,7 +220,7 @@ class Track:
         msg += 'ERROR en ' + self.parent_cue.path + ' !!!!!!'
         msg += '\n'
         msg += '\n'
-        msg += 'El cue tiene varias veces definido el INDEX ' + index + ' para la pista ' + self.id
+        msg += 'El cue tiene varias veces definido el INDEX ' + index.id + ' para la pista ' + self.id
         msg += '\n'
         msg += '\n'
         msg += 'Si has modificado el CUE a mano, comprueba que no has cometido un error.'
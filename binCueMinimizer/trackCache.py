@@ -0,0 +1,207 @@
+# coding=cp1252
+#
+# trackCache.py
+#
+# Creative Commons Attribution-NonCommercial-ShareAlike 4.0 International (CC BY-NC-SA 4.0) 2019 granmacco <@granmacco>
+# https://github.com/granmacco
+#
+# Script inspired by @krcroft's reddit post on June 25th, 2019
+# https://www.reddit.com/r/RetroPie/comments/c50djy/chd_compression_summary_for_psx/
+# https://github.com/krcroft
+# Thank you very much, without you, this automation wouldn't have existed!
+#
+# Also, special thanks to the Plata o Roms team for finding @krcroft's post, 
+# putting me on the right track and inspiring some of the features of this script.
+# http://t.me/RaspberryPiEmuladores
+# Thank you very much for sharing your knowledge and for striving for excellence!
+#
+# Lastly, but not least, a very special thanks to @Sergi_0, for providing new ideas and methodologies to this script.
+# https://github.com/Sergi_0
+# Thank you very much for your kindness and time!!
+#
+# This code is licensed under Creative Commons BY-NC-SA 4.0
+# You may redistribute it and/or modify it under the terms of the 
+# Creative Commons BY-NC-SA 4.0 License, as published by the Creative
+# Commons on their website http://creativecommons.org/licenses/by-nc-sa/4.0/
+#
+
+
+import hashlib
+import logging
+import os
+import shutil
+import threading
+
+# 20 GB por defecto
+DEFAULT_MAX_BYTES = 20 * 1024 * 1024 * 1024
+ENTRY_EXTENSION = '.bin'
+
+class TrackCache:
+    path = None
+    max_bytes = DEFAULT_MAX_BYTES
+
+    def __init__(self, path, max_bytes = DEFAULT_MAX_BYTES):
+        self.path = os.path.abspath(path)
+        self.max_bytes = max_bytes
+        os.makedirs(self.path, exist_ok=True)
+        self.eviction_lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['eviction_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.eviction_lock = threading.Lock()
+
+    def get_key(self, content_hash, command):
+        """
+        Calcula la clave de una pista procesada: el hash de su contenido ms el comando exacto que la procesa
+
+        Parameters
+        ----------
+        content_hash : str
+            El hash del contenido original de la pista
+        command : str
+            La descripcin exacta de la cadena de procesado (comandos y versiones de las herramientas)
+
+        Returns
+        -------
+        str
+            La clave, en hexadecimal
+
+        """
+
+        return hashlib.sha256((content_hash + '\n' + command).encode('utf-8')).hexdigest()
+
+    def get_entry_path(self, key):
+        """
+        Devuelve la ruta en la cach de la entrada con la clave indicada
+
+        """
+
+        return os.path.join(self.path, key[:2], key + ENTRY_EXTENSION)
+
+    def contains(self, key):
+        """
+        Determina si hay una entrada para la clave indicada
+
+        """
+
+        return os.path.isfile(self.get_entry_path(key))
+
+    def get(self, key, target):
+        """
+        Recupera una pista procesada de la cach, dejndola en la ruta indicada
+
+        Parameters
+        ----------
+        key : str
+            La clave de la pista
+        target : str
+            Dnde dejar la pista. Si ya existe un fichero se reemplaza
+
+        Returns
+        -------
+        bool
+            True si la pista estaba en la cach
+
+        """
+
+        entry = self.get_entry_path(key)
+        temporary_target = target + '.cache'
+        try:
+            try:
+                os.link(entry, temporary_target)
+            except OSError:
+                shutil.copyfile(entry, temporary_target)
+        except FileNotFoundError:
+            return False
+        os.replace(temporary_target, target)
+        # La fecha de modificacin marca el ltimo uso, para descartar primero lo menos usado
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+        logging.info('Recuperada de la cache la pista ' + target)
+        return True
+
+    def put(self, key, source):
+        """
+        Guarda una pista procesada en la cach. El fichero original no se debe modificar despus,
+        ya que si es posible se enlaza en lugar de copiarse.
+
+        Parameters
+        ----------
+        key : str
+            La clave de la pista
+        source : str
+            La pista procesada
+
+        """
+
+        entry = self.get_entry_path(key)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        temporary_entry = entry + '.' + str(os.getpid()) + '.' + str(threading.get_ident()) + '.part'
+        try:
+            os.link(source, temporary_entry)
+        except OSError:
+            shutil.copyfile(source, temporary_entry)
+        os.replace(temporary_entry, entry)
+        self.evict()
+
+    def evict(self):
+        """
+        Borra las entradas usadas hace ms tiempo hasta que la cach no supere su tamao mximo
+
+        """
+
+        with self.eviction_lock:
+            entries = []
+            total = 0
+            for directory in os.scandir(self.path):
+                if not directory.is_dir():
+                    continue
+                for entry in os.scandir(directory.path):
+                    if entry.name.endswith(ENTRY_EXTENSION):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+                        total += stat.st_size
+            if total <= self.max_bytes:
+                return
+            entries.sort()
+            for mtime, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                    logging.debug('Descartada de la cache la entrada ' + path)
+                except FileNotFoundError:
+                    pass
+
+def hash_data(source):
+    """
+    Calcula el hash SHA-256 de un fichero o de un bloque de datos en memoria
+
+    Parameters
+    ----------
+    source : str o memoryview
+        La ruta del fichero o los datos
+
+    Returns
+    -------
+    str
+        El hash, en hexadecimal
+
+    """
+
+    digest = hashlib.sha256()
+    if isinstance(source, str):
+        with open(source, 'rb') as file:
+            for chunk in iter(lambda: file.read(4 * 1024 * 1024), b''):
+                digest.update(chunk)
+    else:
+        digest.update(source)
+    return digest.hexdigest()
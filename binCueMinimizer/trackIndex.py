@@ -0,0 +1,162 @@
+# coding=cp1252
+#
+# trackIndex.py
+#
+# Creative Commons Attribution-NonCommercial-ShareAlike 4.0 International (CC BY-NC-SA 4.0) 2019 granmacco <@granmacco>
+# https://github.com/granmacco
+#
+# Script inspired by @krcroft's reddit post on June 25th, 2019
+# https://www.reddit.com/r/RetroPie/comments/c50djy/chd_compression_summary_for_psx/
+# https://github.com/krcroft
+# Thank you very much, without you, this automation wouldn't have existed!
+#
+# Also, special thanks to the Plata o Roms team for finding @krcroft's post, 
+# putting me on the right track and inspiring some of the features of this script.
+# http://t.me/RaspberryPiEmuladores
+# Thank you very much for sharing your knowledge and for striving for excellence!
+#
+# Lastly, but not least, a very special thanks to @Sergi_0, for providing new ideas and methodologies to this script.
+# https://github.com/Sergi_0
+# Thank you very much for your kindness and time!!
+#
+# This code is licensed under Creative Commons BY-NC-SA 4.0
+# You may redistribute it and/or modify it under the terms of the 
+# Creative Commons BY-NC-SA 4.0 License, as published by the Creative
+# Commons on their website http://creativecommons.org/licenses/by-nc-sa/4.0/
+#
+
+
+import logging
+import os
+import zlib
+from collections import Counter
+from binCueMinimizer.cueFile import CueFile
+
+# Bytes del principio y del final de la pista que se usan para su huella
+FINGERPRINT_BYTES = 64 * 1024
+
+def get_fingerprint(source, offset = 0, size = None):
+    """
+    Calcula una huella rpida de una pista de audio: el CRC32 de su principio y de su final.
+    Solo sirve para descartar pistas distintas; dos pistas con la misma huella pueden no ser iguales.
+
+    Parameters
+    ----------
+    source : str o memoryview
+        El fichero que contiene la pista, o directamente sus datos
+    offset : int
+        La posicin en bytes donde empieza la pista
+    size : int
+        El tamao de la pista. Por defecto, hasta el final
+
+    Returns
+    -------
+    int
+        La huella
+
+    """
+
+    if isinstance(source, str):
+        if size is None:
+            size = os.path.getsize(source) - offset
+        with open(source, 'rb') as file:
+            file.seek(offset)
+            head = file.read(min(size, FINGERPRINT_BYTES))
+            file.seek(offset + max(0, size - FINGERPRINT_BYTES))
+            tail = file.read(min(size, FINGERPRINT_BYTES))
+    else:
+        if size is None:
+            size = source.nbytes - offset
+        head = source[offset:offset + min(size, FINGERPRINT_BYTES)]
+        tail = source[offset + max(0, size - FINGERPRINT_BYTES):offset + size]
+    return zlib.crc32(tail, zlib.crc32(head))
+
+class TrackIndex:
+    """
+    ndice de las pistas de audio de toda la biblioteca, para encontrar las que se repiten entre discos
+    (juegos de varios discos, versiones de distintas regiones...). Primero se agrupan por tamao, que sale
+    del cue sin leer el audio, y solo las de tamao repetido se comparan por su huella.
+
+    """
+
+    tracks = 0
+    candidates = None
+    candidate_sizes = None
+    locations = None
+
+    def __init__(self):
+        # Tamao -> [(fichero, posicin)] de las pistas, hasta que se construye el ndice
+        self.locations = {}
+        self.candidates = set()
+        self.candidate_sizes = set()
+
+    def add_cue(self, cue_path):
+        """
+        Aade al ndice las pistas de audio de un cue, con el tamao y la posicin que tendrn al separarlas
+
+        Parameters
+        ----------
+        cue_path : str
+            La ruta del cue
+
+        """
+
+        cue = CueFile(cue_path)
+        if not cue.is_processable():
+            return
+        for track, path, offset, size in cue.get_track_extents():
+            if track.is_audio_track:
+                self.add_location(path, offset, size)
+
+    def add_location(self, path, offset, size):
+        if size > 0:
+            self.tracks += 1
+            self.locations.setdefault(size, []).append((path, offset))
+
+    def build(self):
+        """
+        Calcula la huella de las pistas de tamao repetido y se queda con las que tambin repiten huella
+
+        """
+
+        for size, locations in self.locations.items():
+            if len(locations) < 2:
+                continue
+            fingerprints = Counter()
+            for path, offset in locations:
+                try:
+                    fingerprints[get_fingerprint(path, offset, size)] += 1
+                except OSError:
+                    logging.exception('No se pudo leer la pista en ' + path)
+            for fingerprint, count in fingerprints.items():
+                if count >= 2:
+                    self.candidates.add((size, fingerprint))
+                    self.candidate_sizes.add(size)
+        self.locations = {}
+        logging.info('ndice de pistas: ' + str(self.tracks) + ' pistas de audio, ' + str(len(self.candidates)) + ' repetidas en varios discos')
+
+    def is_candidate(self, track):
+        """
+        Determina si una pista de audio puede estar repetida en otro disco de la biblioteca
+
+        Parameters
+        ----------
+        track : Track
+            La pista, virtual o ya en su propio fichero
+
+        Returns
+        -------
+        bool
+            True si hay otra pista con el mismo tamao y la misma huella
+
+        """
+
+        size = track.tracksize if track.tracksize is not None else os.path.getsize(track.path)
+        if size not in self.candidate_sizes:
+            return False
+        if track.is_virtual:
+            with track.get_view() as view:
+                fingerprint = get_fingerprint(view)
+        else:
+            fingerprint = get_fingerprint(track.path)
+        return (size, fingerprint) in self.candidates
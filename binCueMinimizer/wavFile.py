@@ -0,0 +1,189 @@
+# coding=cp1252
+#
+# wavFile.py
+#
+# Creative Commons Attribution-NonCommercial-ShareAlike 4.0 International (CC BY-NC-SA 4.0) 2019 granmacco <@granmacco>
+# https://github.com/granmacco
+#
+# Script inspired by @krcroft's reddit post on June 25th, 2019
+# https://www.reddit.com/r/RetroPie/comments/c50djy/chd_compression_summary_for_psx/
+# https://github.com/krcroft
+# Thank you very much, without you, this automation wouldn't have existed!
+#
+# Also, special thanks to the Plata o Roms team for finding @krcroft's post, 
+# putting me on the right track and inspiring some of the features of this script.
+# http://t.me/RaspberryPiEmuladores
+# Thank you very much for sharing your knowledge and for striving for excellence!
+#
+# Lastly, but not least, a very special thanks to @Sergi_0, for providing new ideas and methodologies to this script.
+# https://github.com/Sergi_0
+# Thank you very much for your kindness and time!!
+#
+# This code is licensed under Creative Commons BY-NC-SA 4.0
+# You may redistribute it and/or modify it under the terms of the 
+# Creative Commons BY-NC-SA 4.0 License, as published by the Creative
+# Commons on their website http://creativecommons.org/licenses/by-nc-sa/4.0/
+#
+
+
+import logging
+import os
+import struct
+from binCueMinimizer.osUtils import copy_data
+
+# Cabecera RIFF mnima: RIFF + WAVE + chunk fmt de PCM de 16 bytes + cabecera del chunk data
+WAV_HEADER_SIZE = 44
+WAVE_FORMAT_PCM = 1
+CDDA_CHANNELS = 2
+CDDA_SAMPLE_RATE = 44100
+CDDA_BITS_PER_SAMPLE = 16
+
+class WavFormat:
+    format_tag = None
+    channels = None
+    sample_rate = None
+    bits_per_sample = None
+    data_offset = None
+    data_size = None
+
+    def is_cdda(self):
+        """
+        Determina si el WAV es PCM s16le estreo a 44.1 kHz, es decir, el mismo formato que una pista de audio de CD
+
+        Returns
+        -------
+        bool
+            True si el payload puede copiarse tal cual a un bin
+
+        """
+
+        return self.format_tag == WAVE_FORMAT_PCM and self.channels == CDDA_CHANNELS\
+            and self.sample_rate == CDDA_SAMPLE_RATE and self.bits_per_sample == CDDA_BITS_PER_SAMPLE
+
+def build_wav_header(data_size, channels = CDDA_CHANNELS, sample_rate = CDDA_SAMPLE_RATE, bits_per_sample = CDDA_BITS_PER_SAMPLE):
+    """
+    Construye la cabecera RIFF mnima de un WAV PCM, sin chunks de metadatos
+
+    Parameters
+    ----------
+    data_size : int
+        El tamao en bytes del payload PCM
+
+    Returns
+    -------
+    bytes
+        Los 44 bytes de la cabecera
+
+    """
+
+    block_align = channels * bits_per_sample // 8
+    return struct.pack('<4sI4s4sIHHIIHH4sI',
+                       b'RIFF', WAV_HEADER_SIZE - 8 + data_size, b'WAVE',
+                       b'fmt ', 16, WAVE_FORMAT_PCM, channels, sample_rate, sample_rate * block_align, block_align, bits_per_sample,
+                       b'data', data_size)
+
+def read_wav_format(path):
+    """
+    Lee y valida la cabecera de un WAV, localizando el chunk de datos
+
+    Parameters
+    ----------
+    path : str
+        El WAV a leer
+
+    Returns
+    -------
+    WavFormat
+        El formato del WAV y la posicin de su payload
+
+    """
+
+    filesize = os.path.getsize(path)
+    wav_format = WavFormat()
+    with open(path, 'rb') as file:
+        riff = file.read(12)
+        if len(riff) != 12 or riff[0:4] != b'RIFF' or riff[8:12] != b'WAVE':
+            raise ValueError('El fichero ' + path + ' no es un WAV vlido')
+        while True:
+            chunk_header = file.read(8)
+            if len(chunk_header) < 8:
+                raise ValueError('El fichero ' + path + ' no tiene chunk de datos')
+            chunk_id, chunk_size = struct.unpack('<4sI', chunk_header)
+            if chunk_id == b'fmt ':
+                if chunk_size < 16:
+                    raise ValueError('El chunk fmt del fichero ' + path + ' est truncado')
+                fmt = file.read(chunk_size + (chunk_size & 1))
+                wav_format.format_tag, wav_format.channels, wav_format.sample_rate, _, _, wav_format.bits_per_sample = struct.unpack('<HHIIHH', fmt[:16])
+            elif chunk_id == b'data':
+                if wav_format.format_tag is None:
+                    raise ValueError('El fichero ' + path + ' no tiene chunk fmt antes de los datos')
+                wav_format.data_offset = file.tell()
+                # Los WAV escritos en streaming pueden llevar un tamao de datos de relleno
+                wav_format.data_size = min(chunk_size, filesize - wav_format.data_offset)
+                return wav_format
+            else:
+                file.seek(chunk_size + (chunk_size & 1), os.SEEK_CUR)
+
+def from_bin_to_wav(source, target):
+    """
+    Convierte un bin de audio de CD en WAV aadiendo la cabecera RIFF. El payload se copia sin decodificar.
+
+    Parameters
+    ----------
+    source : str
+        El bin de origen
+    target : str
+        El WAV a crear
+
+    """
+
+    data_size = os.path.getsize(source)
+    logging.debug('Aadiendo cabecera WAV a ' + source)
+    if os.path.lexists(target):
+        os.remove(target)
+    with open(source, 'rb') as source_file, open(target, 'wb') as target_file:
+        target_file.write(build_wav_header(data_size))
+        target_file.flush()
+        copy_data(source_file.fileno(), target_file.fileno(), 0, data_size)
+
+def from_view_to_wav(view, target):
+    """
+    Convierte en WAV los datos de una pista de audio de CD que no est en su propio fichero
+
+    Parameters
+    ----------
+    view : memoryview
+        Los datos PCM de la pista
+    target : str
+        El WAV a crear
+
+    """
+
+    if os.path.lexists(target):
+        os.remove(target)
+    with open(target, 'wb') as target_file:
+        target_file.write(build_wav_header(view.nbytes))
+        target_file.write(view)
+
+def from_wav_to_bin(source, target):
+    """
+    Convierte un WAV PCM s16le estreo a 44.1 kHz en un bin de audio de CD quitando la cabecera RIFF
+
+    Parameters
+    ----------
+    source : str
+        El WAV de origen
+    target : str
+        El bin a crear
+
+    """
+
+    wav_format = read_wav_format(source)
+    if not wav_format.is_cdda():
+        raise ValueError('El fichero ' + source + ' no es PCM s16le estreo a 44.1 kHz')
+    logging.debug('Quitando cabecera WAV a ' + source)
+    # Se borra antes el destino por si fuera un enlace a otro fichero
+    if os.path.lexists(target):
+        os.remove(target)
+    with open(source, 'rb') as source_file, open(target, 'wb') as target_file:
+        copy_data(source_file.fileno(), target_file.fileno(), wav_format.data_offset, wav_format.data_size)
@@ -28,14 +28,21 @@
 import os 
 import platform
 from binCueMinimizer.binCueMinimizer import BinCueMinimizer
-from binCueMinimizer.cueFile import CueFile
-from binCueMinimizer import osUtils
+from binCueMinimizer.batchExecutor import BatchExecutor
+from binCueMinimizer.libraryScanner import scan_cues
+from binCueMinimizer.cueFile import use_parse_cache
 from binCueMinimizer.consts import MODE_NORMAL_CHD, MODE_LOSSYWAV,\
     MODE_LOSSYWAV_HARD, MODE_U8WAV, MODE_EVERYTHING, EXIT,\
-    SWITCH_FORCE
+    SWITCH_FORCE, SWITCH_WORKERS, SWITCH_STREAMING, SWITCH_CACHE, TRACK_CACHE_DIR,\
+    SWITCH_INCREMENTAL, BUILD_MANIFEST_FILE, SCAN_EXCLUDE, SWITCH_METRICS, METRICS_FILE,\
+    PARSE_CACHE_FILE, SWITCH_DEDUP, SWITCH_TUNE, CHD_TUNING_FILE
+from binCueMinimizer.trackCache import TrackCache
+from binCueMinimizer.buildManifest import BuildManifest
+from binCueMinimizer.stageMetrics import MetricsRecorder
+from binCueMinimizer.chdTuner import ChdTuner
 from termcolor import colored, cprint
 
-def menu(force_enabled):
+def menu(force_enabled, workers, streaming_enabled, cache_enabled, incremental_enabled, metrics_enabled, dedup_enabled, tune_enabled):
     """
     Funcin que muestra el menu
 
@@ -54,6 +61,13 @@ def menu(force_enabled):
     print("\t    Compresin:               Prdida: ")
     print("\t" + str(MODE_EVERYTHING)    + " - Probar todos (OJO!! Procesamiento MUY lento)")
     print("\t" + str(SWITCH_FORCE)    + " - Sobreescribir CHDs anteriores (Estado: " + ("HABILITADO" if force_enabled else "deshabilitado") + ")")
+    print("\t" + str(SWITCH_WORKERS)  + " - Procesos en paralelo (Actual: " + str(workers) + ")")
+    print("\t" + str(SWITCH_STREAMING) + " - Procesar el audio sin ficheros WAV intermedios (Estado: " + ("HABILITADO" if streaming_enabled else "deshabilitado") + ")")
+    print("\t" + str(SWITCH_CACHE)     + " - Reutilizar pistas de audio ya procesadas (Estado: " + ("HABILITADO" if cache_enabled else "deshabilitado") + ")")
+    print("\t" + str(SWITCH_INCREMENTAL) + " - Saltar los CHD que siguen al da (Estado: " + ("HABILITADO" if incremental_enabled else "deshabilitado") + ")")
+    print("\t" + str(SWITCH_METRICS)   + " - Medir la duracin de cada etapa (Estado: " + ("HABILITADO" if metrics_enabled else "deshabilitado") + ")")
+    print("\t" + str(SWITCH_DEDUP)     + " - Reutilizar pistas de audio repetidas entre discos (Estado: " + ("HABILITADO" if dedup_enabled else "deshabilitado") + ")")
+    print("\t" + str(SWITCH_TUNE)      + " - Ajustar los cdecs de chdman a cada tipo de disco (Estado: " + ("HABILITADO" if tune_enabled else "deshabilitado") + ")")
     print("\t" + str(EXIT)               + " - Salir")
     print("Se recomienda utilizar la opcin " + str(MODE_LOSSYWAV) + " para una compresin aceptable,")
     print("o probar todas (" + str(MODE_EVERYTHING) + ") para que saques tus propias conclusiones.")
@@ -73,8 +87,27 @@ def warning(opcion):
         if seguro.casefold() != "s".casefold():
             raise ValueError("Volviendo al men principal...")
     
+def ask_workers():
+    """
+    Pregunta el nmero de procesos en paralelo. Con 1 se procesa todo en el proceso principal.
+
+    """
+
+    maximo = os.cpu_count() or 1
+    workers = int(input("Nmero de procesos en paralelo (1-" + str(maximo) + ")  "))
+    if not 1 <= workers <= maximo:
+        raise ValueError("Nmero de procesos fuera de rango")
+    return workers
+
 def main():
     force_enabled = False
+    workers = 1
+    streaming_enabled = False
+    cache_enabled = False
+    incremental_enabled = False
+    metrics_enabled = False
+    dedup_enabled = False
+    tune_enabled = False
     is_windows = platform.system() == 'Windows'
     if not is_windows: 
         command = 'clear'
@@ -83,27 +116,51 @@ def main():
     os.system(command)
     opcion = -1
     while int(opcion) != 0:
-        menu(force_enabled)
+        menu(force_enabled, workers, streaming_enabled, cache_enabled, incremental_enabled, metrics_enabled, dedup_enabled, tune_enabled)
         opcion = input("Seleccione una opcin  ")
         if opcion == 0:
             break;
         try:
             warning(int(opcion))
             if 0 < int(opcion) <= 5:
-                if int(opcion) == 5:
-                    modos = range(1, 5)
+                if int(opcion) == MODE_EVERYTHING:
+                    # Todos los modos se generan en un solo trabajo por cue, compartiendo la decodificacin
+                    modos = [MODE_EVERYTHING]
                 else:
                     modos = [int(opcion)]
-                cue_paths = osUtils.list_files(extension='cue')
-                for cue_path in cue_paths:
-                    for modo in modos:
-                        minimizer = BinCueMinimizer(operation_mode=modo, overwrite_chd=force_enabled)
-                        minimizer.check_dependencies()
-                        minimizer.minimise_cue(CueFile(cue_path))
-            elif int(opcion) == 6:
+                BinCueMinimizer().check_dependencies()
+                use_parse_cache(os.path.join(os.getcwd(), PARSE_CACHE_FILE))
+                cue_paths = scan_cues(exclude=SCAN_EXCLUDE)
+                minimizer_options = {'streaming': streaming_enabled}
+                if cache_enabled:
+                    minimizer_options['track_cache'] = TrackCache(os.path.join(os.getcwd(), TRACK_CACHE_DIR))
+                if metrics_enabled:
+                    minimizer_options['metrics'] = MetricsRecorder(os.path.join(os.getcwd(), METRICS_FILE))
+                if tune_enabled:
+                    minimizer_options['chd_tuner'] = ChdTuner(os.path.join(os.getcwd(), CHD_TUNING_FILE))
+                manifest = None
+                if incremental_enabled:
+                    manifest = BuildManifest(os.path.join(os.getcwd(), BUILD_MANIFEST_FILE))
+                executor = BatchExecutor(workers=workers, overwrite_chd=force_enabled, minimizer_options=minimizer_options, manifest=manifest, dedup=dedup_enabled)
+                executor.run(cue_paths, modos)
+            elif int(opcion) == SWITCH_FORCE:
                 force_enabled = not force_enabled
+            elif int(opcion) == SWITCH_WORKERS:
+                workers = ask_workers()
+            elif int(opcion) == SWITCH_STREAMING:
+                streaming_enabled = not streaming_enabled
+            elif int(opcion) == SWITCH_CACHE:
+                cache_enabled = not cache_enabled
+            elif int(opcion) == SWITCH_INCREMENTAL:
+                incremental_enabled = not incremental_enabled
+            elif int(opcion) == SWITCH_METRICS:
+                metrics_enabled = not metrics_enabled
+            elif int(opcion) == SWITCH_DEDUP:
+                dedup_enabled = not dedup_enabled
+            elif int(opcion) == SWITCH_TUNE:
+                tune_enabled = not tune_enabled
         except ValueError:
-            print("Por favor, introduzca una opcin del 0 al 6")
+            print("Por favor, introduzca una opcin del 0 al 13")
             opcion = -1
                 
 if __name__ == '__main__':
@@ -0,0 +1,93 @@
+# coding=cp1252
+#
+# test_cueFile.py
+#
+# Creative Commons Attribution-NonCommercial-ShareAlike 4.0 International (CC BY-NC-SA 4.0) 2019 granmacco <@granmacco>
+# https://github.com/granmacco
+#
+# Script inspired by @krcroft's reddit post on June 25th, 2019
+# https://www.reddit.com/r/RetroPie/comments/c50djy/chd_compression_summary_for_psx/
+# https://github.com/krcroft
+# Thank you very much, without you, this automation wouldn't have existed!
+#
+# Also, special thanks to the Plata o Roms team for finding @krcroft's post, 
+# putting me on the right track and inspiring some of the features of this script.
+# http://t.me/RaspberryPiEmuladores
+# Thank you very much for sharing your knowledge and for striving for excellence!
+#
+# Lastly, but not least, a very special thanks to @Sergi_0, for providing new ideas and methodologies to this script.
+# https://github.com/Sergi_0
+# Thank you very much for your kindness and time!!
+#
+# This code is licensed under Creative Commons BY-NC-SA 4.0
+# You may redistribute it and/or modify it under the terms of the 
+# Creative Commons BY-NC-SA 4.0 License, as published by the Creative
+# Commons on their website http://creativecommons.org/licenses/by-nc-sa/4.0/
+#
+
+
+import os
+import tempfile
+import unittest
+from shutil import rmtree
+from binCueMinimizer.cueFile import CueFile
+
+SECTOR_BYTES = 2352
+DATA_SECTORS = 1000
+AUDIO_SECTORS = 500
+
+class SplitTracksWithPregapTest(unittest.TestCase):
+    """
+    Un PREGAP no est en el bin: la pista de datos debe quedarse con todos sus sectores al partir el fichero
+
+    """
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.bin_path = os.path.join(self.path, 'disc.bin')
+        with open(self.bin_path, 'wb') as file:
+            file.write(b'\x11' * DATA_SECTORS * SECTOR_BYTES)
+            file.write(b'\x22' * AUDIO_SECTORS * SECTOR_BYTES)
+        self.cue_path = os.path.join(self.path, 'disc.cue')
+        with open(self.cue_path, 'w') as file:
+            # 1000 sectores son 13 segundos y 25 frames
+            file.write('FILE "disc.bin" BINARY\n'
+                       '  TRACK 01 MODE2/2352\n'
+                       '    INDEX 01 00:00:00\n'
+                       '  TRACK 02 AUDIO\n'
+                       '    PREGAP 00:02:00\n'
+                       '    INDEX 01 00:13:25\n')
+
+    def tearDown(self):
+        rmtree(self.path)
+
+    def test_pregap_is_not_an_index(self):
+        cue = CueFile(self.cue_path)
+        track = cue.tracks[1]
+        self.assertEqual(track.pregap, 150)
+        self.assertEqual(list(track.indexes), ['01'])
+        self.assertEqual(track.get_start_in_frames(), DATA_SECTORS)
+
+    def test_track_extents(self):
+        extents = CueFile(self.cue_path).get_track_extents()
+        self.assertEqual([(offset, size) for track, path, offset, size in extents],
+                         [(0, DATA_SECTORS * SECTOR_BYTES), (DATA_SECTORS * SECTOR_BYTES, AUDIO_SECTORS * SECTOR_BYTES)])
+
+    def test_split_keeps_data_sectors(self):
+        new_cue = CueFile(self.cue_path).split_tracks()
+        data_track, audio_track = new_cue.tracks
+        self.assertEqual(os.path.getsize(data_track.path), DATA_SECTORS * SECTOR_BYTES)
+        self.assertEqual(os.path.getsize(audio_track.path), AUDIO_SECTORS * SECTOR_BYTES)
+        with open(audio_track.path, 'rb') as file:
+            self.assertEqual(set(file.read()), {0x22})
+
+    def test_split_writes_pregap_back(self):
+        new_cue = CueFile(self.cue_path).split_tracks()
+        with open(new_cue.path) as file:
+            contents = file.read()
+        self.assertIn('    PREGAP 00:02:00\n    INDEX 01 00:00:00\n', contents)
+        self.assertNotIn('INDEX 00', contents)
+        self.assertEqual(CueFile(new_cue.path).tracks[1].pregap, 150)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+# coding=cp1252
+#
+# test_libraryScanner.py
+#
+# Creative Commons Attribution-NonCommercial-ShareAlike 4.0 International (CC BY-NC-SA 4.0) 2019 granmacco <@granmacco>
+# https://github.com/granmacco
+#
+# Script inspired by @krcroft's reddit post on June 25th, 2019
+# https://www.reddit.com/r/RetroPie/comments/c50djy/chd_compression_summary_for_psx/
+# https://github.com/krcroft
+# Thank you very much, without you, this automation wouldn't have existed!
+#
+# Also, special thanks to the Plata o Roms team for finding @krcroft's post, 
+# putting me on the right track and inspiring some of the features of this script.
+# http://t.me/RaspberryPiEmuladores
+# Thank you very much for sharing your knowledge and for striving for excellence!
+#
+# Lastly, but not least, a very special thanks to @Sergi_0, for providing new ideas and methodologies to this script.
+# https://github.com/Sergi_0
+# Thank you very much for your kindness and time!!
+#
+# This code is licensed under Creative Commons BY-NC-SA 4.0
+# You may redistribute it and/or modify it under the terms of the 
+# Creative Commons BY-NC-SA 4.0 License, as published by the Creative
+# Commons on their website http://creativecommons.org/licenses/by-nc-sa/4.0/
+#
+
+
+import os
+import tempfile
+import unittest
+from shutil import rmtree
+from binCueMinimizer.libraryScanner import scan_cues
+from binCueMinimizer.consts import SCAN_EXCLUDE
+
+def write_disc(directory):
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, 'disc.bin'), 'wb') as file:
+        file.write(b'\x00' * 2352)
+    with open(os.path.join(directory, 'disc.cue'), 'w') as file:
+        file.write('FILE "disc.bin" BINARY\n'
+                   '  TRACK 01 MODE2/2352\n'
+                   '    INDEX 01 00:00:00\n')
+    return os.path.join(directory, 'disc.cue')
+
+class ScanCuesTest(unittest.TestCase):
+    """
+    El recorrido de la biblioteca no debe repetir ni perder discos, ni interrumpirse por un enlace
+
+    """
+
+    def setUp(self):
+        self.path = os.path.realpath(tempfile.mkdtemp())
+
+    def tearDown(self):
+        rmtree(self.path)
+
+    def scan(self):
+        return list(scan_cues(self.path, exclude=SCAN_EXCLUDE))
+
+    def test_circular_symlink_is_walked_once(self):
+        cue = write_disc(os.path.join(self.path, 'game'))
+        try:
+            os.symlink('..', os.path.join(self.path, 'game', 'up'), target_is_directory=True)
+        except (OSError, NotImplementedError):
+            self.skipTest('No se pueden crear enlaces simblicos')
+        self.assertEqual(self.scan(), [cue])
+
+    def test_symlinked_folder_is_followed(self):
+        cue = write_disc(os.path.join(self.path, 'library', 'game'))
+        os.mkdir(os.path.join(self.path, 'scan'))
+        try:
+            os.symlink(os.path.join(self.path, 'library'), os.path.join(self.path, 'scan', 'linked'), target_is_directory=True)
+        except (OSError, NotImplementedError):
+            self.skipTest('No se pueden crear enlaces simblicos')
+        self.assertEqual(list(scan_cues(os.path.join(self.path, 'scan'), exclude=SCAN_EXCLUDE)),
+                         [os.path.join(self.path, 'scan', 'linked', 'game', 'disc.cue')])
+        self.assertTrue(os.path.exists(cue))
+
+    def test_broken_symlink_does_not_stop_the_scan(self):
+        cue = write_disc(os.path.join(self.path, 'game'))
+        try:
+            os.symlink('loop', os.path.join(self.path, 'loop'))
+        except (OSError, NotImplementedError):
+            self.skipTest('No se pueden crear enlaces simblicos')
+        self.assertEqual(self.scan(), [cue])
+
+    def test_only_root_working_dirs_are_excluded(self):
+        for name in ['temp', 'temp1', 'temp12']:
+            write_disc(os.path.join(self.path, name))
+        expected = [write_disc(os.path.join(self.path, name)) for name in ['Temp', 'games/temp', 'temp1 (Europe)', 'tempest']]
+        self.assertEqual(sorted(self.scan()), sorted(expected))
+
+if __name__ == '__main__':
+    unittest.main()
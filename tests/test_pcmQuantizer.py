@@ -0,0 +1,111 @@
+# coding=cp1252
+#
+# test_pcmQuantizer.py
+#
+# Creative Commons Attribution-NonCommercial-ShareAlike 4.0 International (CC BY-NC-SA 4.0) 2019 granmacco <@granmacco>
+# https://github.com/granmacco
+#
+# Script inspired by @krcroft's reddit post on June 25th, 2019
+# https://www.reddit.com/r/RetroPie/comments/c50djy/chd_compression_summary_for_psx/
+# https://github.com/krcroft
+# Thank you very much, without you, this automation wouldn't have existed!
+#
+# Also, special thanks to the Plata o Roms team for finding @krcroft's post, 
+# putting me on the right track and inspiring some of the features of this script.
+# http://t.me/RaspberryPiEmuladores
+# Thank you very much for sharing your knowledge and for striving for excellence!
+#
+# Lastly, but not least, a very special thanks to @Sergi_0, for providing new ideas and methodologies to this script.
+# https://github.com/Sergi_0
+# Thank you very much for your kindness and time!!
+#
+# This code is licensed under Creative Commons BY-NC-SA 4.0
+# You may redistribute it and/or modify it under the terms of the 
+# Creative Commons BY-NC-SA 4.0 License, as published by the Creative
+# Commons on their website http://creativecommons.org/licenses/by-nc-sa/4.0/
+#
+
+
+import os
+import shutil
+import struct
+import subprocess
+import tempfile
+import unittest
+from shutil import rmtree
+from binCueMinimizer import pcmQuantizer
+
+def reference_u8_round_trip(data):
+    """
+    Paso de s16le a pcm_u8 y vuelta a s16le tal como lo hace ffmpeg (libswresample, sin dither):
+    u8 = (s16 >> 8) + 0x80 y s16 = (u8 - 0x80) << 8. Descarta el ltimo frame estreo si est incompleto
+
+    """
+
+    data = data[:len(data) // pcmQuantizer.FRAME_BYTES * pcmQuantizer.FRAME_BYTES]
+    samples = struct.unpack('<%dh' % (len(data) // 2), data)
+    u8 = [(sample >> 8) + 0x80 for sample in samples]
+    return struct.pack('<%dh' % len(u8), *[(value - 0x80) << 8 for value in u8])
+
+def get_all_samples():
+    # Todo el rango de int16, de -32768 a 32767: 65536 muestras, un nmero entero de frames
+    return struct.pack('<65536h', *range(-32768, 32768))
+
+@unittest.skipUnless(pcmQuantizer.is_available(), 'numpy no est instalado')
+class QuantizeToU8Test(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        rmtree(self.path)
+
+    def quantize(self, source, **options):
+        target = os.path.join(self.path, 'target.bin')
+        pcmQuantizer.quantize_to_u8(source, target, **options)
+        with open(target, 'rb') as file:
+            return file.read()
+
+    def write_source(self, data):
+        source = os.path.join(self.path, 'source.bin')
+        with open(source, 'wb') as file:
+            file.write(data)
+        return source
+
+    def test_full_int16_range(self):
+        data = get_all_samples()
+        result = self.quantize(self.write_source(data))
+        self.assertEqual(result, reference_u8_round_trip(data))
+        samples = struct.unpack('<65536h', result)
+        self.assertEqual(samples[0], -32768)
+        self.assertEqual(samples[-1], 32512)
+
+    def test_memoryview_and_small_blocks(self):
+        data = get_all_samples()
+        self.assertEqual(self.quantize(memoryview(data), block_samples=1000), reference_u8_round_trip(data))
+
+    def test_odd_length_drops_incomplete_frame(self):
+        data = get_all_samples()[:4 * 1001 + 3]
+        result = self.quantize(self.write_source(data))
+        self.assertEqual(len(result), 4 * 1001)
+        self.assertEqual(result, reference_u8_round_trip(data))
+
+    def test_empty(self):
+        self.assertEqual(self.quantize(self.write_source(b'\x01\x02\x03')), b'')
+
+    @unittest.skipUnless(shutil.which('ffmpeg'), 'ffmpeg no est en el PATH')
+    def test_matches_ffmpeg(self):
+        data = get_all_samples()
+        source = self.write_source(data)
+        wav = os.path.join(self.path, 'u8.wav')
+        target = os.path.join(self.path, 'ffmpeg.bin')
+        # Los mismos comandos que base_bin_to_wav_u8_command y base_wav_to_bin_command
+        subprocess.run(['ffmpeg', '-y', '-hide_banner', '-nostats', '-loglevel', 'panic', '-f', 's16le', '-ar', '44.1k', '-ac', '2', '-i', source,
+                        '-f', 'wav', '-flags', '+bitexact', '-acodec', 'pcm_u8', '-ar', '44100', '-ac', '2', wav], check=True)
+        subprocess.run(['ffmpeg', '-y', '-hide_banner', '-nostats', '-loglevel', 'panic', '-ac', '2', '-i', wav,
+                        '-f', 's16le', '-ar', '44.1k', '-ac', '2', target], check=True)
+        with open(target, 'rb') as file:
+            self.assertEqual(self.quantize(source), file.read())
+
+if __name__ == '__main__':
+    unittest.main()